@@ -0,0 +1,98 @@
+"""
+Cold-start import benchmark for the library modules.
+
+Each module is imported in a fresh interpreter with `python -X importtime`, and
+the cumulative import time of the module is read from the report (best of
+--repeat runs). The run fails if a module pulls in one of the heavy optional
+dependencies at import time, or if its import time exceeds a stored baseline
+by more than --tolerance.
+
+Usage:
+    python benchmarks/bench_import.py                      # report + heavy-module check
+    python benchmarks/bench_import.py --save-baseline b.json
+    python benchmarks/bench_import.py --baseline b.json    # also fail on regressions
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = ['lc_data', 'extinction_utils', 'lc_store', 'plot_lc', 'result_cache', 'deredden_script',
+           'lightcurve', 'colors', 'lc_features', 'population', 'pipeline']
+
+# Loaded lazily on first use; importing any of these at module import time is a regression
+HEAVY_MODULES = ['astropy', 'extinction', 'matplotlib']
+
+
+def import_profile(module):
+    """
+    Imports `module` in a fresh interpreter.
+
+    Returns:
+        tuple: (cumulative import time in ms, list of HEAVY_MODULES that got imported)
+    """
+    code = (f"import sys, {module}; "
+            f"print([m for m in {HEAVY_MODULES!r} if m in sys.modules])")
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                          cwd=REPO_DIR, capture_output=True, text=True, check=True)
+    cumulative_us = None
+    for line in proc.stderr.splitlines():
+        parts = line.split('|')
+        if len(parts) == 3 and parts[2].strip() == module:
+            cumulative_us = int(parts[1])
+    heavy = json.loads(proc.stdout.strip().splitlines()[-1].replace("'", '"'))
+    return cumulative_us / 1000.0, heavy
+
+
+def run(modules, repeat=5):
+    results = {}
+    for module in modules:
+        times = []
+        for _ in range(repeat):
+            ms, heavy = import_profile(module)
+            times.append(ms)
+        results[module] = {'import_ms': min(times), 'heavy_modules': heavy}
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5, help='Fresh interpreters per module (best is kept)')
+    parser.add_argument('--baseline', help='JSON baseline to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Allowed relative slowdown against the baseline')
+    parser.add_argument('--save-baseline', help='Write the results to this JSON file')
+    args = parser.parse_args(argv)
+
+    results = run(MODULES, repeat=args.repeat)
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    failures = []
+    print(f"{'module':<20} {'import ms':>10} {'baseline':>10}  heavy imports")
+    for module, res in results.items():
+        base = baseline.get(module, {}).get('import_ms')
+        base_str = f"{base:10.1f}" if base is not None else f"{'-':>10}"
+        print(f"{module:<20} {res['import_ms']:10.1f} {base_str}  {', '.join(res['heavy_modules']) or '-'}")
+        if res['heavy_modules']:
+            failures.append(f"{module} imports {', '.join(res['heavy_modules'])} eagerly")
+        if base is not None and res['import_ms'] > base * (1 + args.tolerance):
+            failures.append(f"{module} import time {res['import_ms']:.1f} ms exceeds baseline {base:.1f} ms")
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved baseline to {args.save_baseline}")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
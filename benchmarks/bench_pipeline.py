@@ -0,0 +1,201 @@
+"""
+Stage-by-stage benchmark of the light-curve pipeline on synthetic data.
+
+Every stage (loaders, ingestion, date parsing, dereddening, extinction sweeps,
+Monte Carlo dereddening, absolute magnitudes, redshift distance moduli, stacking,
+incremental stacking, deduplication, binning, colors, synthetic g/r, features,
+population modeling, pivoting, plotting, batch rendering) is timed (best of --repeat) and memory-profiled
+(tracemalloc peak) at each requested size. Results are written as JSON and can be compared
+against a stored baseline run.
+
+Usage:
+    python benchmarks/bench_pipeline.py --sizes 1e3 1e4 1e5 --output bench.json
+    python benchmarks/bench_pipeline.py --sizes 1e5 --baseline bench.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import numpy as np  # noqa: E402
+
+import colors  # noqa: E402
+import extinction_utils  # noqa: E402
+import lc_data  # noqa: E402
+import lc_features  # noqa: E402
+import plot_lc  # noqa: E402
+import population  # noqa: E402
+from lc_store import stack_incremental, write_lightcurve  # noqa: E402
+from lightcurve import LightCurve  # noqa: E402
+from synthetic_lc import (aavso_table, goranskij_table, martini_table,  # noqa: E402
+                          standard_lightcurve, synthetic_gr_table, ut_strings)
+
+# Stages too slow to be worth running beyond this many points
+STAGE_MAX_POINTS = {'plot': 1_000_000, 'plot_decimated': 10_000_000, 'render_batch': 10_000_000,
+                    'sweep_extinction': 10_000_000}
+
+# (A_V, R_V) grid of the sweep_extinction stage
+SWEEP_A_V = np.linspace(0.0, 3.0, 8)
+SWEEP_R_V = np.linspace(2.5, 4.0, 4)
+
+
+def _measure(func, repeat):
+    """
+    Best wall time over `repeat` runs and the tracemalloc peak of one run (bytes).
+    """
+    times = []
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(times), peak
+
+
+def build_stages(n, workdir, seed=0):
+    """
+    Prepares inputs of about n points and returns {stage name: zero-argument callable}.
+    """
+    paths = {name: os.path.join(workdir, f"{name}_{n}.csv") for name in
+             ('martini', 'goranskij', 'aavso', 'synthetic_gr')}
+    martini_table(n, seed).to_csv(paths['martini'], index=False)
+    goranskij_table(n, seed).to_csv(paths['goranskij'], index=False)
+    aavso_table(n, seed).to_csv(paths['aavso'], index=False)
+    synthetic_gr_table(n, seed).to_csv(paths['synthetic_gr'], index=False)
+
+    lc = standard_lightcurve(n, seed)
+    halves = [os.path.join(workdir, f"stack{i}_{n}.parquet") for i in range(2)]
+    write_lightcurve(lc.iloc[: n // 2], halves[0])
+    write_lightcurve(lc.iloc[n // 2:], halves[1])
+    dates = np.asarray(ut_strings(lc['mjd'].to_numpy()), dtype=object)
+    dered = extinction_utils.apply_reddening_df(lc, 1.0, 3.1, mag_col='mag')
+    compact = LightCurve.from_dataframe(lc)
+    template = population.template_grid(dered.assign(abs_mag=dered['app_mag'] - 25))
+    redshifts = np.random.default_rng(seed).uniform(1e-4, 0.5, n)
+    # Build the cached distance-modulus table up front, so the z stages time the lookup
+    extinction_utils.distmod_from_z(redshifts)
+    # A stack cache that is already up to date, so the warm stage only checks the manifest
+    warm_cache = os.path.join(workdir, f"stack_cache_{n}")
+    stack_incremental(halves, warm_cache)
+    render_tasks = [{'data': path, 'output_file': os.path.join(workdir, f"batch{i}_{n}.png"),
+                     'kind': 'photometry', 'decimate': 'minmax'} for i, path in enumerate(halves)]
+
+    return {
+        'load_martini': lambda: lc_data.load_lightcurve(paths['martini'], source='martini'),
+        'load_goranskij': lambda: lc_data.lc_goranskij(paths['goranskij']),
+        'load_aavso': lambda: lc_data.load_lightcurve(paths['aavso'], source='aavso'),
+        'ingest_lightcurves': lambda: lc_data.ingest_lightcurves(
+            [paths['martini'], paths['goranskij'], paths['aavso']]),
+        'ut_to_mjd_batch': lambda: lc_data.ut_to_mjd_batch(dates),
+        'apply_reddening_df': lambda: extinction_utils.apply_reddening_df(lc, 1.0, 3.1, mag_col='mag'),
+        'apply_reddening_lightcurve': lambda: extinction_utils.apply_reddening_df(compact, 1.0, 3.1, mag_col='mag'),
+        'appmag_to_absmag_distance': lambda: extinction_utils.appmag_to_absmag(dered, distance_pc=6100),
+        'appmag_to_absmag_z': lambda: extinction_utils.appmag_to_absmag(dered, z=redshifts),
+        'distmod_from_z': lambda: extinction_utils.distmod_from_z(redshifts),
+        'sweep_extinction': lambda: extinction_utils.sweep_extinction(
+            lc, SWEEP_A_V, SWEEP_R_V, distance_pc=6100, dtype=np.float32),
+        'monte_carlo_deredden': lambda: extinction_utils.monte_carlo_deredden(
+            lc, 0.3, 3.1, 6100, E_BV_err=0.05, R_V_err=0.2, distance_err=500, seed=seed),
+        'stack': lambda: lc_data.stack_v838mon(halves),
+        'stack_dedup': lambda: lc_data.stack_v838mon(halves + halves[:1], dedup=True),
+        'stack_incremental_cold': lambda: stack_incremental(halves, tempfile.mkdtemp(dir=workdir)),
+        'stack_incremental_warm': lambda: stack_incremental(halves, warm_cache),
+        'bin_lightcurve': lambda: lc_data.bin_lightcurve(lc),
+        'color_curves': lambda: colors.color_curves(lc, method='linear', tol=1.0),
+        'synthetic_gr': lambda: colors.synthetic_gr(lc),
+        'light_curve_features': lambda: lc_features.light_curve_features(dered, mag_col='app_mag'),
+        'simulate_population': lambda: population.simulate_population(template, n, window=(0, 365), seed=seed),
+        'pivot_synthetic_lc': lambda: lc_data.pivot_synthetic_lc(
+            paths['synthetic_gr'], os.path.join(workdir, f"pivot_{n}.parquet")),
+        'plot': lambda: plot_lc.plot_photometry_dereddened(
+            dered, output_file=os.path.join(workdir, f"plot_{n}.png")),
+        'plot_decimated': lambda: plot_lc.plot_photometry_dereddened(
+            dered, output_file=os.path.join(workdir, f"plotd_{n}.png"), decimate='minmax'),
+        'render_batch': lambda: plot_lc.render_batch(render_tasks),
+    }
+
+
+def run(sizes, stages=None, repeat=3, seed=0):
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for n in sizes:
+            for name, func in build_stages(n, workdir, seed).items():
+                if stages and name not in stages:
+                    continue
+                if n > STAGE_MAX_POINTS.get(name, float('inf')):
+                    continue
+                seconds, peak = _measure(func, repeat)
+                results.append({'stage': name, 'n': n, 'seconds': seconds,
+                                'points_per_s': n / seconds if seconds else None,
+                                'peak_mb': peak / 1024 ** 2})
+                print(f"{name:<28} n={n:<10} {seconds * 1e3:10.2f} ms {peak / 1024 ** 2:10.1f} MB", flush=True)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Prints the speed ratio against a baseline and returns the regressed entries.
+    """
+    base = {(r['stage'], r['n']): r for r in baseline['results']}
+    regressions = []
+    for r in results:
+        ref = base.get((r['stage'], r['n']))
+        if ref is None:
+            continue
+        ratio = r['seconds'] / ref['seconds'] if ref['seconds'] else float('nan')
+        flag = ' REGRESSION' if ratio > 1 + tolerance else ''
+        print(f"{r['stage']:<28} n={r['n']:<10} {ratio:6.2f}x baseline time{flag}")
+        if flag:
+            regressions.append(r)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', nargs='+', type=float, default=[1e3, 1e4, 1e5],
+                        help='Number of points per stage (e.g. 1e3 1e5 1e7)')
+    parser.add_argument('--stages', nargs='*', default=None, help='Only run these stages')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per stage (best is kept)')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the synthetic data generator')
+    parser.add_argument('--output', help='Write results to this JSON file')
+    parser.add_argument('--baseline', help='Compare against a previous JSON result')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed relative slowdown')
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes]
+    results = run(sizes, stages=args.stages, repeat=args.repeat, seed=args.seed)
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'seed': args.seed,
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved benchmark results to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        return 1 if compare(results, baseline, args.tolerance) else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,146 @@
+"""
+Seeded generator of realistic LRN-like light curves in every input format the
+loaders understand, for benchmarks.
+
+The underlying model is a double-peaked transient: a fast first peak, a slower
+red second peak and a linear decline, with per-band offsets, Gaussian noise and
+random gaps (missing or zero-sentinel magnitudes) where the format uses them.
+"""
+import numpy as np
+import pandas as pd
+
+from lc_data import ENGLISH_MONTHS, STANDARD_COLUMNS
+
+UBVRI = ['U', 'B', 'V', 'R', 'I']
+
+# Peak-magnitude offsets per band (redder bands brighter at the second peak)
+BAND_OFFSETS = {'U': 1.2, 'B': 0.8, 'V': 0.3, 'R': 0.0, 'I': -0.3, 'g': 0.5, 'r': 0.1}
+
+MJD_START = 52300.0
+
+
+def model_mag(t, band, peak_mag=10.0):
+    """
+    Magnitude of the model transient t days after discovery in a given band.
+    """
+    first = 1.5 * np.exp(-0.5 * ((t - 10) / 6) ** 2)
+    second = (1.0 + 0.2 * (BAND_OFFSETS[band] < 0.4)) * np.exp(-0.5 * ((t - 60) / 20) ** 2)
+    decline = 0.02 * np.clip(t - 80, 0, None)
+    return peak_mag + 2.5 + BAND_OFFSETS[band] - first - second + decline
+
+
+def _epochs(rng, n_epochs, span=200.0):
+    return np.sort(rng.uniform(0, span, n_epochs))
+
+
+def _wide_mags(rng, t, bands, sentinel):
+    mags = {}
+    for band in bands:
+        m = model_mag(t, band) + rng.normal(0, 0.03, len(t))
+        missing = rng.random(len(t)) < 0.25
+        m[missing] = sentinel
+        mags[band] = np.round(m, 3)
+    return mags
+
+
+def ut_strings(mjd):
+    """
+    'YYYY Month DD.ddd' strings for an array of MJDs (martini 'dateobs' format).
+    """
+    ts = pd.to_datetime(mjd - 40587.0, unit='D')
+    day_frac = ts.day + (ts.hour * 3600 + ts.minute * 60 + ts.second) / 86400.0
+    months = np.asarray(ENGLISH_MONTHS, dtype=object)[ts.month]
+    return [f"{y} {m} {d:.4f}" for y, m, d in zip(ts.year, months, day_frac)]
+
+
+def martini_table(n_points, seed=0):
+    """
+    Wide martini table (dateobs + UBVRI with NaN gaps) holding about n_points magnitudes.
+    """
+    rng = np.random.default_rng(seed)
+    t = _epochs(rng, max(1, int(n_points / (len(UBVRI) * 0.75))))
+    df = pd.DataFrame({'dateobs': ut_strings(MJD_START + t)})
+    for band, m in _wide_mags(rng, t, UBVRI, np.nan).items():
+        df[band] = m
+    return df
+
+
+def goranskij_table(n_points, seed=0, sentinel=0.0):
+    """
+    Wide Goranskij/Munari table (mjd + UBVRI, 0 or NaN for missing) holding about n_points magnitudes.
+    """
+    rng = np.random.default_rng(seed)
+    t = _epochs(rng, max(1, int(n_points / (len(UBVRI) * 0.75))))
+    df = pd.DataFrame({'mjd': np.round(MJD_START + t, 4)})
+    for band, m in _wide_mags(rng, t, UBVRI, sentinel).items():
+        df[band] = m
+    return df
+
+
+def aavso_table(n_points, seed=0):
+    """
+    AAVSO export (JD, Band, Magnitude, Uncertainty) with n_points rows.
+    """
+    rng = np.random.default_rng(seed)
+    t = _epochs(rng, n_points)
+    bands = rng.choice(['B', 'V', 'R', 'I'], n_points)
+    mag = np.empty(n_points)
+    for band in ['B', 'V', 'R', 'I']:
+        sel = bands == band
+        mag[sel] = model_mag(t[sel], band) + rng.normal(0, 0.05, sel.sum())
+    unc = np.where(rng.random(n_points) < 0.2, np.nan, np.round(rng.uniform(0.01, 0.1, n_points), 3))
+    # AAVSO band labels come padded and in mixed case
+    labels = np.where(rng.random(n_points) < 0.5, np.char.lower(bands.astype(str)), bands)
+    return pd.DataFrame({
+        'JD': np.round(MJD_START + 2400000.5 + t, 5),
+        'Band': [f" {b} " for b in labels],
+        'Magnitude': np.round(mag, 3),
+        'Uncertainty': unc,
+    })
+
+
+def synthetic_gr_table(n_points, seed=0):
+    """
+    Table of synthetic g/r photometry (inst, mjd, g_synth[_strict], r_synth[_strict]).
+    """
+    rng = np.random.default_rng(seed)
+    t = _epochs(rng, max(1, n_points // 2))
+    df = pd.DataFrame({'inst': rng.choice(['munari', 'goranskij'], len(t)), 'mjd': MJD_START + t})
+    for band in ['g', 'r']:
+        m = model_mag(t, band) + rng.normal(0, 0.03, len(t))
+        df[f'{band}_synth'] = np.where(rng.random(len(t)) < 0.1, np.nan, m)
+        df[f'{band}_synth_strict'] = np.where(rng.random(len(t)) < 0.5, np.nan, m)
+    return df
+
+
+def standard_lightcurve(n_points, seed=0, insts=('martini', 'aavso', 'goranskij')):
+    """
+    Standardized long-format light curve (STANDARD_COLUMNS) with n_points rows.
+    """
+    rng = np.random.default_rng(seed)
+    t = _epochs(rng, n_points)
+    bands = rng.choice(UBVRI, n_points)
+    mag = np.empty(n_points)
+    for band in UBVRI:
+        sel = bands == band
+        mag[sel] = model_mag(t[sel], band) + rng.normal(0, 0.03, sel.sum())
+    df = pd.DataFrame({
+        'inst': rng.choice(list(insts), n_points),
+        'filter': bands,
+        'mjd': MJD_START + t,
+        'mjderr': 0.0,
+        'mag': mag,
+        'magerr': rng.uniform(0.01, 0.1, n_points),
+        'ATel': 0,
+        'limit': (rng.random(n_points) < 0.001).astype(int),
+    })
+    return df[STANDARD_COLUMNS]
+
+
+GENERATORS = {
+    'martini': martini_table,
+    'goranskij': goranskij_table,
+    'aavso': aavso_table,
+    'synthetic_gr': synthetic_gr_table,
+    'standard': standard_lightcurve,
+}
@@ -0,0 +1,338 @@
+import numpy as np
+import pandas as pd
+
+from instrumentation import instrumented
+
+
+def parse_color(color):
+    """
+    Splits a color name such as 'B-V' (or a (blue, red) pair) into its two bands.
+    """
+    if isinstance(color, str):
+        bands = color.replace('−', '-').split('-')
+        if len(bands) != 2 or not all(bands):
+            raise ValueError(f"Invalid color index: {color}")
+        return bands[0].strip(), bands[1].strip()
+    blue, red = color
+    return blue, red
+
+
+def _composite_time(keys, mjd, t0, stride):
+    # Object k's epochs map to [k * stride, (k + 1) * stride), so one sorted array
+    # and one searchsorted serve every object at once
+    return keys * stride + (mjd - t0)
+
+
+def match_epochs(ref_keys, ref_mjd, ref_mag, ref_err, keys, mjd, method='nearest', tol=0.5):
+    """
+    Samples one band at the epochs `mjd` of objects `keys`, for every object at once.
+
+    Parameters:
+        ref_keys, ref_mjd, ref_mag, ref_err (np.ndarray): Measurements of the band; ref_keys
+            are integer object codes matching `keys`.
+        keys, mjd (np.ndarray): Integer object codes and epochs to sample at.
+        method (str): 'nearest' takes the closest measurement of the same object within tol
+            days; 'linear' interpolates between the bracketing measurements of the same object
+            when both lie within tol days (an exact epoch match is used as is).
+        tol (float): Matching tolerance in days.
+
+    Returns:
+        tuple: (mag, err, dt) arrays aligned with `mjd`; NaN where nothing matched. dt is the
+            time to the nearest measurement used.
+    """
+    if method not in ('nearest', 'linear'):
+        raise ValueError(f"Unknown matching method: {method}")
+    n = len(mjd)
+    mag = np.full(n, np.nan)
+    err = np.full(n, np.nan)
+    dt = np.full(n, np.nan)
+    if len(ref_mjd) == 0 or n == 0:
+        return mag, err, dt
+
+    t0 = min(ref_mjd.min(), mjd.min())
+    stride = max(ref_mjd.max(), mjd.max()) - t0 + 2 * tol + 1.0
+    ref_t = _composite_time(ref_keys, ref_mjd, t0, stride)
+    order = np.argsort(ref_t, kind='stable')
+    ref_t, ref_keys = ref_t[order], ref_keys[order]
+    ref_mag, ref_err = ref_mag[order], ref_err[order]
+    t = _composite_time(keys, mjd, t0, stride)
+
+    # left: last measurement <= t, right: first measurement > t (same object only)
+    right = np.searchsorted(ref_t, t, side='right')
+    left = right - 1
+    has_left = (left >= 0) & (ref_keys[np.maximum(left, 0)] == keys)
+    has_right = (right < len(ref_t)) & (ref_keys[np.minimum(right, len(ref_t) - 1)] == keys)
+    left_c, right_c = np.maximum(left, 0), np.minimum(right, len(ref_t) - 1)
+    dt_left = np.where(has_left, t - ref_t[left_c], np.inf)
+    dt_right = np.where(has_right, ref_t[right_c] - t, np.inf)
+
+    if method == 'nearest':
+        use_right = dt_right < dt_left
+        pick = np.where(use_right, right_c, left_c)
+        best = np.minimum(dt_left, dt_right)
+        ok = best <= tol
+        mag[ok], err[ok], dt[ok] = ref_mag[pick[ok]], ref_err[pick[ok]], best[ok]
+        return mag, err, dt
+
+    exact = dt_left == 0
+    ok = exact | ((dt_left <= tol) & (dt_right <= tol))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        frac = np.where(exact, 0.0, dt_left / (dt_left + dt_right))
+    frac = frac[ok]
+    m0, m1 = ref_mag[left_c[ok]], ref_mag[right_c[ok]]
+    e0, e1 = ref_err[left_c[ok]], ref_err[right_c[ok]]
+    exact_ok = exact[ok]
+    mag[ok] = np.where(exact_ok, m0, (1 - frac) * m0 + frac * m1)
+    err[ok] = np.where(exact_ok, e0, np.sqrt(((1 - frac) * e0) ** 2 + (frac * e1) ** 2))
+    dt[ok] = np.where(exact_ok, 0.0, np.minimum(dt_left, dt_right)[ok])
+    return mag, err, dt
+
+
+def _regular_grid(keys, mjd, step):
+    """
+    Per-object regular epochs from each object's first to last point, every `step` days.
+    """
+    n_keys = keys.max() + 1
+    start = np.full(n_keys, np.inf)
+    stop = np.full(n_keys, -np.inf)
+    np.minimum.at(start, keys, mjd)
+    np.maximum.at(stop, keys, mjd)
+    present = np.isfinite(start)
+    counts = np.where(present, np.floor((stop - start) / step).astype(np.int64) + 1, 0)
+    grid_keys = np.repeat(np.arange(n_keys), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return grid_keys, start[grid_keys] + offsets * step
+
+
+@instrumented()
+def color_curves(df, colors=('B-V', 'V-R', 'V-I'), method='nearest', tol=0.5, grid=None, mag_col='mag',
+                 err_col='magerr', band_col='filter', by=None):
+    """
+    Computes color-index curves from a long light curve, for all epochs and objects at once.
+
+    Each band is sampled on a time grid with match_epochs and colors are the differences
+    of the sampled magnitudes, with errors added in quadrature. Upper limits and rows
+    without a magnitude are ignored. Works on any magnitude column (mag, app_mag,
+    mag_dereddened, abs_mag), so colors can be observed or intrinsic.
+
+    Parameters:
+        df (pd.DataFrame): Standardized light curve (optionally of many objects).
+        colors (iterable): Color names ('B-V') or (blue, red) band pairs.
+        method (str): 'nearest' or 'linear' (see match_epochs).
+        tol (float): Matching tolerance in days.
+        grid (None, float or array): Epochs to evaluate colors at. None uses the epochs of
+            each color's blue band, a float a regular grid with this step over each object's
+            time span, an array the same epochs for every object.
+        mag_col (str): Magnitude column.
+        err_col (str): Magnitude error column (missing errors propagate as NaN).
+        band_col (str): Band column.
+        by (str, optional): Object column, e.g. 'object' for a stacked catalog.
+
+    Returns:
+        pd.DataFrame: Long table with [by,] color, mjd, color_mag, color_err and dt_max
+            (largest time offset of the two matched measurements).
+    """
+    usable = np.isfinite(df[mag_col].to_numpy(dtype=float))
+    if 'limit' in df:
+        usable &= df['limit'].fillna(0).to_numpy() == 0
+    data = df[usable]
+    if data.empty:
+        return pd.DataFrame(columns=([by] if by else []) + ['color', 'mjd', 'color_mag', 'color_err', 'dt_max'])
+
+    if by is None:
+        keys = np.zeros(len(data), dtype=np.int64)
+        objects = pd.Index([None])
+    else:
+        keys, objects = pd.factorize(data[by])
+        keys = keys.astype(np.int64)
+    bands = data[band_col].to_numpy()
+    mjd = data['mjd'].to_numpy(dtype=float)
+    mag = data[mag_col].to_numpy(dtype=float)
+    err = data[err_col].to_numpy(dtype=float) if err_col in data else np.full(len(data), np.nan)
+
+    # Group rows by band once; each band is then a contiguous slice
+    band_codes, band_names = pd.factorize(bands)
+    order = np.argsort(band_codes, kind='stable')
+    bounds = np.searchsorted(band_codes[order], np.arange(len(band_names) + 1))
+    band_rows = {b: order[bounds[i]:bounds[i + 1]] for i, b in enumerate(band_names)}
+    empty = np.array([], dtype=np.int64)
+
+    if grid is not None and np.ndim(grid) == 0:
+        grid_keys, grid_mjd = _regular_grid(keys, mjd, float(grid))
+    elif grid is not None and np.ndim(grid) == 1:
+        grid = np.asarray(grid, dtype=float)
+        grid_keys = np.repeat(np.arange(len(objects), dtype=np.int64), len(grid))
+        grid_mjd = np.tile(grid, len(objects))
+
+    frames = []
+    for color in colors:
+        blue, red = parse_color(color)
+        if grid is None:
+            rows = band_rows.get(blue, empty)
+            at_keys, at_mjd = keys[rows], mjd[rows]
+        else:
+            at_keys, at_mjd = grid_keys, grid_mjd
+        sampled = []
+        for band in (blue, red):
+            rows = band_rows.get(band, empty)
+            sampled.append(match_epochs(keys[rows], mjd[rows], mag[rows], err[rows], at_keys, at_mjd,
+                                        method=method, tol=tol))
+        (m_blue, e_blue, dt_blue), (m_red, e_red, dt_red) = sampled
+        ok = np.isfinite(m_blue) & np.isfinite(m_red)
+        frame = pd.DataFrame({
+            'color': f"{blue}-{red}",
+            'mjd': at_mjd[ok],
+            'color_mag': (m_blue - m_red)[ok],
+            'color_err': np.hypot(e_blue, e_red)[ok],
+            'dt_max': np.maximum(dt_blue, dt_red)[ok],
+        })
+        if by is not None:
+            frame.insert(0, by, objects.take(at_keys[ok]))
+        frames.append(frame)
+
+    return pd.concat(frames, ignore_index=True)
+
+
+def color_table(curves, by=None):
+    """
+    Pivots the long output of color_curves into one row per [object and] epoch with
+    one '<color>' and one '<color>_err' column per color.
+    """
+    index = ([by] if by else []) + ['mjd']
+    wide = curves.pivot_table(index=index, columns='color', values=['color_mag', 'color_err'], aggfunc='first')
+    names = list(dict.fromkeys(curves['color']))
+    wide = wide.reindex(columns=[(v, c) for c in names for v in ('color_mag', 'color_err')])
+    wide.columns = [c if v == 'color_mag' else f"{c}_err" for v, c in wide.columns]
+    return wide.reset_index()
+
+
+# Linear color transformations to SDSS g and r: band -> (coefficients, constant, scatter).
+# jester05: Jester et al. (2005), all stars with Rc-Ic < 1.15,
+#   g = V + 0.60(B-V) - 0.12 (0.02), r = V - 0.42(B-V) + 0.11 (0.03).
+# lupton05: Lupton (2005) V = g - 0.5784(g-r) - 0.0038 and R = r - 0.1837(g-r) - 0.0971,
+#   solved for g and r (g-r = (V-R - 0.0933) / 0.6053); scatter propagated from both fits.
+GR_TRANSFORMS = {
+    'jester05': {
+        'anchor': 'V',
+        'g': ({'B': 0.60, 'V': 0.40}, -0.12, 0.02),
+        'r': ({'B': -0.42, 'V': 1.42}, 0.11, 0.03),
+    },
+    'lupton05': {
+        'anchor': 'V',
+        'g': ({'V': 1.9556, 'R': -0.9556}, -0.0854, 0.012),
+        'r': ({'V': 0.3035, 'R': 0.6965}, 0.0688, 0.008),
+    },
+}
+
+
+def _object_codes(df, columns):
+    """
+    One integer code per distinct combination of `columns` (all zeros if there are none).
+    """
+    codes = np.zeros(len(df), dtype=np.int64)
+    for col in columns:
+        col_codes, col_uniques = pd.factorize(df[col])
+        codes = codes * (len(col_uniques) + 1) + (col_codes + 1)
+    return codes
+
+
+@instrumented()
+def synthetic_gr(df, transform='jester05', tol=1.0, strict_tol=0.1, mag_col='mag', err_col='magerr',
+                 band_col='filter', by=None, per_inst=True):
+    """
+    Computes synthetic g and r photometry from Johnson-Cousins epochs, for all epochs and
+    objects in one vectorized pass.
+
+    Every epoch of the transform's anchor band (V) is paired with the nearest epoch of each
+    other band it needs (match_epochs, within tol days, same object and by default the same
+    instrument) and the linear transformation of GR_TRANSFORMS is applied. Errors combine
+    the band errors (missing ones count as 0) and the transformation scatter.
+
+    Parameters:
+        df (pd.DataFrame): Standardized light curve with B/V (jester05) or V/R (lupton05) points.
+        transform (str or dict): Key of GR_TRANSFORMS or a spec of the same shape.
+        tol (float): Relaxed matching tolerance in days.
+        strict_tol (float): Strict tolerance; 'strict' marks rows whose bands all lie within it.
+        mag_col (str): Magnitude column (e.g. 'mag_dereddened' for intrinsic g/r).
+        err_col (str): Magnitude error column.
+        band_col (str): Band column.
+        by (str, optional): Object column for a catalog of many objects.
+        per_inst (bool): Only pair bands observed with the same instrument.
+
+    Returns:
+        pd.DataFrame: Long-format g and r rows (STANDARD_COLUMNS order, plus [by] and 'strict'),
+            mjd being the anchor epoch and mjderr the largest time offset of the paired bands.
+    """
+    spec = GR_TRANSFORMS[transform] if isinstance(transform, str) else transform
+    usable = np.isfinite(df[mag_col].to_numpy(dtype=float))
+    if 'limit' in df:
+        usable &= df['limit'].fillna(0).to_numpy() == 0
+    data = df[usable]
+
+    keys = _object_codes(data, ([by] if by else []) + (['inst'] if per_inst else []))
+    bands = data[band_col].to_numpy()
+    mjd = data['mjd'].to_numpy(dtype=float)
+    mag = data[mag_col].to_numpy(dtype=float)
+    err = np.nan_to_num(data[err_col].to_numpy(dtype=float)) if err_col in data else np.zeros(len(data))
+
+    anchor = np.flatnonzero(bands == spec['anchor'])
+    at_keys, at_mjd = keys[anchor], mjd[anchor]
+    needed = sorted({b for out in ('g', 'r') for b in spec[out][0]})
+    sampled = {}
+    dt_max = np.zeros(len(anchor))
+    for band in needed:
+        if band == spec['anchor']:
+            sampled[band] = (mag[anchor], err[anchor])
+            continue
+        rows = np.flatnonzero(bands == band)
+        m, e, dt = match_epochs(keys[rows], mjd[rows], mag[rows], err[rows], at_keys, at_mjd,
+                                method='nearest', tol=tol)
+        sampled[band] = (m, e)
+        # Unmatched epochs (NaN) drop out below, since their g/r is NaN too
+        dt_max = np.fmax(dt_max, dt)
+
+    frames = []
+    for out_band in ('g', 'r'):
+        coeffs, const, scatter = spec[out_band]
+        value = np.full(len(anchor), const)
+        var = np.full(len(anchor), scatter ** 2)
+        for band, c in coeffs.items():
+            m, e = sampled[band]
+            value = value + c * m
+            var = var + (c * e) ** 2
+        ok = np.isfinite(value)
+        rows = anchor[ok]
+        frame = pd.DataFrame({
+            'inst': data['inst'].to_numpy()[rows] if 'inst' in data else None,
+            'filter': out_band,
+            'mjd': at_mjd[ok],
+            'mjderr': dt_max[ok],
+            'mag': value[ok],
+            'magerr': np.sqrt(var[ok]),
+            'ATel': 0,
+            'limit': 0,
+            'strict': dt_max[ok] <= strict_tol,
+        })
+        if by:
+            frame.insert(0, by, data[by].to_numpy()[rows])
+        frames.append(frame)
+
+    return pd.concat(frames, ignore_index=True).sort_values(
+        ([by] if by else []) + ['mjd', 'filter'], kind='stable', ignore_index=True)
+
+
+def synthetic_gr_table(df, **kwargs):
+    """
+    synthetic_gr in the wide layout of the external '_gr_vi' files: one row per anchor
+    epoch with inst, mjd, g_synth, r_synth and g_synth_strict / r_synth_strict (NaN
+    unless the strict tolerance was met). pivot_synthetic_lc accepts this directly.
+    """
+    long_df = synthetic_gr(df, **kwargs)
+    index = [c for c in (kwargs.get('by'), 'inst', 'mjd') if c]
+    wide = long_df.pivot_table(index=index, columns='filter', values='mag', aggfunc='first')
+    strict = long_df[long_df['strict']].pivot_table(index=index, columns='filter', values='mag', aggfunc='first')
+    out = pd.DataFrame({
+        'g_synth': wide.get('g'), 'g_synth_strict': strict.get('g'),
+        'r_synth': wide.get('r'), 'r_synth_strict': strict.get('r'),
+    }, index=wide.index)
+    return out.reset_index()
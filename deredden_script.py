@@ -1,33 +1,258 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import numpy as np
-from extinction_utils import apply_reddening_df
+from extinction_utils import apply_reddening_df, monte_carlo_deredden, deredden_chunks
+from lc_store import read_lightcurve, write_lightcurve, derived_path, iter_read_lightcurve, LightCurveWriter
+from lc_data import iter_lightcurve_chunks, bin_lightcurve, read_source, detect_source_format
+from result_cache import ResultCache, DEFAULT_MAX_BYTES
+from instrumentation import logger, instrumented, configure_cli_logging
 
-# Load object info
-objects = pd.read_csv("/home/skikk2/Documents/ICCUB/Project/lrn_rates/lrn_params_v838mon.csv")
+PARAMS_CSV = "/home/skikk2/Documents/ICCUB/Project/lrn_rates/lrn_params_v838mon.csv"
 
-for _, obj in objects.iterrows():
+
+def _optional_param(obj, key, default=0.0):
+    value = obj.get(key)
+    return default if value is None or pd.isna(value) else float(value)
+
+
+def stream_deredden(input_path, output_path, A_V, R_V, distance_pc=None, source=None, chunksize=100_000):
+    """
+    De-reddens a light curve chunk by chunk and appends the result to output_path,
+    so peak memory is bounded by the chunk size rather than the file size.
+
+    Parameters:
+        input_path (str): Standardized light curve, or a raw file if `source` is given.
+        output_path (str): Output .csv or .parquet file.
+        A_V (float): Visual extinction.
+        R_V (float): Total-to-selective extinction ratio.
+        distance_pc (float, optional): Distance in parsecs; adds 'abs_mag'.
+        source (str, optional): Raw source format ('aavso', 'martini', ...) to standardize on the fly.
+        chunksize (int): Rows per chunk.
+
+    Returns:
+        int: Number of rows written.
+    """
+    if source is None:
+        chunks = iter_read_lightcurve(input_path, chunksize=chunksize)
+    else:
+        chunks = iter_lightcurve_chunks(input_path, source=source, chunksize=chunksize)
+
+    with LightCurveWriter(output_path) as writer:
+        for chunk in deredden_chunks(chunks, A_V, R_V, distance_pc=distance_pc):
+            writer.write(chunk)
+    return writer.rows
+
+
+def _object_source(obj, default=None):
+    """
+    Returns the raw source format of an object's input file: its params row 'source' if set,
+    else `default`. 'auto' is resolved with lc_data.detect_source_format, and 'standard'
+    (already standardized) maps to None.
+    """
+    source = obj.get('source')
+    if source is None or pd.isna(source) or not str(source).strip():
+        source = default
+    if source == 'auto':
+        source = detect_source_format(obj['input_file'])
+    return None if source == 'standard' else source
+
+
+@instrumented(rows_out=lambda result: result[1], count_input=False)
+def deredden_object(obj, mc_samples=0, seed=None, chunksize=None, cache=None, bin_days=None, source=None):
+    """
+    De-reddens one object's light curve and writes '<input>_dered.<ext>' in the input's format.
+
+    Parameters:
+        obj (Mapping): Params row with Name, input_file, E_BV, R_V, distance_pc and,
+            for Monte Carlo mode, optional E_BV_err, R_V_err, distance_pc_err. An optional
+            'source' column overrides `source` for this object.
+        mc_samples (int): If > 0, propagate parameter uncertainties with this many draws.
+        seed (int, optional): Random seed for the Monte Carlo draws.
+        chunksize (int, optional): If given, stream the file in chunks of this many rows
+            (not combined with Monte Carlo mode).
+        cache (ResultCache or str, optional): Result cache (or its directory). Objects whose
+            input file and parameters are unchanged are restored from it instead of recomputed.
+            Unseeded Monte Carlo runs are not reproducible and bypass it.
+        bin_days (float, optional): If given, bin the light curve in time bins of this width
+            (lc_data.bin_lightcurve) before de-reddening (not combined with streaming).
+        source (str, optional): Raw source format of the input file ('aavso', 'martini', ...,
+            or 'auto' to detect it from the header). None or 'standard' reads it as an
+            already standardized light curve.
+
+    Returns:
+        tuple: (output_path, number of rows written, whether the result came from the cache)
+    """
     name = obj['Name']
     input_path = obj['input_file']
-    output_path = input_path.replace(".csv", "_dered.csv")
+    output_path = derived_path(input_path, "_dered")
 
     E_BV = float(obj['E_BV'])
     R_V = float(obj['R_V'])
     A_V = R_V * E_BV
-    distance_pc = float(obj['distance_pc'])  
+    distance_pc = float(obj['distance_pc'])
+    source = _object_source(obj, source)
+
+    if mc_samples > 0 and seed is None:
+        cache = None
+    if isinstance(cache, str):
+        cache = ResultCache(cache)
+    params = {'E_BV': E_BV, 'R_V': R_V, 'distance_pc': distance_pc, 'format': os.path.splitext(output_path)[1]}
+    if bin_days:
+        params['bin_days'] = float(bin_days)
+    if source is not None:
+        params['source'] = source
+    if mc_samples > 0:
+        params.update(mc_samples=mc_samples, seed=seed,
+                      E_BV_err=_optional_param(obj, 'E_BV_err'),
+                      R_V_err=_optional_param(obj, 'R_V_err'),
+                      distance_pc_err=_optional_param(obj, 'distance_pc_err'))
+    if cache is not None:
+        hit = cache.restore('deredden_object', [input_path], params, output_path)
+        if hit is not None:
+            logger.info("%s: unchanged, restored %s from cache", name, output_path)
+            return output_path, hit.get('rows', 0), True
+
+    if chunksize:
+        if mc_samples > 0:
+            raise ValueError("Streaming mode does not support Monte Carlo draws")
+        if bin_days:
+            raise ValueError("Streaming mode does not support binning")
+        n_rows = stream_deredden(input_path, output_path, A_V, R_V, distance_pc, source=source,
+                                 chunksize=chunksize)
+        logger.info("%s: De-reddened light curve streamed to %s", name, output_path)
+        if cache is not None:
+            cache.store('deredden_object', [input_path], params, output_path, rows=n_rows)
+        return output_path, n_rows, False
 
     # Load light curve
-    df = pd.read_csv(input_path)
+    df = read_lightcurve(input_path) if source is None else read_source(input_path, source)
+    if bin_days:
+        df = bin_lightcurve(df, width=float(bin_days))
 
-    # De-redden and compute abs_mag
-    
-    df_dered = apply_reddening_df(df, A_V, R_V, band_col='filter', mag_col='mag')
+    if mc_samples > 0:
+        # De-redden and compute abs_mag with propagated uncertainties
+        df_dered = monte_carlo_deredden(
+            df, E_BV, R_V, distance_pc,
+            E_BV_err=_optional_param(obj, 'E_BV_err'),
+            R_V_err=_optional_param(obj, 'R_V_err'),
+            distance_err=_optional_param(obj, 'distance_pc_err'),
+            n_samples=mc_samples, seed=seed)
+    else:
+        # De-redden and compute abs_mag
+        df_dered = apply_reddening_df(df, A_V, R_V, band_col='filter', mag_col='mag')
 
+        # Compute abs_mag
+        if distance_pc is not None:
+            distance_modulus = 5 * np.log10(distance_pc / 10)
+            df_dered['abs_mag'] = df_dered['app_mag'] - distance_modulus
 
-    # Compute abs_mag
-    if distance_pc is not None:
-        distance_modulus = 5 * np.log10(distance_pc / 10)
-        df_dered['abs_mag'] = df_dered['app_mag'] - distance_modulus
-        
     # Save output
-    df_dered.to_csv(output_path, index=False)
-    print(f"{name}: De-reddened light curve (with mag_dereddened & abs_mag) saved to {output_path}")
+    write_lightcurve(df_dered, output_path)
+    logger.info("%s: De-reddened light curve (with mag_dereddened & abs_mag) saved to %s", name, output_path)
+    if cache is not None:
+        cache.store('deredden_object', [input_path], params, output_path, rows=len(df_dered))
+    return output_path, len(df_dered), False
+
+
+def _run_object(obj, options):
+    """
+    Runs deredden_object(obj, **options) for one params row and records timing and outcome.
+    Failures are caught and reported in the returned record instead of raised.
+    """
+    start = time.perf_counter()
+    record = {'Name': obj.get('Name'), 'status': 'ok', 'rows': 0, 'seconds': 0.0,
+              'cached': False, 'output_file': None, 'error': None}
+    try:
+        record['output_file'], record['rows'], record['cached'] = deredden_object(obj, **options)
+    except Exception as e:
+        record['status'] = 'failed'
+        record['error'] = f"{type(e).__name__}: {e}"
+        logger.error("%s: failed", record['Name'], exc_info=True)
+    record['seconds'] = time.perf_counter() - start
+    return record
+
+
+def run_batch(objects, jobs=1, **options):
+    """
+    De-reddens every object in a params table, optionally across a process pool.
+
+    Parameters:
+        objects (pd.DataFrame): Params table (Name, input_file, E_BV, R_V, distance_pc).
+        jobs (int): Number of worker processes; 1 runs serially in this process.
+        **options: Passed to deredden_object (mc_samples, seed, chunksize, cache, bin_days, source).
+
+    Returns:
+        pd.DataFrame: One row per object with status, rows, seconds, cached, output_file and error.
+    """
+    rows = objects.to_dict('records')
+    if jobs > 1 and len(rows) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = [pool.submit(_run_object, obj, options) for obj in rows]
+            records = [f.result() for f in futures]
+    else:
+        records = [_run_object(obj, options) for obj in rows]
+    return pd.DataFrame(records)
+
+
+def print_summary(summary, wall_seconds):
+    n_failed = int((summary['status'] != 'ok').sum())
+    total_rows = int(summary['rows'].sum())
+    logger.info("%s", summary[['Name', 'status', 'rows', 'seconds', 'cached']].to_string(index=False))
+    logger.info("%d/%d objects succeeded, %d rows in %.2f s wall (%.2f s summed over objects)",
+                len(summary) - n_failed, len(summary), total_rows, wall_seconds, summary['seconds'].sum())
+    for _, rec in summary[summary['status'] != 'ok'].iterrows():
+        logger.info("  %s: %s", rec['Name'], rec['error'])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="De-redden the light curves listed in a params CSV.")
+    parser.add_argument("--params", default=PARAMS_CSV,
+                        help="CSV with Name, input_file, E_BV, R_V, distance_pc columns")
+    parser.add_argument("--source", default=None,
+                        help="Raw format of the input files ('aavso', 'martini', ... or 'auto' to detect "
+                             "it); a 'source' column in the params CSV overrides it per object")
+    parser.add_argument("--mc-samples", type=int, default=0,
+                        help="Monte Carlo draws of E_BV/R_V/distance (uses *_err columns); 0 disables")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for Monte Carlo mode")
+    parser.add_argument("--jobs", type=int, default=1, help="Number of worker processes")
+    parser.add_argument("--chunksize", type=int, default=None,
+                        help="Stream each light curve in chunks of this many rows (bounded memory)")
+    parser.add_argument("--bin-days", type=float, default=None,
+                        help="Bin each light curve in time bins of this many days before de-reddening")
+    parser.add_argument("--cache-dir", default=None,
+                        help="Result cache directory; unchanged objects are restored instead of recomputed")
+    parser.add_argument("--cache-max-mb", type=float, default=DEFAULT_MAX_BYTES / 1024 ** 2,
+                        help="Size limit of the result cache (least recently used entries are evicted)")
+    parser.add_argument("--clear-cache", action="store_true", help="Invalidate all cached results first")
+    parser.add_argument("--metrics", default=None, help="Append per-stage metrics to this JSON-lines file")
+    parser.add_argument("--verbose", action="store_true", help="Debug logging (also logs stage metrics)")
+    parser.add_argument("--summary", default=None, help="Optional CSV path for the per-object run summary")
+    args = parser.parse_args(argv)
+    configure_cli_logging(verbose=args.verbose, metrics=args.metrics)
+
+    # Load object info
+    objects = pd.read_csv(args.params)
+
+    cache = None
+    if args.cache_dir:
+        cache = ResultCache(args.cache_dir, max_bytes=int(args.cache_max_mb * 1024 ** 2))
+        if args.clear_cache:
+            cache.invalidate()
+
+    start = time.perf_counter()
+    summary = run_batch(objects, jobs=args.jobs, mc_samples=args.mc_samples, seed=args.seed,
+                        chunksize=args.chunksize, cache=cache, bin_days=args.bin_days,
+                        source=args.source)
+    print_summary(summary, time.perf_counter() - start)
+
+    if args.summary:
+        summary.to_csv(args.summary, index=False)
+        logger.info("Saved run summary to %s", args.summary)
+    return summary
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,10 @@
 import pandas as pd
 import numpy as np
-import extinction
-from astropy.cosmology import Planck18 as cosmo
+from functools import lru_cache
+from statistics import NormalDist
+
+from instrumentation import instrumented
+from lightcurve import LightCurve
 
 # Band effective wavelengths in Angstroms
 BAND_WAVELENGTHS = {
@@ -14,63 +17,427 @@ BAND_WAVELENGTHS = {
     'r': 6700
 }
 
-def compute_a_lambda(band, A_V, R_V):
-    wl = BAND_WAVELENGTHS.get(band)
-    if wl is not None:
-        return extinction.fitzpatrick99(np.array([wl]), A_V, R_V, unit='aa')[0]
+# Extinction laws taking (wave, a_v, r_v); all scale linearly with A_V.
+# Values are function names in the `extinction` package, imported on first use.
+EXTINCTION_LAWS = {
+    'fitzpatrick99': 'fitzpatrick99',
+    'ccm89': 'ccm89',
+    'odonnell94': 'odonnell94',
+    'calzetti00': 'calzetti00',
+}
+
+
+def _law_function(law):
+    import extinction
+    return getattr(extinction, EXTINCTION_LAWS[law])
+
+
+@lru_cache(maxsize=256)
+def _extinction_ratios(law, R_V, bands):
+    """
+    A_lambda / A_V for every band in `bands`, from one vectorized law evaluation.
+    Cached per (law, R_V, bands) with LRU eviction.
+    """
+    wave = np.array([BAND_WAVELENGTHS[b] for b in bands], dtype=float)
+    ratios = _law_function(law)(wave, 1.0, R_V, unit='aa')
+    ratios.setflags(write=False)
+    return ratios
+
+
+def extinction_coefficients(R_V=3.1, law='fitzpatrick99', bands=None):
+    """
+    Returns the extinction coefficients A_lambda / A_V for a set of bands.
+
+    Args:
+        R_V: Total-to-selective extinction ratio.
+        law: Name of the extinction law (key of EXTINCTION_LAWS).
+        bands: Iterable of band names (default: all of BAND_WAVELENGTHS).
+    Returns:
+        pd.Series of A_lambda / A_V indexed by band.
+    """
+    if law not in EXTINCTION_LAWS:
+        raise ValueError(f"Unsupported extinction law: {law}")
+    bands = tuple(BAND_WAVELENGTHS) if bands is None else tuple(bands)
+    return pd.Series(_extinction_ratios(law, float(R_V), bands), index=list(bands))
+
+
+def band_a_lambda(bands, A_V, R_V=3.1, law='fitzpatrick99'):
+    """
+    Maps A_lambda onto a column of band names through categorical codes.
+
+    Args:
+        bands: Array-like of band names (e.g. df['filter']).
+        A_V: Visual extinction.
+        R_V: Total-to-selective extinction ratio.
+        law: Name of the extinction law.
+    Returns:
+        np.ndarray of A_lambda per entry, NaN for bands without a wavelength.
+    """
+    coeffs = extinction_coefficients(R_V, law)
+    codes = coeffs.index.get_indexer(bands)
+    # Unknown bands get code -1, which picks the trailing NaN
+    table = np.append(coeffs.to_numpy() * A_V, np.nan)
+    return table[codes]
+
+
+def compute_a_lambda(band, A_V, R_V, law='fitzpatrick99'):
+    if band in BAND_WAVELENGTHS:
+        return extinction_coefficients(R_V, law)[band] * A_V
     else:
         return np.nan
 
-def apply_reddening_df(df, A_V, R_V=3.1, remove=True, mag_col='abs_mag', new_col='app_mag', band_col='filter'):
+@instrumented()
+def apply_reddening_df(df, A_V, R_V=3.1, remove=True, mag_col='abs_mag', new_col='app_mag', band_col='filter',
+                       law='fitzpatrick99'):
     
     """
     Apply reddening or dereddening to a DataFrame using extinction curves.
     
     Args:
-        df: DataFrame with 'band' and magnitude column (default='abs_mag').
+        df: DataFrame (or LightCurve) with band column (default='filter') and magnitude column (default='abs_mag').
         A_V: Visual extinction.
         R_V: Total-to-selective extinction ratio.
         remove: If True, deredden; if False, apply reddening.
         mag_col: Name of the magnitude column to modify.
         new_col: Name of the output column with corrected magnitudes.
+        band_col: Name of the band column.
+        law: Name of the extinction law (key of EXTINCTION_LAWS).
     Returns:
-        Modified DataFrame with new_col added.
+        DataFrame (or LightCurve) with new_col added; the input is not modified and its
+        other columns are shared, not copied.
     """
-    df = df.copy()
-    df['A_lambda'] = df['filter'].apply(lambda b: compute_a_lambda(b, A_V, R_V))
+    if isinstance(df, LightCurve):
+        # A_lambda per filter category, spread over the points through the codes
+        mags = df.column(mag_col)
+        if band_col == 'filter':
+            table = np.append(band_a_lambda(df.filters, A_V, R_V, law), np.nan).astype(mags.dtype)
+            a_lambda = table[df.filter_codes]
+        else:
+            a_lambda = band_a_lambda(df.column(band_col), A_V, R_V, law)
+        return df.with_column(new_col, mags - a_lambda if remove else mags + a_lambda)
+
+    df = df.copy(deep=False)
+    a_lambda = band_a_lambda(df[band_col], A_V, R_V, law)
     
     if remove:
-        df[new_col] = df[mag_col] - df['A_lambda']
+        df[new_col] = df[mag_col].to_numpy() - a_lambda
     else:
-        df[new_col] = df[mag_col] + df['A_lambda']
+        df[new_col] = df[mag_col].to_numpy() + a_lambda
     
-    return df.drop(columns='A_lambda')
+    return df
+
+
+# Redshift grid of the distance-modulus interpolation table
+DISTMOD_Z_MIN = 1e-5
+DISTMOD_MAX_ERROR = 1e-4  # mag
+
+
+def _planck18_distmod(z):
+    from astropy.cosmology import Planck18 as cosmo
+    return cosmo.distmod(z).value
+
+
+@lru_cache(maxsize=8)
+def _distmod_table(z_max, max_error=DISTMOD_MAX_ERROR):
+    """
+    Grid of log10(z) and DM(z) - 5 log10(z) (smooth down to z -> 0) for Planck18.
+
+    The grid is doubled until linear interpolation at every midpoint is within
+    max_error of astropy; since the interpolant is smooth and the residual
+    curvature is monotonic in log z, midpoints bound the error everywhere.
+    """
+    n = 256
+    while True:
+        log_z = np.linspace(np.log10(DISTMOD_Z_MIN), np.log10(z_max), n)
+        resid = _planck18_distmod(10 ** log_z) - 5 * log_z
+        mid = 0.5 * (log_z[1:] + log_z[:-1])
+        exact = _planck18_distmod(10 ** mid) - 5 * mid
+        if np.max(np.abs(np.interp(mid, log_z, resid) - exact)) <= max_error:
+            log_z.setflags(write=False)
+            resid.setflags(write=False)
+            return log_z, resid
+        n *= 2
+
+
+def distmod_from_z(z):
+    """
+    Planck18 distance modulus for an array of redshifts via a cached interpolation
+    table, within DISTMOD_MAX_ERROR of astropy's cosmo.distmod. Below
+    DISTMOD_Z_MIN the (nearly constant) residual is held at its first value;
+    z <= 0 and NaN give NaN.
+
+    Args:
+        z: Scalar or array-like of redshifts.
+    Returns:
+        np.ndarray of distance moduli.
+    """
+    z = np.asarray(z, dtype=float)
+    valid = z > 0
+    if not valid.any():
+        return np.full(z.shape, np.nan)
+    # Table sized to the next power of two above the largest redshift, so it is reused
+    z_max = 2.0 ** np.ceil(np.log2(max(z[valid].max(), 1e-3)))
+    log_z, resid = _distmod_table(float(z_max))
+
+    lz = np.log10(np.where(valid, z, 1.0))
+    dm = 5 * lz + np.interp(lz, log_z, resid)
+    return np.where(valid, dm, np.nan)
 
 
+def distmod_from_distance(distance_pc):
+    """
+    Distance modulus 5 log10(d / 10 pc) for a scalar or array of distances in parsecs.
+    """
+    return 5 * np.log10(np.asarray(distance_pc, dtype=float)) - 5
+
+
+@instrumented()
 def appmag_to_absmag(df, mag_col='app_mag', distance_pc=None, z=None, new_col='abs_mag'):
     """
     Add an absolute magnitude column to a DataFrame using either distance or redshift.
 
     Args:
-        df: DataFrame with magnitude column (default='app_mag').
+        df: DataFrame (or LightCurve) with magnitude column (default='app_mag').
         mag_col: Name of the apparent magnitude column.
-        distance_pc: Distance in parsecs.
-        z: Redshift (alternative to distance).
+        distance_pc: Distance in parsecs: a scalar, a per-row array, or the name of a column.
+        z: Redshift (alternative to distance): a scalar, a per-row array, or the name of a column.
+            Scalars use astropy's Planck18 distmod directly; per-row redshifts go through
+            the cached interpolation table of distmod_from_z.
         new_col: Name of output absolute magnitude column.
 
     Returns:
-        Modified DataFrame with new_col added.
+        DataFrame (or LightCurve) with new_col added; the input is not modified and its
+        other columns are shared, not copied.
     """
-    df = df.copy()
+    column = df.column if isinstance(df, LightCurve) else (lambda name: df[name].to_numpy())
+    if isinstance(distance_pc, str):
+        distance_pc = column(distance_pc)
+    if isinstance(z, str):
+        z = column(z)
 
     if distance_pc is not None:
-        DM = 5 * np.log10(distance_pc / 10)
+        DM = distmod_from_distance(distance_pc)
     elif z is not None:
-        DM = cosmo.distmod(z).value
+        DM = _planck18_distmod(z) if np.ndim(z) == 0 else distmod_from_z(z)
     else:
         raise ValueError("Must provide either distance_pc or redshift (z).")
-    
-    df[new_col] = df[mag_col] - DM
+
+    if isinstance(df, LightCurve):
+        return df.with_column(new_col, column(mag_col) - DM)
+    df = df.copy(deep=False)
+    df[new_col] = df[mag_col].to_numpy() - DM
     return df
     
 
+
+
+@instrumented(rows_out=lambda cube: cube['app_mag'].size)
+def sweep_extinction(df, A_V, R_V, mag_col='mag', band_col='filter', remove=True, distance_pc=None,
+                     law='fitzpatrick99', dtype=np.float64, inplace=False):
+    """
+    Corrects one light curve for a whole grid of (A_V, R_V) hypotheses at once.
+
+    The band column is encoded once, the extinction law is evaluated once per R_V,
+    and each R_V slice of the output is filled by broadcasting over A_V, so no
+    per-scenario DataFrame is ever built.
+
+    Args:
+        df: DataFrame with band column (default='filter') and magnitude column.
+        A_V: Array-like of visual extinctions.
+        R_V: Array-like of total-to-selective extinction ratios.
+        mag_col: Name of the magnitude column to correct.
+        band_col: Name of the band column.
+        remove: If True, deredden; if False, apply reddening.
+        distance_pc: Optional distance in parsecs, a scalar or one per row.
+        law: Name of the extinction law (key of EXTINCTION_LAWS).
+        dtype: Output dtype, e.g. np.float32 to halve memory.
+        inplace: With distance_pc, shift the cube to absolute magnitudes in place
+            instead of returning apparent ones (no second cube either way).
+    Returns:
+        dict with 'app_mag' (or 'abs_mag' if inplace), an np.ndarray of shape
+        (len(df), len(A_V), len(R_V)), and with distance_pc a 'DM' array that
+        broadcasts against it (absolute magnitudes are app_mag - DM).
+    """
+    A_V = np.atleast_1d(np.asarray(A_V, dtype=float))
+    R_V = np.atleast_1d(np.asarray(R_V, dtype=float))
+    if law not in EXTINCTION_LAWS:
+        raise ValueError(f"Unsupported extinction law: {law}")
+
+    bands = tuple(BAND_WAVELENGTHS)
+    codes = pd.Index(bands).get_indexer(df[band_col])
+    mag = df[mag_col].to_numpy(dtype=dtype)
+    sign = -1 if remove else 1
+    a_v = (sign * A_V).astype(dtype)
+
+    # One law evaluation per R_V; unknown bands (code -1) pick the trailing NaN row
+    table = np.vstack([_extinction_ratios(law, float(r_v), bands) for r_v in R_V]).T
+    table = np.vstack([table, np.full(len(R_V), np.nan)]).astype(dtype)
+    row_ratios = table[codes]
+
+    app = np.empty((len(mag), len(A_V), len(R_V)), dtype=dtype)
+    np.multiply(row_ratios[:, None, :], a_v[None, :, None], out=app)
+    np.add(app, mag[:, None, None], out=app)
+
+    if distance_pc is None:
+        return {'app_mag': app}
+    DM = distmod_from_distance(distance_pc).astype(dtype)
+    DM = DM.reshape(-1, 1, 1) if DM.ndim == 1 else DM
+    if inplace:
+        np.subtract(app, DM, out=app)
+        return {'abs_mag': app, 'DM': DM}
+    return {'app_mag': app, 'DM': DM}
+
+
+def sweep_extinction_frame(df, A_V, R_V, keep_cols=('inst', 'filter', 'mjd', 'magerr'), **kwargs):
+    """
+    Same as sweep_extinction, but returned as a tidy long DataFrame with one row
+    per (point, A_V, R_V) and columns keep_cols + A_V, R_V, app_mag[, abs_mag].
+    """
+    cube = sweep_extinction(df, A_V, R_V, **kwargs)
+    DM = cube.pop('DM', None)
+    A_V = np.atleast_1d(np.asarray(A_V, dtype=float))
+    R_V = np.atleast_1d(np.asarray(R_V, dtype=float))
+    (name, values), = cube.items()
+    n, na, nr = values.shape
+
+    # C-order ravel of the cube: point index varies slowest, R_V fastest
+    rows = np.repeat(np.arange(n), na * nr)
+    out = {col: df[col].to_numpy()[rows] for col in keep_cols if col in df.columns}
+    out['A_V'] = np.tile(np.repeat(A_V, nr), n)
+    out['R_V'] = np.tile(R_V, n * na)
+    flat = values.ravel()
+    if DM is None:
+        out[name] = flat
+    else:
+        # The long columns are full size anyway; only the cube is kept single
+        dm = np.broadcast_to(DM, values.shape).ravel()
+        out['app_mag'] = flat if name == 'app_mag' else flat + dm
+        out['abs_mag'] = flat if name == 'abs_mag' else flat - dm
+    return pd.DataFrame(out)
+
+
+def extinction_ratio_matrix(R_V, bands, law='fitzpatrick99'):
+    """
+    A_lambda / A_V for many R_V values, one law evaluation per R_V.
+
+    Args:
+        R_V: Iterable of total-to-selective extinction ratios.
+        bands: Band names; bands without an entry in BAND_WAVELENGTHS get NaN columns.
+        law: Name of the extinction law (key of EXTINCTION_LAWS).
+    Returns:
+        Array of shape (len(R_V), len(bands)).
+    """
+    known = np.array([b in BAND_WAVELENGTHS for b in bands], dtype=bool)
+    wave = np.array([BAND_WAVELENGTHS[b] for b, k in zip(bands, known) if k], dtype=float)
+    out = np.full((len(R_V), len(bands)), np.nan)
+    if known.any():
+        func = _law_function(law)
+        out[:, known] = np.vstack([func(wave, 1.0, float(r_v), unit='aa') for r_v in R_V])
+    return out
+
+
+@instrumented()
+def monte_carlo_deredden(df, E_BV, R_V=3.1, distance_pc=None, E_BV_err=0.0, R_V_err=0.0,
+                         distance_err=0.0, n_samples=1000, percentiles=(16, 50, 84),
+                         mag_col='mag', band_col='filter', err_col='magerr',
+                         law='fitzpatrick99', seed=None, chunksize=100_000):
+    """
+    Deredden a DataFrame while propagating Gaussian uncertainties on E(B-V), R_V and distance.
+
+    n_samples draws of (E(B-V), R_V, distance) give a (bands x samples) array of
+    total corrections A_lambda (+ DM). Every point in a band is its magnitude
+    minus that band's correction distribution, so percentiles are taken once per
+    band and shifted onto the points: memory is bounded by bands * n_samples,
+    independent of the light-curve length. The rows are then filled in chunks of
+    `chunksize`, so temporaries stay chunk-sized too. Draws are clipped to physical
+    values (E(B-V) >= 0, R_V > 0, distance > 0).
+
+    Args:
+        df: DataFrame with band, magnitude and magnitude-error columns.
+        E_BV, R_V, distance_pc: Central values (distance optional).
+        E_BV_err, R_V_err, distance_err: 1-sigma uncertainties.
+        n_samples: Number of Monte Carlo draws.
+        percentiles: Percentiles to report, strictly between 0 and 100; the point
+            estimate is always the median.
+        mag_col, band_col, err_col: Input column names.
+        law: Name of the extinction law (key of EXTINCTION_LAWS).
+        seed: Seed for np.random.default_rng.
+        chunksize: Rows filled per step.
+    Returns:
+        Modified DataFrame with app_mag (and abs_mag) point estimates, one
+        '<col>_p<q>' column per percentile, and effective errors app_magerr
+        (and abs_magerr) combining err_col in quadrature with the Gaussian sigma
+        implied by the outer percentile range (e.g. half of p84 - p16).
+    """
+    percentiles = sorted(percentiles)
+    if not all(0 < q < 100 for q in percentiles):
+        raise ValueError(f"Percentiles must lie strictly between 0 and 100: {percentiles}")
+    # Width of the outer percentile range in Gaussian sigmas (about 2 for 16/84)
+    normal = NormalDist()
+    z_width = normal.inv_cdf(percentiles[-1] / 100) - normal.inv_cdf(percentiles[0] / 100) if percentiles else 0.0
+
+    rng = np.random.default_rng(seed)
+    ebv_s = np.clip(rng.normal(E_BV, E_BV_err, n_samples), 0, None)
+    rv_s = np.clip(rng.normal(R_V, R_V_err, n_samples), 1e-3, None)
+    av_s = rv_s * ebv_s
+
+    bands = tuple(BAND_WAVELENGTHS)
+    # (n_bands, n_samples) A_lambda per band and draw
+    corrections = {'app_mag': (extinction_ratio_matrix(rv_s, bands, law) * av_s[:, None]).T}
+    if distance_pc is not None:
+        dist_s = np.clip(rng.normal(distance_pc, distance_err, n_samples), 1e-3, None)
+        corrections['abs_mag'] = corrections['app_mag'] + distmod_from_distance(dist_s)
+
+    # Per band: percentile q of (mag - C) is mag - percentile(C, 100 - q), row 0 the
+    # median; unknown bands (code -1) pick the trailing NaN column
+    shifts, sigmas = {}, {}
+    for name, corr in corrections.items():
+        shift = np.percentile(corr, [50] + [100 - q for q in percentiles], axis=1)
+        shifts[name] = np.hstack([shift, np.full((len(percentiles) + 1, 1), np.nan)])
+        shift = shifts[name]
+        sigmas[name] = (shift[1] - shift[-1]) / z_width if z_width > 0 else 0 * shift[0]
+
+    codes = pd.Index(bands).get_indexer(df[band_col])
+    mag = df[mag_col].to_numpy(dtype=float)
+    magerr = (df[err_col].to_numpy(dtype=float) if err_col in df.columns
+              else np.zeros(len(df)))
+    out = {}
+    for name in corrections:
+        for col in [name] + [f'{name}_p{q:g}' for q in percentiles] + [f'{name}err']:
+            out[col] = np.empty(len(df))
+    for lo in range(0, len(df), chunksize):
+        rows = slice(lo, lo + chunksize)
+        c, m, e = codes[rows], mag[rows], magerr[rows]
+        for name, shift in shifts.items():
+            out[name][rows] = m - shift[0][c]
+            for k, q in enumerate(percentiles, start=1):
+                out[f'{name}_p{q:g}'][rows] = m - shift[k][c]
+            out[f'{name}err'][rows] = np.sqrt(e ** 2 + sigmas[name][c] ** 2)
+
+    df = df.copy()
+    for col, values in out.items():
+        df[col] = values
+    return df
+
+
+def deredden_chunks(chunks, A_V, R_V=3.1, distance_pc=None, mag_col='mag', band_col='filter',
+                    law='fitzpatrick99'):
+    """
+    Generator stage that de-reddens light-curve chunks one at a time.
+
+    Args:
+        chunks: Iterable of DataFrames (e.g. from lc_data.iter_lightcurve_chunks).
+        A_V: Visual extinction.
+        R_V: Total-to-selective extinction ratio.
+        distance_pc: Optional distance in parsecs; adds an 'abs_mag' column.
+        mag_col: Name of the apparent magnitude column.
+        band_col: Name of the band column.
+        law: Name of the extinction law (key of EXTINCTION_LAWS).
+    Yields:
+        Each chunk with 'app_mag' (and 'abs_mag') added.
+    """
+    for chunk in chunks:
+        chunk = apply_reddening_df(chunk, A_V, R_V, mag_col=mag_col, band_col=band_col, law=law)
+        if distance_pc is not None:
+            chunk = appmag_to_absmag(chunk, mag_col='app_mag', distance_pc=distance_pc)
+        yield chunk
@@ -0,0 +1,163 @@
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Library-wide logger; scripts configure handlers, library modules only emit
+logger = logging.getLogger('lrn')
+
+_state = {'enabled': False, 'sink': None, 'log': False}
+_sink_lock = threading.Lock()
+
+
+def enable_metrics(path=None, log=True):
+    """
+    Turns on stage metrics.
+
+    Parameters:
+        path (str, optional): JSON-lines file that receives one record per stage.
+        log (bool): Also emit each record through the 'lrn.metrics' logger at INFO level.
+    """
+    disable_metrics()
+    _state['sink'] = open(path, 'a', buffering=1) if path else None
+    _state['log'] = log
+    _state['enabled'] = True
+
+
+def disable_metrics():
+    _state['enabled'] = False
+    if _state['sink'] is not None:
+        _state['sink'].close()
+        _state['sink'] = None
+
+
+def metrics_enabled():
+    return _state['enabled']
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process in MB (None where unsupported).
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
+class StageRecord:
+    """
+    Metrics of one stage run; set rows_in / rows_out inside the `stage` block.
+    """
+    __slots__ = ('stage', 'rows_in', 'rows_out', 'extra')
+
+    def __init__(self, stage, rows_in=None, **extra):
+        self.stage = stage
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.extra = extra
+
+
+def _emit(record):
+    if _state['log']:
+        logging.getLogger('lrn.metrics').info(json.dumps(record))
+    if _state['sink'] is not None:
+        with _sink_lock:
+            _state['sink'].write(json.dumps(record) + '\n')
+
+
+@contextmanager
+def stage(name, rows_in=None, **extra):
+    """
+    Times a pipeline stage and records rows in/out, rows per second and peak RSS.
+    When metrics are disabled this only yields a StageRecord.
+
+    Usage:
+        with stage('deredden', rows_in=len(df)) as rec:
+            out = ...
+            rec.rows_out = len(out)
+    """
+    rec = StageRecord(name, rows_in, **extra)
+    if not _state['enabled']:
+        yield rec
+        return
+
+    start = time.perf_counter()
+    status = 'ok'
+    try:
+        yield rec
+    except BaseException:
+        status = 'failed'
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        rows = rec.rows_out if rec.rows_out is not None else rec.rows_in
+        _emit({
+            'ts': time.time(),
+            'stage': rec.stage,
+            'status': status,
+            'seconds': round(seconds, 6),
+            'rows_in': rec.rows_in,
+            'rows_out': rec.rows_out,
+            'rows_per_s': round(rows / seconds, 1) if rows and seconds > 0 else None,
+            'peak_rss_mb': peak_rss_mb(),
+            'pid': os.getpid(),
+            **rec.extra,
+        })
+
+
+def _row_count(value):
+    try:
+        return len(value)
+    except TypeError:
+        return None
+
+
+def instrumented(name=None, rows_out=None, count_input=True):
+    """
+    Decorator recording a `stage` for every call of the wrapped function.
+
+    rows_in is the length of the first positional argument when it has one
+    (e.g. a DataFrame) and count_input is True, rows_out the length of the
+    return value, or rows_out(result) if a callable is given. When metrics are disabled the
+    wrapper only checks a flag before calling the function.
+    """
+    def decorate(func):
+        stage_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _state['enabled']:
+                return func(*args, **kwargs)
+            rows_in = None
+            if count_input and args and not isinstance(args[0], (str, bytes)):
+                rows_in = _row_count(args[0])
+            with stage(stage_name, rows_in=rows_in) as rec:
+                result = func(*args, **kwargs)
+                rec.rows_out = rows_out(result) if rows_out else _row_count(result)
+            return result
+        return wrapper
+    return decorate
+
+
+def configure_cli_logging(verbose=False, metrics=None):
+    """
+    Logging setup for the command-line scripts: plain messages on stdout, and
+    optionally stage metrics written to a JSON-lines file.
+    """
+    logging.basicConfig(level=logging.DEBUG if verbose else logging.INFO,
+                        format='%(message)s', stream=sys.stdout)
+    if metrics:
+        enable_metrics(metrics, log=verbose)
+
+
+# Worker processes and batch jobs can opt in without code changes
+if os.environ.get('LRN_METRICS'):
+    enable_metrics(os.environ['LRN_METRICS'], log=False)
@@ -1,11 +1,25 @@
+import fnmatch
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import pandas as pd
 import numpy as np
-from datetime import datetime 
-from astropy.time import Time
-from astropy.time import Time
 from datetime import datetime, timedelta
-import extinction
-from astropy.cosmology import Planck18 as cosmo
+from instrumentation import logger, instrumented
+from lc_store import FORMAT_EXTENSIONS, read_lightcurve, storage_format, write_lightcurve, stack_incremental
+from extinction_utils import BAND_WAVELENGTHS, compute_a_lambda, apply_reddening_df, appmag_to_absmag
+
+__all__ = [
+    'ut_to_mjd', 'ut_to_mjd_batch', 'melt_wide_photometry', 'standardize_aavso', 'load_lightcurve',
+    'iter_lightcurve_chunks', 'lc_goranskij', 'lc_v838mon_goranskij', 'lc_v838mon_munari',
+    'deduplicate_lightcurve', 'bin_lightcurve', 'stack_lightcurves', 'stack_v4332sgr', 'stack_v838mon',
+    'detect_source_format', 'read_source', 'expand_sources', 'ingest_lightcurves', 'pivot_synthetic_lc',
+    'ENGLISH_MONTHS', 'STANDARD_COLUMNS', 'WIDE_SOURCE_SPECS', 'DEDUP_DEFAULTS', 'BINNED_MAG_COLUMNS',
+    'SOURCE_SIGNATURES', 'SOURCE_NAME_HINTS', 'DEREDDENED_MAG_COLUMNS',
+    # Re-exported from extinction_utils for callers that import the dereddening helpers from here
+    'BAND_WAVELENGTHS', 'compute_a_lambda', 'apply_reddening_df', 'appmag_to_absmag',
+]
 
 
 ENGLISH_MONTHS = [
@@ -33,11 +47,234 @@ def ut_to_mjd(datestr):
     base_date = datetime(year, month, day_int)
     full_date = base_date + timedelta(days=frac)
     
+    from astropy.time import Time
     return Time(full_date, scale='utc').mjd
 
 
+# "YYYY Month DD.ddd" with exactly three whitespace-separated fields, as ut_to_mjd accepts
+_UT_DATE_PATTERN = (r'^\s*(?P<year>[+-]?\d+)\s+(?P<month>[A-Za-z]+)'
+                    r'\s+(?P<day>[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)\s*$')
+_DAYS_IN_MONTH = np.array([0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+# MJD of 1970-01-01, the epoch of _days_from_civil
+_MJD_UNIX_EPOCH = 40587
+
+
+def _days_from_civil(year, month, day):
+    """
+    Days since 1970-01-01 of proleptic Gregorian dates (integer arrays), as in
+    H. Hinnant's chrono-compatible date algorithms.
+    """
+    year = year - (month <= 2)
+    era = np.floor_divide(year, 400)
+    yoe = year - era * 400
+    doy = (153 * np.where(month > 2, month - 3, month + 9) + 2) // 5 + day - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    return era * 146097 + doe - 719468
+
+
+def ut_to_mjd_batch(dates):
+    """
+    Converts a whole column of "YYYY Month DD.ddd" UT strings to MJD at once.
+
+    Each distinct string is parsed only once, with one vectorized regular-expression
+    match (pyarrow compute), and the MJD follows from calendar arithmetic, so no
+    Python code runs per date. Results agree with ut_to_mjd. Malformed entries do not
+    raise: they come back as NaN and are flagged in the returned mask.
+
+    Parameters:
+        dates (array-like): Date strings, e.g. a pd.Series read from 'dateobs'.
+
+    Returns:
+        tuple: (mjd, bad) where mjd is a float64 np.ndarray and bad is a boolean
+            np.ndarray marking entries that could not be parsed.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    dates = pd.Series(dates) if not isinstance(dates, pd.Series) else dates
+    mjd = np.full(len(dates), np.nan)
+    if dates.empty:
+        return mjd, np.zeros(0, dtype=bool)
+
+    # Memoize repeated strings: parse the unique values, broadcast back with codes.
+    # Non-string values become strings that cannot match the pattern
+    codes, uniques = pd.factorize(dates, use_na_sentinel=True)
+    if len(uniques) == 0:
+        return mjd, np.ones(len(dates), dtype=bool)
+    text = pa.array(pd.Series(uniques).astype('string[pyarrow]'))
+    fields = pc.extract_regex(text, _UT_DATE_PATTERN)
+
+    def to_float(values):
+        return values.to_numpy(zero_copy_only=False).astype(float)
+
+    year = to_float(pc.cast(pc.struct_field(fields, 'year'), pa.float64()))
+    month = to_float(pc.index_in(pc.utf8_title(pc.struct_field(fields, 'month')),
+                                 value_set=pa.array(ENGLISH_MONTHS[1:]))) + 1
+    day_frac = to_float(pc.cast(pc.struct_field(fields, 'day'), pa.float64()))
+
+    # Calendar days that datetime() accepts
+    day_int = np.floor(day_frac)
+    ok = ~(np.isnan(year) | np.isnan(month) | np.isnan(day_frac)) & (year >= 1) & (year <= 9999)
+    year_i = np.where(ok, year, 2000).astype(np.int64)
+    month_i = np.where(ok, month, 1).astype(np.int64)
+    leap = (year_i % 4 == 0) & ((year_i % 100 != 0) | (year_i % 400 == 0))
+    days_in_month = _DAYS_IN_MONTH[month_i] + ((month_i == 2) & leap)
+    ok &= (day_int >= 1) & (day_int <= days_in_month)
+
+    day_i = np.where(ok, day_int, 1).astype(np.int64)
+    unique_mjd = _days_from_civil(year_i, month_i, day_i) + _MJD_UNIX_EPOCH + (day_frac - day_int)
+    unique_mjd = np.where(ok, unique_mjd, np.nan)
+
+    valid = codes >= 0
+    mjd[valid] = unique_mjd[codes[valid]]
+    return mjd, np.isnan(mjd)
+
+
+def _ut_column_to_mjd(dates):
+    """
+    Time parser for wide sources with UT date strings; raises on malformed dates.
+    """
+    mjd, bad = ut_to_mjd_batch(dates)
+    if bad.any():
+        examples = list(pd.unique(np.asarray(dates, dtype=object)[bad]))[:3]
+        raise ValueError(f"{int(bad.sum())} unparseable date(s), e.g. {examples}")
+    return mjd
+
+
+# Column order of the standardized long-format light curve
+STANDARD_COLUMNS = ['inst', 'filter', 'mjd', 'mjderr', 'mag', 'magerr', 'ATel', 'limit']
+
+# Declarative description of every wide (one column per band) photometry source.
+#   filters:     band columns to unpivot, in output order
+#   drop_zero:   treat 0 as a missing-value sentinel in addition to NaN
+#   magerr:      default magnitude error assigned to every point
+#   inst:        instrument label written to the 'inst' column
+#   inst_col:    take the instrument label from this column instead of `inst`
+#   time_col:    column holding the epoch
+#   time_parser: optional callable turning an array of `time_col` values into MJD
+WIDE_SOURCE_SPECS = {
+    'martini': {
+        'filters': ['U', 'B', 'V', 'R', 'I'],
+        'drop_zero': False,
+        'magerr': 0.02,
+        'inst': 'martini',
+        'time_col': 'dateobs',
+        'time_parser': _ut_column_to_mjd,
+    },
+    'goranskij': {
+        'filters': ['U', 'B', 'V', 'R', 'I'],
+        'drop_zero': True,
+        'magerr': 0.1,
+        'inst': 'goranskij',
+        'time_col': 'mjd',
+    },
+    'v838mon_goranskij': {
+        'filters': ['U', 'B', 'V', 'R', 'I'],
+        'drop_zero': True,
+        'magerr': 0.02,
+        'inst': 'goranskij',
+        'time_col': 'mjd',
+    },
+    'v838mon_munari': {
+        'filters': ['U', 'B', 'V', 'R', 'I'],
+        'drop_zero': True,
+        'magerr': 0.02,
+        'inst': 'munari',
+        'time_col': 'mjd',
+    },
+    'synthetic_gr': {
+        'filters': ['g', 'r'],
+        'drop_zero': False,
+        'magerr': 0.02,
+        'inst_col': 'inst',
+        'time_col': 'mjd',
+    },
+}
+
+
+def melt_wide_photometry(df, spec):
+    """
+    Unpivots a wide photometry table (one magnitude column per band) into the
+    standardized long format in a single vectorized pass.
+
+    Rows come out in the same order a row-by-row, band-by-band loop would produce
+    them: all kept bands of the first input row, then the second row, and so on.
+
+    Parameters:
+        df (pd.DataFrame): Wide input table.
+        spec (dict or str): Source description (see WIDE_SOURCE_SPECS) or its key.
+
+    Returns:
+        pd.DataFrame: Long-format photometry with STANDARD_COLUMNS.
+    """
+    if isinstance(spec, str):
+        spec = WIDE_SOURCE_SPECS[spec]
+
+    # Bands missing from the table are skipped, as if every value were NaN
+    filters = [flt for flt in spec['filters'] if flt in df.columns]
+    if not filters or df.empty:
+        return pd.DataFrame({col: [] for col in STANDARD_COLUMNS})
+
+    mags = df[filters].to_numpy(dtype=float)
+    keep = ~np.isnan(mags)
+    if spec.get('drop_zero', False):
+        keep &= mags != 0
+
+    # Row-major nonzero keeps the (row, band) ordering of the original loops
+    row_idx, flt_idx = np.nonzero(keep)
+
+    times = df[spec['time_col']].to_numpy()
+    parser = spec.get('time_parser')
+    if parser is not None:
+        # Parse each input row at most once, and only rows that produce output
+        used_rows = np.unique(row_idx)
+        row_mjd = np.full(len(df), np.nan)
+        row_mjd[used_rows] = parser(times[used_rows])
+        mjd = row_mjd[row_idx]
+    else:
+        mjd = times[row_idx]
+
+    if 'inst_col' in spec:
+        inst = df[spec['inst_col']].to_numpy()[row_idx]
+    else:
+        inst = np.full(len(row_idx), spec['inst'], dtype=object)
+
+    n = len(row_idx)
+    return pd.DataFrame({
+        'inst': inst,
+        'filter': np.asarray(filters, dtype=object)[flt_idx],
+        'mjd': mjd,
+        'mjderr': np.zeros(n),
+        'mag': mags[row_idx, flt_idx],
+        'magerr': np.full(n, spec['magerr']),
+        'ATel': np.zeros(n, dtype=np.int64),
+        'limit': np.zeros(n, dtype=np.int64),
+    })
+
+
+def standardize_aavso(df):
+    """
+    Converts an AAVSO export (JD, Band, Magnitude, Uncertainty) to the standard long format.
+
+    Parameters:
+        df (pd.DataFrame): Raw AAVSO table (modified in place).
+
+    Returns:
+        pd.DataFrame: Long-format photometry with STANDARD_COLUMNS.
+    """
+    df['mjd'] = df['JD'] - 2400000.5
+    df['inst'] = 'aavso'
+    df['mjderr'] = 0.0
+    df['mag'] = df['Magnitude']
+    df['magerr'] = df['Uncertainty'].fillna(0.1)
+    df['ATel'] = 0
+    df['limit'] = 0
+    df['filter'] = df['Band'].str.strip().str.upper()
+
+    return df[STANDARD_COLUMNS]
 
 
+@instrumented()
 def load_lightcurve(file_path, source='martini'):
     """
     Loads and standardizes a photometry CSV file from different sources.
@@ -51,53 +288,51 @@ def load_lightcurve(file_path, source='martini'):
     """
     try:
         df = pd.read_csv(file_path)
-        print(f"{source.capitalize()} photometry data loaded successfully.")
-        print(df.head())
+        logger.info("%s photometry data loaded successfully.", source.capitalize())
+        logger.debug("%s", df.head())
     except FileNotFoundError:
-        print(f"File not found: {file_path}")
+        logger.error("File not found: %s", file_path)
         return None
     except Exception as e:
-        print(f"An error occurred while reading the file: {e}")
+        logger.error("An error occurred while reading the file: %s", e)
         return None
 
     if source == 'martini':
-        filters = ['U', 'B', 'V', 'R', 'I']
-        long_rows = []
-
-        for _, row in df.iterrows():
-            for flt in filters:
-                mag = row.get(flt)
-                if pd.isna(mag):
-                    continue
-                long_rows.append({
-                    'inst': 'martini',
-                    'filter': flt,
-                    'mjd': ut_to_mjd(row.get('dateobs')),
-                    'mjderr': 0.0,
-                    'mag': mag,
-                    'magerr': 0.02,
-                    'ATel': 0,
-                    'limit': 0
-                })
-        return pd.DataFrame(long_rows)
+        return melt_wide_photometry(df, 'martini')
 
     elif source == 'aavso':
-        df['mjd'] = df['JD'] - 2400000.5
-        df['inst'] = 'aavso'
-        df['mjderr'] = 0.0
-        df['mag'] = df['Magnitude']
-        df['magerr'] = df['Uncertainty'].fillna(0.1)
-        df['ATel'] = 0
-        df['limit'] = 0
-        df['filter'] = df['Band'].str.strip().str.upper()
-
-        cols = ['inst', 'filter', 'mjd', 'mjderr', 'mag', 'magerr', 'ATel', 'limit']
-        return df[cols]
+        return standardize_aavso(df)
 
     else:
         raise ValueError(f"Unsupported source: {source}")
 
 
+def iter_lightcurve_chunks(file_path, source='aavso', chunksize=100_000):
+    """
+    Streams a raw photometry file as standardized long-format chunks.
+
+    The file is read with read_csv(chunksize=...), so peak memory is bounded by
+    the chunk size rather than the file size.
+
+    Parameters:
+        file_path (str): Path to the raw CSV file.
+        source (str): 'aavso' or any key of WIDE_SOURCE_SPECS (e.g. 'martini').
+        chunksize (int): Number of input rows per chunk.
+
+    Yields:
+        pd.DataFrame: Standardized chunks with STANDARD_COLUMNS.
+    """
+    if source != 'aavso' and source not in WIDE_SOURCE_SPECS:
+        raise ValueError(f"Unsupported source: {source}")
+
+    for chunk in pd.read_csv(file_path, chunksize=chunksize):
+        if source == 'aavso':
+            yield standardize_aavso(chunk)
+        else:
+            yield melt_wide_photometry(chunk, source)
+
+
+@instrumented()
 def lc_goranskij(file_path):
     """
     Reads Goranskij photometry data and converts it to long-format standardized DataFrame.
@@ -110,66 +345,302 @@ def lc_goranskij(file_path):
     """
     try:
         df = pd.read_csv(file_path)
-        print("Goranskij data loaded successfully.")
+        logger.info("Goranskij data loaded successfully.")
     except Exception as e:
-        print(f"Error loading file: {e}")
+        logger.error("Error loading file: %s", e)
         return None
 
-    filters = ['U', 'B', 'V', 'R', 'I']
-    long_rows = []
+    return melt_wide_photometry(df, 'goranskij')
+
+
+
+def _inverse_variance_weights(group, n_groups, mag, err):
+    """
+    Per-row weights 1/err^2 for group-wise means. Rows without a valid error (or mag)
+    get weight 0, except in groups where no row has a valid error: there every finite
+    mag gets weight 1 (plain mean).
 
-    for _, row in df.iterrows():
-        for flt in filters:
-            mag = row[flt]
-            if mag == 0 or pd.isna(mag):
-                continue
-            long_rows.append({
-                'inst': 'goranskij',
-                'filter': flt,
-                'mjd': row['mjd'],
-                'mjderr': 0.0,
-                'mag': mag,
-                'magerr': 0.1,  # use a default magerr if none provided
-                'ATel': 0,
-                'limit': 0
-            })
+    Returns:
+        tuple: (row weights, weight sum per group, bool per group marking the plain-mean groups)
+    """
+    valid = np.isfinite(err) & (err > 0) & np.isfinite(mag)
+    w = np.where(valid, 1.0 / np.where(valid, err, 1.0) ** 2, 0.0)
+    no_err = np.bincount(group, weights=valid, minlength=n_groups) == 0
+    w = np.where(no_err[group], np.isfinite(mag).astype(float), w)
+    return w, np.bincount(group, weights=w, minlength=n_groups), no_err
 
-    return pd.DataFrame(long_rows)
 
+DEDUP_DEFAULTS = {'mjd_tol': 1e-3, 'mag_tol': 0.05, 'rule': 'priority', 'inst_priority': None}
 
 
-def stack_v4332sgr(file_paths, output_csv=None):
+def deduplicate_lightcurve(df, mjd_tol=1e-3, mag_tol=0.05, rule='priority', inst_priority=None):
     """
-    Stacks multiple standardized light curve CSVs into one.
+    Collapses duplicate points of a stacked light curve (the same epoch published by
+    several sources, or repeated rows of one source).
+
+    Rows are sorted by (filter, limit, mjd) and consecutive rows of the same filter and
+    limit flag whose mjd differ by at most mjd_tol form an epoch; each epoch is then split,
+    after a second sort by mag, wherever consecutive magnitudes differ by more than mag_tol.
+    Both steps chain, so a group can span more than the tolerances in total.
 
     Parameters:
-        file_paths (list): List of file paths to individual light curve CSVs.
-        output_csv (str, optional): If given, saves the stacked result to this path.
+        df (pd.DataFrame): Standardized light curve.
+        mjd_tol (float): Time tolerance in days.
+        mag_tol (float): Magnitude tolerance.
+        rule (str): 'priority' keeps the row of the highest-priority instrument (then smallest
+            magerr); 'weighted' replaces mjd/mag by inverse-variance weighted means and magerr
+            by the combined error (rows without a valid magerr only count when none in the
+            group has one).
+        inst_priority (list, optional): Instruments in decreasing priority; unlisted ones come
+            after, in order of appearance.
+
+    Returns:
+        pd.DataFrame: Deduplicated light curve ordered by filter and epoch, with 'n_merged'
+            (rows per group) and 'sources' ('+'-joined sorted inst values of the group).
+    """
+    if rule not in ('priority', 'weighted'):
+        raise ValueError(f"Unknown dedup rule: {rule}")
+    if df.empty:
+        return df.assign(n_merged=np.zeros(0, dtype=int), sources=pd.Series(dtype=object))
+
+    filt_codes = pd.factorize(df['filter'])[0]
+    limit = df['limit'].fillna(0).to_numpy() if 'limit' in df else np.zeros(len(df))
+    mjd = df['mjd'].to_numpy(dtype=float)
+    mag = df['mag'].to_numpy(dtype=float)
+    order = np.lexsort((mjd, limit, filt_codes))
+    new_epoch = np.ones(len(df), dtype=bool)
+    new_epoch[1:] = ((filt_codes[order][1:] != filt_codes[order][:-1])
+                     | (limit[order][1:] != limit[order][:-1])
+                     | ~(np.diff(mjd[order]) <= mjd_tol))
+    epoch = np.cumsum(new_epoch)
+
+    # Within an epoch, distinct magnitudes (e.g. two real points) stay separate
+    sub = np.lexsort((mag[order], epoch))
+    order, epoch = order[sub], epoch[sub]
+    mjd_s, mag_s = mjd[order], mag[order]
+    new_group = np.ones(len(df), dtype=bool)
+    new_group[1:] = (epoch[1:] != epoch[:-1]) | ~(np.abs(np.diff(mag_s)) <= mag_tol)
+    group = np.cumsum(new_group) - 1
+    n_groups = group[-1] + 1
+    sizes = np.bincount(group, minlength=n_groups)
+
+    inst_codes, insts = pd.factorize(df['inst'])
+    ranks = np.arange(len(insts))
+    if inst_priority:
+        listed = {inst: i for i, inst in enumerate(inst_priority)}
+        ranks = np.array([listed.get(inst, len(listed) + i) for i, inst in enumerate(insts)])
+    inst_rank = np.where(inst_codes >= 0, ranks[np.maximum(inst_codes, 0)], len(ranks) + len(inst_priority or ()))
+    magerr = df['magerr'].to_numpy(dtype=float) if 'magerr' in df else np.full(len(df), np.nan)
+
+    # Representative row per group: best instrument rank, then smallest magerr (NaN last)
+    best = np.lexsort((magerr[order], inst_rank[order], group))
+    first = np.searchsorted(group[best], np.arange(n_groups))
+    out = df.iloc[order[best[first]]].reset_index(drop=True)
+
+    if rule == 'weighted':
+        w, w_sum, no_err = _inverse_variance_weights(group, n_groups, mag_s, magerr[order])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean_mag = np.bincount(group, weights=w * np.nan_to_num(mag_s), minlength=n_groups) / w_sum
+            mean_mjd = np.bincount(group, weights=w * mjd_s, minlength=n_groups) / w_sum
+            combined_err = 1.0 / np.sqrt(np.bincount(group, weights=np.where(no_err[group], 0.0, w),
+                                                     minlength=n_groups))
+        # Only single rows with a NaN mag have no weight at all; they are kept as they are
+        out['mag'] = np.where(w_sum > 0, mean_mag, out['mag'].to_numpy(dtype=float))
+        out['mjd'] = np.where(w_sum > 0, mean_mjd, out['mjd'].to_numpy(dtype=float))
+        if 'magerr' in out:
+            out['magerr'] = np.where(no_err, np.where(sizes == 1, out['magerr'].to_numpy(dtype=float), np.nan),
+                                     combined_err)
+
+    out['n_merged'] = sizes
+    out['sources'] = _group_sources(group, inst_codes[order], insts, np.searchsorted(group, np.arange(n_groups)))
+
+    logger.info("Deduplicated %d rows into %d (%d merged groups)", len(df), n_groups, int((sizes > 1).sum()))
+    return out
+
+
+def _group_sources(group, codes, insts, starts):
+    """
+    '+'-joined sorted instrument names per group; group must be sorted, codes are
+    pd.factorize codes of the rows in the same order and starts the first row of each group.
+    """
+    names = np.append(insts.astype(str).to_numpy(dtype=object), '')
+    codes = np.where(codes >= 0, codes, len(insts))
+    if len(names) > 62:
+        pairs = pd.DataFrame({'group': group, 'inst': names[codes]}).drop_duplicates()
+        return pairs.sort_values(['group', 'inst']).groupby('group')['inst'].agg('+'.join).to_numpy()
+
+    # One bit per instrument, OR-ed over each group; only the distinct masks are turned into strings
+    masks = np.bitwise_or.reduceat(np.left_shift(np.int64(1), codes.astype(np.int64)), starts)
+    uniq, inverse = np.unique(masks, return_inverse=True)
+    labels = np.array(['+'.join(sorted(n for i, n in enumerate(names) if m >> i & 1 and n)) for m in uniq],
+                      dtype=object)
+    return labels[inverse]
+
+
+BINNED_MAG_COLUMNS = ['mag', 'app_mag', 'abs_mag', 'mag_dereddened']
+
+
+def bin_lightcurve(df, width=1.0, by_inst=False, origin=0.0):
+    """
+    Bins a standardized light curve in time, per filter (and optionally per instrument).
+    Detections and upper limits are binned separately; rows without a magnitude are dropped.
+
+    Each bin gets the inverse-variance weighted mean of every magnitude column present
+    (mag, app_mag, abs_mag, mag_dereddened; plain mean if no point has a valid magerr),
+    magerr = 1/sqrt(sum of weights), the mean mjd, mjderr = the time span of its points
+    and the number of points 'n_points'. Everything is computed with one argsort and
+    NumPy segment reductions.
+
+    Parameters:
+        df (pd.DataFrame): Standardized light curve.
+        width (float): Bin width in days.
+        by_inst (bool): Keep instruments apart. Otherwise 'inst' lists the '+'-joined
+            instruments of each bin.
+        origin (float): MJD of a bin edge (e.g. 0.5 to cut bins at noon UT instead of midnight).
+
+    Returns:
+        pd.DataFrame: One row per bin, ordered by filter, instrument and time.
+    """
+    if width <= 0:
+        raise ValueError("Bin width must be positive")
+    mag = df['mag'].to_numpy(dtype=float)
+    if not np.isfinite(mag).all():
+        df = df[np.isfinite(mag)]
+        mag = mag[np.isfinite(mag)]
+    if df.empty:
+        return df.assign(n_points=np.zeros(0, dtype=int))
+
+    mjd = df['mjd'].to_numpy(dtype=float)
+    time_bin = np.floor((mjd - origin) / width).astype(np.int64)
+    time_bin -= time_bin.min()
+    filt_codes, filters = pd.factorize(df['filter'], use_na_sentinel=False)
+    inst_codes, insts = pd.factorize(df['inst'])
+    limit = (df['limit'].fillna(0).to_numpy() != 0).astype(np.int64) if 'limit' in df else np.zeros(len(df), np.int64)
+
+    # One int64 sort key: filter, then instrument, then limit flag, then time bin
+    key = filt_codes.astype(np.int64)
+    if by_inst:
+        key = key * (len(insts) + 1) + (inst_codes + 1)
+    key = (key * 2 + limit) * (time_bin.max() + 1) + time_bin
+    order = np.argsort(key, kind='stable')
+    key_s = key[order]
+    starts = np.flatnonzero(np.r_[True, key_s[1:] != key_s[:-1]])
+    n_bins = len(starts)
+    counts = np.diff(np.r_[starts, len(key_s)])
+    group = np.repeat(np.arange(n_bins), counts)
+
+    out = df.iloc[order[starts]].reset_index(drop=True)
+    mjd_s = mjd[order]
+    out['mjd'] = np.add.reduceat(mjd_s, starts) / counts
+    out['mjderr'] = np.maximum.reduceat(mjd_s, starts) - np.minimum.reduceat(mjd_s, starts)
+
+    err_s = df['magerr'].to_numpy(dtype=float)[order] if 'magerr' in df else np.full(len(df), np.nan)
+    w, w_sum, no_err = _inverse_variance_weights(group, n_bins, mag[order], err_s)
+    for col in BINNED_MAG_COLUMNS:
+        if col in df:
+            # Missing values (e.g. app_mag of a band without a wavelength) drop out of
+            # their bin's mean; a bin with none left stays NaN
+            values = df[col].to_numpy(dtype=float)[order]
+            finite = np.isfinite(values)
+            w_col = w * finite
+            w_sum_col = np.add.reduceat(w_col, starts)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                mean = np.add.reduceat(w_col * np.where(finite, values, 0.0), starts) / w_sum_col
+            out[col] = np.where(w_sum_col > 0, mean, np.nan)
+    with np.errstate(divide='ignore'):
+        out['magerr'] = np.where(no_err, np.nan, 1.0 / np.sqrt(w_sum))
+    if 'ATel' in df:
+        out['ATel'] = np.maximum.reduceat(df['ATel'].fillna(0).to_numpy()[order], starts)
+    if not by_inst:
+        out['inst'] = _group_sources(group, inst_codes[order], insts, starts)
+    out['n_points'] = counts
+    return out
+
+
+def stack_lightcurves(file_paths, output_csv=None, cache_dir=None, dedup=None, binning=None):
+    """
+    Stacks multiple standardized light curve files into one (shared by the
+    object-specific stack_* functions).
+
+    Parameters:
+        file_paths (list): List of file paths to individual light curve files (CSV, Parquet or Feather).
+        output_csv (str, optional): If given, saves the stacked result to this path
+            (format picked from the extension).
+        cache_dir (str, optional): If given, stack incrementally: only new or changed
+            inputs are re-read (see lc_store.stack_incremental).
+        dedup (bool or dict, optional): Collapse duplicate points across inputs with
+            deduplicate_lightcurve; True uses DEDUP_DEFAULTS, a dict overrides them.
+        binning (bool or dict, optional): Bin the stacked curve with bin_lightcurve (after
+            deduplication); True bins per night, a dict is passed as its options.
 
     Returns:
         pd.DataFrame: Combined DataFrame of all input light curves.
     """
-    dfs = []
-    for path in file_paths:
-        try:
-            df = pd.read_csv(path)
-            dfs.append(df)
-        except Exception as e:
-            print(f"Could not read {path}: {e}")
-    
-    if not dfs:
-        print("No valid files to stack.")
-        return None
+    if cache_dir:
+        combined, report = stack_incremental(file_paths, cache_dir)
+        logger.info("Incremental stack: %d added, %d updated, %d unchanged, %d removed",
+                    len(report['added']), len(report['updated']), len(report['unchanged']), len(report['removed']))
+        if combined is None:
+            logger.warning("No valid files to stack.")
+            return None
+    else:
+        dfs = []
+        for path in file_paths:
+            try:
+                df = read_lightcurve(path)
+                dfs.append(df)
+            except Exception as e:
+                logger.warning("Could not read %s: %s", path, e)
+
+        if not dfs:
+            logger.warning("No valid files to stack.")
+            return None
+
+        combined = pd.concat(dfs, ignore_index=True)
+
+    return _finish_stack(combined, output_csv, dedup, binning)
+
+
+def _finish_stack(combined, output_csv=None, dedup=None, binning=None):
+    """
+    Optional deduplication, binning and saving of a stacked light curve.
+    """
+    if dedup:
+        options = {**DEDUP_DEFAULTS, **(dedup if isinstance(dedup, dict) else {})}
+        combined = deduplicate_lightcurve(combined, **options)
+    if binning:
+        combined = bin_lightcurve(combined, **(binning if isinstance(binning, dict) else {}))
 
-    combined = pd.concat(dfs, ignore_index=True)
-    
     if output_csv:
-        combined.to_csv(output_csv, index=False)
-        print(f"Saved stacked light curve to {output_csv}")
+        write_lightcurve(combined, output_csv)
+        logger.info("Saved stacked light curve to %s", output_csv)
 
     return combined
 
 
+@instrumented(count_input=False)
+def stack_v4332sgr(file_paths, output_csv=None, cache_dir=None, dedup=None, binning=None):
+    """
+    Stacks multiple standardized light curve files into one.
+
+    Parameters:
+        file_paths (list): List of file paths to individual light curve files (CSV, Parquet or Feather).
+        output_csv (str, optional): If given, saves the stacked result to this path
+            (format picked from the extension).
+        cache_dir (str, optional): If given, stack incrementally: only new or changed
+            inputs are re-read (see lc_store.stack_incremental).
+        dedup (bool or dict, optional): Collapse duplicate points across inputs with
+            deduplicate_lightcurve; True uses DEDUP_DEFAULTS, a dict overrides them.
+        binning (bool or dict, optional): Bin the stacked curve with bin_lightcurve (after
+            deduplication); True bins per night, a dict is passed as its options.
+
+    Returns:
+        pd.DataFrame: Combined DataFrame of all input light curves.
+    """
+    return stack_lightcurves(file_paths, output_csv, cache_dir, dedup, binning)
+
+
+@instrumented()
 def lc_v838mon_goranskij(file_path):
     """
     Reads Goranskij photometry data and converts it to long-format standardized DataFrame.
@@ -182,33 +653,15 @@ def lc_v838mon_goranskij(file_path):
     """
     try:
         df = pd.read_csv(file_path)
-        print("Goranskij data loaded successfully.")
+        logger.info("Goranskij data loaded successfully.")
     except Exception as e:
-        print(f"Error loading file: {e}")
+        logger.error("Error loading file: %s", e)
         return None
 
-    filters = ['U', 'B', 'V', 'R', 'I']
-    long_rows = []
-
-    for _, row in df.iterrows():
-        for flt in filters:
-            mag = row[flt]
-            if mag == 0 or pd.isna(mag):
-                continue
-            long_rows.append({
-                'inst': 'goranskij',
-                'filter': flt,
-                'mjd': row['mjd'],
-                'mjderr': 0.0,
-                'mag': mag,
-                'magerr': 0.02, 
-                'ATel': 0,
-                'limit': 0
-            })
-
-    return pd.DataFrame(long_rows)
+    return melt_wide_photometry(df, 'v838mon_goranskij')
 
 
+@instrumented()
 def lc_v838mon_munari(file_path):
     """
     Reads Goranskij photometry data and converts it to long-format standardized DataFrame.
@@ -221,173 +674,239 @@ def lc_v838mon_munari(file_path):
     """
     try:
         df = pd.read_csv(file_path)
-        print("Goranskij data loaded successfully.")
+        logger.info("Goranskij data loaded successfully.")
     except Exception as e:
-        print(f"Error loading file: {e}")
+        logger.error("Error loading file: %s", e)
         return None
 
-    filters = ['U', 'B', 'V', 'R', 'I']
-    long_rows = []
-
-    for _, row in df.iterrows():
-        for flt in filters:
-            mag = row[flt]
-            if mag == 0 or pd.isna(mag):
-                continue
-            long_rows.append({
-                'inst': 'munari',
-                'filter': flt,
-                'mjd': row['mjd'],
-                'mjderr': 0.0,
-                'mag': mag,
-                'magerr': 0.02, 
-                'ATel': 0,
-                'limit': 0
-            })
-
-    return pd.DataFrame(long_rows)
+    return melt_wide_photometry(df, 'v838mon_munari')
 
-def stack_v838mon(file_paths, output_csv=None):
+@instrumented(count_input=False)
+def stack_v838mon(file_paths, output_csv=None, cache_dir=None, dedup=None, binning=None):
     """
-    Stacks multiple standardized light curve CSVs into one.
+    Stacks multiple standardized light curve files into one.
 
     Parameters:
-        file_paths (list): List of file paths to individual light curve CSVs.
-        output_csv (str, optional): If given, saves the stacked result to this path.
+        file_paths (list): List of file paths to individual light curve files (CSV, Parquet or Feather).
+        output_csv (str, optional): If given, saves the stacked result to this path
+            (format picked from the extension).
+        cache_dir (str, optional): If given, stack incrementally: only new or changed
+            inputs are re-read (see lc_store.stack_incremental).
+        dedup (bool or dict, optional): Collapse duplicate points across inputs with
+            deduplicate_lightcurve; True uses DEDUP_DEFAULTS, a dict overrides them.
+        binning (bool or dict, optional): Bin the stacked curve with bin_lightcurve (after
+            deduplication); True bins per night, a dict is passed as its options.
 
     Returns:
         pd.DataFrame: Combined DataFrame of all input light curves.
     """
-    dfs = []
-    for path in file_paths:
-        try:
-            df = pd.read_csv(path)
-            dfs.append(df)
-        except Exception as e:
-            print(f"Could not read {path}: {e}")
-    
-    if not dfs:
-        print("No valid files to stack.")
-        return None
+    return stack_lightcurves(file_paths, output_csv, cache_dir, dedup, binning)
 
-    combined = pd.concat(dfs, ignore_index=True)
-    
-    if output_csv:
-        combined.to_csv(output_csv, index=False)
-        print(f"Saved stacked light curve to {output_csv}")
 
-    return combined
 
+# Header signatures of the raw sources, checked in order by detect_source_format:
+# format -> (columns that must all be present, columns of which at least one must be)
+SOURCE_SIGNATURES = {
+    'standard': (['inst', 'filter', 'mjd', 'mag'], []),
+    'aavso': (['JD', 'Band', 'Magnitude'], []),
+    'martini': (['dateobs'], ['U', 'B', 'V', 'R', 'I']),
+    'goranskij': (['mjd'], ['U', 'B', 'V', 'R', 'I']),
+}
 
+# Wide mjd+UBVRI tables differ only in instrument and error model, which the header
+# does not tell apart: file-name substrings pick the source, checked in order
+SOURCE_NAME_HINTS = {
+    'munari': 'v838mon_munari',
+    'v838': 'v838mon_goranskij',
+}
 
 
-def pivot_synthetic_lc(input_csv, output_csv):
-    df = pd.read_csv(input_csv)
+def detect_source_format(file_path):
+    """
+    Detects the source format of a raw photometry file from its header.
 
-    # Fill synthetic g and r by prioritizing 'strict' when available
-    df['g'] = df['g_synth_strict'].combine_first(df['g_synth'])
-    df['r'] = df['r_synth_strict'].combine_first(df['r_synth'])
+    Only the header line of a CSV is read. Parquet and Feather files are taken to be
+    standardized already. Wide mjd+UBVRI tables map to 'goranskij' unless the file name
+    matches one of SOURCE_NAME_HINTS.
 
-    # Prepare long format rows
-    records = []
-    for _, row in df.iterrows():
-        for band in ['g', 'r']:  # Only g and r for the filter column
-            mag = row[band]
-            if pd.notna(mag):
-                records.append({
-                    'inst': row['inst'],
-                    'filter': band,  # 'filter' will be either 'g' or 'r'
-                    'mjd': row['mjd'],
-                    'mjderr': 0,
-                    'mag': mag,
-                    'magerr': 0.02,
-                    'ATel': 0,
-                    'limit': 0,
-                    'A_lambda': np.nan,
-                    'mag_dereddened': mag  # Already dereddened in synthetic data
-                   # 'abs_mag': np.nan,  # Fill this later if needed
-                })
-    
-    # Convert the list of records into a DataFrame
-    long_df = pd.DataFrame(records)
+    Parameters:
+        file_path (str): Path to the file.
 
-    # Save the DataFrame to CSV
-    long_df.to_csv(output_csv, index=False)
-    print(f"Pivoted light curve data saved to {output_csv}")
+    Returns:
+        str: 'standard', 'aavso', 'martini' or a mjd+UBVRI key of WIDE_SOURCE_SPECS.
+    """
+    if storage_format(file_path) != 'csv':
+        return 'standard'
+    header = {str(col).strip() for col in pd.read_csv(file_path, nrows=0).columns}
+    for source, (required, any_of) in SOURCE_SIGNATURES.items():
+        if header.issuperset(required) and (not any_of or header.intersection(any_of)):
+            if source == 'goranskij':
+                name = os.path.basename(file_path).lower()
+                source = next((s for hint, s in SOURCE_NAME_HINTS.items() if hint in name), source)
+            return source
+    raise ValueError(f"Unrecognized photometry format of {file_path}: columns {sorted(header)}")
+
+
+def read_source(file_path, source):
+    """
+    Reads and standardizes one raw photometry file of a known source, raising on errors
+    (unlike load_lightcurve and the lc_* loaders, which log them and return None).
 
-    df_long = pd.DataFrame(records)
-    df_long.to_csv(output_csv, index=False)
-    print(f"Pivoted and saved to {output_csv}")
-    
+    Parameters:
+        file_path (str): Path to the file.
+        source (str): 'standard', 'aavso' or a key of WIDE_SOURCE_SPECS.
 
+    Returns:
+        pd.DataFrame: Long-format photometry with STANDARD_COLUMNS.
+    """
+    if source == 'standard':
+        return read_lightcurve(file_path)
+    if source != 'aavso' and source not in WIDE_SOURCE_SPECS:
+        raise ValueError(f"Unsupported source: {source}")
+    df = pd.read_csv(file_path)
+    df.columns = [str(col).strip() for col in df.columns]
+    if source == 'aavso':
+        return standardize_aavso(df)
+    return melt_wide_photometry(df, source)
 
-# Band effective wavelengths in Angstroms
-BAND_WAVELENGTHS = {
-    'U': 3600,
-    'B': 4400,
-    'V': 5500,
-    'R': 7100,
-    'I': 9700,
-    'g': 5200,
-    'r': 6700
-}
 
-def compute_a_lambda(band, A_V, R_V):
-    wl = BAND_WAVELENGTHS.get(band)
-    if wl is not None:
-        return extinction.fitzpatrick99(np.array([wl]), A_V, R_V, unit='aa')[0]
-    else:
-        return np.nan
+def expand_sources(sources):
+    """
+    Expands a directory, glob pattern, file path or list of them into a sorted list of
+    light curve files (directories contribute every file with a known extension).
+    """
+    if isinstance(sources, (str, os.PathLike)):
+        sources = [sources]
+    paths = []
+    for source in sources:
+        source = os.fspath(source)
+        if os.path.isdir(source):
+            paths += [os.path.join(source, name) for name in sorted(os.listdir(source))
+                      if os.path.splitext(name)[1].lower() in FORMAT_EXTENSIONS]
+        elif glob.has_magic(source):
+            paths += sorted(glob.glob(source))
+        else:
+            paths.append(source)
+    return list(dict.fromkeys(paths))
+
+
+def _ingest_file(args):
+    """
+    Detects (unless given), reads and standardizes one file; never raises. Top-level so
+    it can run in worker processes.
+    """
+    path, source = args
+    start = time.perf_counter()
+    record = {'path': path, 'source': source, 'detected': source is None, 'rows': 0,
+              'seconds': 0.0, 'status': 'ok', 'error': None}
+    df = None
+    try:
+        if source is None:
+            record['source'] = detect_source_format(path)
+        df = read_source(path, record['source'])
+        record['rows'] = len(df)
+    except Exception as e:
+        record['status'], record['error'] = 'failed', f"{type(e).__name__}: {e}"
+    record['seconds'] = time.perf_counter() - start
+    return df, record
 
-def apply_reddening_df(df, A_V, R_V=3.1, remove=True, mag_col='abs_mag', new_col='app_mag', band_col='filter'):
-    
+
+@instrumented(count_input=False)
+def ingest_lightcurves(sources, formats=None, workers=1, executor='process', output_csv=None,
+                       dedup=None, binning=None):
     """
-    Apply reddening or dereddening to a DataFrame using extinction curves.
-    
-    Args:
-        df: DataFrame with 'band' and magnitude column (default='abs_mag').
-        A_V: Visual extinction.
-        R_V: Total-to-selective extinction ratio.
-        remove: If True, deredden; if False, apply reddening.
-        mag_col: Name of the magnitude column to modify.
-        new_col: Name of the output column with corrected magnitudes.
+    Loads many raw photometry files of mixed formats into one standardized light curve.
+
+    Each file's format is detected from its header (see detect_source_format), and files
+    are read and standardized concurrently. Files that cannot be detected or read are
+    reported and left out of the stack.
+
+    Parameters:
+        sources (str or list): Directory, glob pattern, file path, or a list of them.
+        formats (dict, optional): Explicit formats, {file name or glob pattern: source},
+            overriding detection for matching files.
+        workers (int): Number of workers; 1 reads serially in this process.
+        executor (str): 'process' (parsing-bound inputs such as martini date strings) or
+            'thread' (cheaper to start, fine for I/O-bound or already standardized files).
+        output_csv (str, optional): If given, saves the stacked result to this path.
+        dedup (bool or dict, optional): As for stack_lightcurves.
+        binning (bool or dict, optional): As for stack_lightcurves.
+
     Returns:
-        Modified DataFrame with new_col added.
+        tuple: (stacked pd.DataFrame or None if no file loaded, report pd.DataFrame with
+            one row per file: path, source, detected, rows, seconds, status, error).
     """
-    df = df.copy()
-    df['A_lambda'] = df['filter'].apply(lambda b: compute_a_lambda(b, A_V, R_V))
-    
-    if remove:
-        df[new_col] = df[mag_col] - df['A_lambda']
+    if executor not in ('process', 'thread'):
+        raise ValueError(f"Unsupported executor: {executor}")
+    paths = expand_sources(sources)
+    jobs = []
+    for path in paths:
+        name = os.path.basename(path)
+        source = next((fmt for pattern, fmt in (formats or {}).items()
+                       if fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(path, pattern)), None)
+        jobs.append((path, source))
+
+    if workers > 1 and len(jobs) > 1:
+        pool_class = ProcessPoolExecutor if executor == 'process' else ThreadPoolExecutor
+        with pool_class(max_workers=workers) as pool:
+            results = list(pool.map(_ingest_file, jobs))
     else:
-        df[new_col] = df[mag_col] + df['A_lambda']
-    
-    return df.drop(columns='A_lambda')
+        results = [_ingest_file(job) for job in jobs]
+
+    report = pd.DataFrame([record for _, record in results],
+                          columns=['path', 'source', 'detected', 'rows', 'seconds', 'status', 'error'])
+    for record in report[report['status'] != 'ok'].itertuples():
+        logger.warning("Could not ingest %s: %s", record.path, record.error)
+    logger.info("Ingested %d of %d files (%d rows)", (report['status'] == 'ok').sum(), len(report),
+                report['rows'].sum())
+
+    dfs = [df for df, _ in results if df is not None]
+    if not dfs:
+        logger.warning("No valid files to stack.")
+        return None, report
+    combined = _finish_stack(pd.concat(dfs, ignore_index=True), output_csv, dedup, binning)
+    return combined, report
 
 
-def appmag_to_absmag(df, mag_col='app_mag', distance_pc=None, z=None, new_col='abs_mag'):
+
+# De-reddened magnitude columns, in order of preference, used to derive synthetic g/r
+DEREDDENED_MAG_COLUMNS = ['app_mag', 'mag_dereddened', 'mag']
+
+
+@instrumented()
+def pivot_synthetic_lc(input_csv, output_csv, transform='jester05', tol=1.0, strict_tol=0.1):
     """
-    Add an absolute magnitude column to a DataFrame using either distance or redshift.
+    Converts synthetic g/r photometry to the standardized long format.
 
-    Args:
-        df: DataFrame with magnitude column (default='app_mag').
-        mag_col: Name of the apparent magnitude column.
-        distance_pc: Distance in parsecs.
-        z: Redshift (alternative to distance).
-        new_col: Name of output absolute magnitude column.
+    The input is either a wide table with g_synth, g_synth_strict, r_synth and r_synth_strict
+    columns, or a standardized (de-reddened) B/V/R light curve, from which the synthetic
+    g/r are computed first with colors.synthetic_gr_table (transform, tol and strict_tol
+    are passed on; the first of app_mag, mag_dereddened and mag present is used).
+
+    Parameters:
+        input_csv (str): Input table (CSV, Parquet or Feather).
+        output_csv (str): Output path (format picked from the extension).
 
     Returns:
-        Modified DataFrame with new_col added.
+        pd.DataFrame: Long-format g and r rows with mag_dereddened.
     """
-    df = df.copy()
+    df = read_lightcurve(input_csv)
+    if 'g_synth' not in df.columns:
+        from colors import synthetic_gr_table
+        mag_col = next(c for c in DEREDDENED_MAG_COLUMNS if c in df.columns)
+        df = synthetic_gr_table(df, transform=transform, tol=tol, strict_tol=strict_tol, mag_col=mag_col)
 
-    if distance_pc is not None:
-        DM = 5 * np.log10(distance_pc / 10)
-    elif z is not None:
-        DM = cosmo.distmod(z).value
-    else:
-        raise ValueError("Must provide either distance_pc or redshift (z).")
-    
-    df[new_col] = df[mag_col] - DM
-    return df
-    
+    # Fill synthetic g and r by prioritizing 'strict' when available
+    df['g'] = df['g_synth_strict'].combine_first(df['g_synth'])
+    df['r'] = df['r_synth_strict'].combine_first(df['r_synth'])
+
+    # Prepare long format rows (only g and r for the filter column)
+    long_df = melt_wide_photometry(df, 'synthetic_gr')
+    long_df['mjderr'] = 0
+    long_df['A_lambda'] = np.nan
+    long_df['mag_dereddened'] = long_df['mag']  # Already dereddened in synthetic data
+
+    # Save the DataFrame to CSV
+    write_lightcurve(long_df, output_csv)
+    logger.info("Pivoted light curve data saved to %s", output_csv)
+    return long_df
@@ -0,0 +1,241 @@
+"""
+Light-curve features per (object, filter): peak magnitude and epoch, rise time and
+decline rates (magnitude drop 15, 50 and 100 days after peak), computed for a
+whole catalog at once from the de-reddened light curves.
+
+Usage:
+    python lc_features.py obj1_dered.parquet obj2_dered.parquet --output features.csv
+    python lc_features.py --params lrn_params.csv --workers 8 --output features.parquet
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import configure_cli_logging, instrumented, logger
+from lc_store import derived_path, read_lightcurve, write_lightcurve
+
+DECLINE_DAYS = (15, 50, 100)
+
+
+def _window_sums(t, values, half_width):
+    """
+    Sums of `values` over [t - half_width, t + half_width] for every point of a sorted
+    time axis, from one cumulative sum and two searchsorted calls.
+    """
+    csum = np.r_[0.0, np.cumsum(values)]
+    lo = np.searchsorted(t, t - half_width, side='left')
+    hi = np.searchsorted(t, t + half_width, side='right')
+    return csum[hi] - csum[lo]
+
+
+@instrumented()
+def light_curve_features(df, mag_col='abs_mag', err_col='magerr', band_col='filter', by=None,
+                         smooth_days=5.0, decline_days=DECLINE_DAYS):
+    """
+    Computes peak, rise and decline features for every (object, filter) light curve.
+
+    Points are sorted once by (object, filter, mjd). Each light curve is smoothed with an
+    inverse-variance weighted moving average of width smooth_days (all curves at once, on a
+    composite time axis that keeps them apart), and the features are read off the smoothed
+    curve with segment reductions. Upper limits and rows without a magnitude are ignored.
+
+    Parameters:
+        df (pd.DataFrame): Light curve(s) in the standard long format.
+        mag_col (str): Magnitude column ('abs_mag' as written by deredden_script, or 'app_mag', 'mag').
+        err_col (str): Error column used for the smoothing weights (equal weights if missing).
+        band_col (str): Band column.
+        by (str, optional): Object column for a catalog of many objects.
+        smooth_days (float): Width of the smoothing window in days (0 disables smoothing).
+        decline_days (iterable): Days after peak at which to measure the decline.
+
+    Returns:
+        pd.DataFrame: One row per [object and] filter with n_points, first_mjd, last_mjd,
+            peak_mjd, peak_mag, rise_time (days from first point to peak), rise_rate and,
+            per N in decline_days, dm<N> (mag drop N days after peak, linearly interpolated
+            on the smoothed curve; NaN past the last point) and decline_rate<N> (dm<N> / N).
+    """
+    mag = df[mag_col].to_numpy(dtype=float)
+    usable = np.isfinite(mag)
+    if 'limit' in df:
+        usable &= df['limit'].fillna(0).to_numpy() == 0
+    data = df[usable]
+
+    key_cols = ([by] if by else []) + [band_col]
+    decline_cols = [c for n in decline_days for c in (f"dm{n}", f"decline_rate{n}")]
+    columns = key_cols + ['n_points', 'first_mjd', 'last_mjd', 'peak_mjd', 'peak_mag', 'rise_time',
+                          'rise_rate'] + decline_cols
+    if data.empty:
+        return pd.DataFrame(columns=columns)
+
+    # One integer code per (object, filter), from per-column factorizations
+    codes = np.zeros(len(data), dtype=np.int64)
+    levels = []
+    for col in key_cols:
+        col_codes, col_uniques = pd.factorize(data[col])
+        codes = codes * len(col_uniques) + col_codes
+        levels.append(col_uniques)
+    used, codes = np.unique(codes, return_inverse=True)
+    mjd = data['mjd'].to_numpy(dtype=float)
+    mag = data[mag_col].to_numpy(dtype=float)
+    err = data[err_col].to_numpy(dtype=float) if err_col in data else np.full(len(data), np.nan)
+
+    order = np.lexsort((mjd, codes))
+    codes, mjd, mag, err = codes[order], mjd[order], mag[order], err[order]
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    ends = np.r_[starts[1:], len(codes)] - 1
+    n_curves = len(starts)
+
+    # Composite time axis so windows and lookups never cross into a neighbouring curve:
+    # curve k occupies [k * stride, (k + 1) * stride), already sorted by the lexsort above
+    t0 = mjd.min()
+    stride = mjd.max() - t0 + 2 * max(smooth_days, max(decline_days, default=0)) + 1.0
+    t = codes * stride + (mjd - t0)
+
+    valid = np.isfinite(err) & (err > 0)
+    w = np.where(valid, 1.0 / np.where(valid, err, 1.0) ** 2, 0.0)
+    # Curves without any valid error are smoothed with equal weights
+    no_err = np.add.reduceat(valid, starts) == 0
+    w = np.where(np.repeat(no_err, ends - starts + 1), 1.0, w)
+    if smooth_days > 0:
+        smooth = _window_sums(t, w * mag, smooth_days / 2) / _window_sums(t, w, smooth_days / 2)
+        # Points whose window only holds zero-weight rows keep their raw value
+        smooth = np.where(np.isfinite(smooth), smooth, mag)
+    else:
+        smooth = mag
+
+    # Peak: brightest smoothed point per curve (first one on ties)
+    curve = np.repeat(np.arange(n_curves), ends - starts + 1)
+    by_mag = np.lexsort((smooth, curve))
+    peak = by_mag[starts]
+    peak_mjd, peak_mag = mjd[peak], smooth[peak]
+    first_mjd, last_mjd = mjd[starts], mjd[ends]
+    rise_time = peak_mjd - first_mjd
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rise_rate = np.where(rise_time > 0, (smooth[starts] - peak_mag) / rise_time, np.nan)
+
+    # Curve k is the combined code used[k]; unpack it into the key columns
+    out = pd.DataFrame()
+    for col, col_uniques in zip(key_cols[::-1], levels[::-1]):
+        out.insert(0, col, col_uniques.take(used % len(col_uniques)))
+        used = used // len(col_uniques)
+    out['n_points'] = ends - starts + 1
+    out['first_mjd'] = first_mjd
+    out['last_mjd'] = last_mjd
+    out['peak_mjd'] = peak_mjd
+    out['peak_mag'] = peak_mag
+    out['rise_time'] = rise_time
+    out['rise_rate'] = rise_rate
+
+    curve_ids = np.arange(n_curves)
+    for n in decline_days:
+        # Linear interpolation of the smoothed curve at peak + n days, within the same curve
+        target = curve_ids * stride + (peak_mjd + n - t0)
+        right = np.clip(np.searchsorted(t, target, side='left'), starts, ends)
+        left = np.clip(right - 1, starts, ends)
+        t_l, t_r = t[left], t[right]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            frac = np.where(t_r > t_l, (target - t_l) / (t_r - t_l), 0.0)
+        value = smooth[left] + np.clip(frac, 0.0, 1.0) * (smooth[right] - smooth[left])
+        dm = np.where(peak_mjd + n <= last_mjd, value - peak_mag, np.nan)
+        out[f"dm{n}"] = dm
+        out[f"decline_rate{n}"] = dm / n
+
+    # Keys are categorical and features float32: thousands of objects stay a few hundred kB
+    for col in key_cols:
+        out[col] = out[col].astype('category')
+    float_cols = out.columns.difference(key_cols + ['n_points', 'first_mjd', 'last_mjd', 'peak_mjd'])
+    out[float_cols] = out[float_cols].astype(np.float32)
+    return out[columns].sort_values(key_cols, ignore_index=True)
+
+
+def _object_name(path):
+    return os.path.splitext(os.path.basename(path))[0].removesuffix('_dered')
+
+
+def _features_of_file(args):
+    name, path, options = args
+    df = read_lightcurve(path)
+    features = light_curve_features(df, **options)
+    features.insert(0, 'object', name)
+    return features
+
+
+def features_from_files(paths, names=None, workers=1, **options):
+    """
+    Computes light_curve_features for many single-object files, in parallel over objects.
+
+    Parameters:
+        paths (list): Light curve files (e.g. the '_dered' outputs of deredden_script).
+        names (list, optional): Object names (default: file names without extension and '_dered').
+        workers (int): Worker processes; 1 runs serially in this process.
+        **options: Passed to light_curve_features.
+
+    Returns:
+        pd.DataFrame: Feature table with an 'object' column; unreadable files are logged and skipped.
+    """
+    names = names or [_object_name(p) for p in paths]
+    jobs = [(name, path, options) for name, path in zip(names, paths)]
+    frames = []
+
+    def collect(name, get):
+        try:
+            frames.append(get())
+        except Exception as e:
+            logger.warning("%s: could not extract features: %s", name, e)
+
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [(job[0], pool.submit(_features_of_file, job)) for job in jobs]
+            for name, future in futures:
+                collect(name, future.result)
+    else:
+        for job in jobs:
+            collect(job[0], lambda job=job: _features_of_file(job))
+
+    if not frames:
+        return pd.DataFrame()
+    features = pd.concat(frames, ignore_index=True)
+    features['object'] = features['object'].astype('category')
+    return features
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extract peak, rise and decline features from light curves.")
+    parser.add_argument("files", nargs='*', help="De-reddened light curve files, one object each")
+    parser.add_argument("--params", default=None,
+                        help="Params CSV (Name, input_file) as used by deredden_script; reads the '_dered' outputs")
+    parser.add_argument("--mag-col", default='abs_mag', help="Magnitude column to measure")
+    parser.add_argument("--smooth-days", type=float, default=5.0, help="Width of the smoothing window")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes")
+    parser.add_argument("--output", default=None, help="Output table (.csv, .parquet or .feather)")
+    parser.add_argument("--verbose", action="store_true", help="Debug logging")
+    args = parser.parse_args(argv)
+    configure_cli_logging(verbose=args.verbose)
+
+    paths, names = list(args.files), None
+    if args.params:
+        objects = pd.read_csv(args.params)
+        names = [_object_name(p) for p in paths] + list(objects['Name'])
+        paths += [derived_path(p, "_dered") for p in objects['input_file']]
+    if not paths:
+        parser.error("no input files")
+
+    start = time.perf_counter()
+    features = features_from_files(paths, names=names, workers=args.workers,
+                                   mag_col=args.mag_col, smooth_days=args.smooth_days)
+    logger.info("%d light curves of %d objects characterized in %.2f s", len(features),
+                features['object'].nunique() if len(features) else 0, time.perf_counter() - start)
+    if args.output:
+        write_lightcurve(features, args.output, compact=False)
+        logger.info("Saved features to %s", args.output)
+    else:
+        logger.info("%s", features.to_string(index=False))
+    return features
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,364 @@
+import hashlib
+import json
+import os
+import pandas as pd
+
+from instrumentation import logger, instrumented
+from lightcurve import as_dataframe
+
+# Storage dtypes for the standard long-format schema in binary formats
+# (mag and mjd stay float64 so round trips are exact)
+COMPACT_DTYPES = {
+    'inst': 'category',
+    'filter': 'category',
+    'mjd': 'float64',
+    'mjderr': 'float32',
+    'mag': 'float64',
+    'magerr': 'float32',
+    'ATel': 'int8',
+    'limit': 'int8',
+}
+
+FORMAT_EXTENSIONS = {
+    '.csv': 'csv',
+    '.parquet': 'parquet',
+    '.pq': 'parquet',
+    '.feather': 'feather',
+    '.arrow': 'feather',
+}
+
+
+def storage_format(path):
+    """
+    Picks the storage format ('csv', 'parquet' or 'feather') from a file extension.
+    """
+    ext = os.path.splitext(str(path))[1].lower()
+    if ext not in FORMAT_EXTENSIONS:
+        raise ValueError(f"Unsupported light curve file extension: {ext or path}")
+    return FORMAT_EXTENSIONS[ext]
+
+
+def compact_lightcurve(df):
+    """
+    Casts the standard long-format columns of a DataFrame to compact dtypes.
+    Columns outside the standard schema (e.g. app_mag, abs_mag) are left untouched.
+    Integer flag columns holding NaN are kept as they are.
+
+    Parameters:
+        df (pd.DataFrame): Long-format light curve.
+
+    Returns:
+        pd.DataFrame: Light curve with compact dtypes.
+    """
+    dtypes = {}
+    for col, dtype in COMPACT_DTYPES.items():
+        if col not in df.columns:
+            continue
+        if dtype.startswith('int') and df[col].isna().any():
+            continue
+        dtypes[col] = dtype
+    return df.astype(dtypes)
+
+
+@instrumented()
+def write_lightcurve(df, path, compact=True):
+    """
+    Writes a light curve, choosing CSV, Parquet or Feather from the file extension.
+
+    Parameters:
+        df (pd.DataFrame or LightCurve): Long-format light curve.
+        path (str): Output path (.csv, .parquet/.pq, .feather/.arrow).
+        compact (bool): Store standard columns with compact dtypes in binary formats.
+    """
+    df = as_dataframe(df)
+    fmt = storage_format(path)
+    if fmt == 'csv':
+        df.to_csv(path, index=False)
+        return
+
+    if compact:
+        df = compact_lightcurve(df)
+    df = df.reset_index(drop=True)
+    if fmt == 'parquet':
+        df.to_parquet(path, index=False)
+    else:
+        df.to_feather(path)
+
+
+@instrumented()
+def read_lightcurve(path, columns=None):
+    """
+    Reads a light curve written by write_lightcurve (or any standardized CSV).
+
+    Parameters:
+        path (str): Input path (.csv, .parquet/.pq, .feather/.arrow).
+        columns (list, optional): Only load these columns.
+
+    Returns:
+        pd.DataFrame: Light curve.
+    """
+    fmt = storage_format(path)
+    if fmt == 'csv':
+        return pd.read_csv(path, usecols=columns)
+    elif fmt == 'parquet':
+        return pd.read_parquet(path, columns=columns)
+    else:
+        return pd.read_feather(path, columns=columns)
+
+
+def derived_path(path, suffix):
+    """
+    Inserts a suffix before the extension: derived_path('a.parquet', '_dered') -> 'a_dered.parquet'.
+    """
+    base, ext = os.path.splitext(str(path))
+    return f"{base}{suffix}{ext}"
+
+
+def iter_read_lightcurve(path, chunksize=100_000, columns=None):
+    """
+    Reads a light curve in chunks of at most `chunksize` rows.
+
+    CSV and Parquet are streamed; Feather files are read whole and then sliced,
+    since the format has no incremental reader.
+
+    Parameters:
+        path (str): Input path (.csv, .parquet/.pq, .feather/.arrow).
+        chunksize (int): Maximum number of rows per chunk.
+        columns (list, optional): Only load these columns.
+
+    Yields:
+        pd.DataFrame: Consecutive chunks of the light curve.
+    """
+    fmt = storage_format(path)
+    if fmt == 'csv':
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunksize)
+    elif fmt == 'parquet':
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+    else:
+        df = pd.read_feather(path, columns=columns)
+        for start in range(0, len(df), chunksize):
+            yield df.iloc[start:start + chunksize]
+
+
+class LightCurveWriter:
+    """
+    Appends light curve chunks to a CSV or Parquet file.
+
+    The first chunk fixes the columns (and, for Parquet, the schema); later chunks
+    are written in the same layout. Feather has no append support and is rejected.
+
+    Usage:
+        with LightCurveWriter('out.parquet') as writer:
+            for chunk in chunks:
+                writer.write(chunk)
+    """
+
+    def __init__(self, path, compact=True):
+        self.path = path
+        self.format = storage_format(path)
+        if self.format == 'feather':
+            raise ValueError("Feather files cannot be written incrementally; use .csv or .parquet")
+        self.compact = compact
+        self.rows = 0
+        self._columns = None
+        self._schema = None
+        self._writer = None
+
+    def write(self, df):
+        if self._columns is None:
+            self._columns = list(df.columns)
+        df = df[self._columns]
+
+        if self.format == 'csv':
+            df.to_csv(self.path, mode='w' if self.rows == 0 else 'a', header=self.rows == 0, index=False)
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            if self.compact:
+                df = compact_lightcurve(df)
+            table = pa.Table.from_pandas(df, schema=self._schema, preserve_index=False)
+            if self._writer is None:
+                self._schema = table.schema
+                self._writer = pq.ParquetWriter(self.path, self._schema)
+            self._writer.write_table(table)
+        self.rows += len(df)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        elif self.format == 'csv' and self.rows == 0 and self._columns is not None:
+            pd.DataFrame(columns=self._columns).to_csv(self.path, index=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+MANIFEST_NAME = 'manifest.json'
+
+
+def file_fingerprint(path, sha256=None):
+    """
+    Size, mtime and SHA-256 of a file. A known sha256 can be passed in to skip hashing.
+    """
+    st = os.stat(path)
+    if sha256 is None:
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+        sha256 = h.hexdigest()
+    return {'size': st.st_size, 'mtime': st.st_mtime, 'sha256': sha256}
+
+
+def _load_manifest(cache_dir):
+    path = os.path.join(cache_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _save_manifest(cache_dir, manifest, name=MANIFEST_NAME):
+    path = os.path.join(cache_dir, name)
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def _drop_fragment(cache_dir, entry):
+    fragment = os.path.join(cache_dir, entry['fragment'])
+    if os.path.exists(fragment):
+        os.remove(fragment)
+
+
+# The stacked output kept in the cache directory: ordered Parquet parts plus their state
+STACK_DIR = 'stacked'
+STACK_STATE_NAME = 'stack.json'
+# Appended parts are merged back into one once there are more than this many
+MAX_STACK_PARTS = 16
+
+
+def _load_stack_state(cache_dir):
+    path = os.path.join(cache_dir, STACK_STATE_NAME)
+    if not os.path.exists(path):
+        return {'keys': [], 'parts': []}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _write_stack(cache_dir, state, df, rebuild):
+    """
+    Writes df as the next part of the stacked output (or, if rebuild, as its only part).
+    """
+    stack_dir = os.path.join(cache_dir, STACK_DIR)
+    if rebuild:
+        for part in state['parts']:
+            _drop_fragment(stack_dir, {'fragment': part})
+        state['parts'] = []
+    os.makedirs(stack_dir, exist_ok=True)
+    if df is not None:
+        index = int(state['parts'][-1].split('-')[1].split('.')[0]) + 1 if state['parts'] else 0
+        part = f"part-{index:05d}.parquet"
+        write_lightcurve(df, os.path.join(stack_dir, part), compact=False)
+        state['parts'].append(part)
+
+
+@instrumented(rows_out=lambda result: None if result[0] is None else len(result[0]), count_input=False)
+def stack_incremental(file_paths, cache_dir, reader=None):
+    """
+    Stacks light curve files, re-reading only inputs that are new or changed.
+
+    Every input is cached once as a Parquet fragment in `cache_dir`, tracked by a
+    manifest of (size, mtime, sha256). Files whose size and mtime are unchanged
+    are not opened at all; files whose size or mtime changed are re-hashed and
+    re-ingested only if their content differs. Fragments of inputs no longer
+    listed are dropped.
+
+    The stacked output is kept in `cache_dir` as a few ordered Parquet parts. When
+    the only changes are new files at the end of `file_paths`, they are appended as
+    one new part; the stack is rebuilt from the fragments only when a file was
+    removed, modified or reordered (or after MAX_STACK_PARTS appends). Either way the
+    result is the concatenation of the inputs in `file_paths` order, identical to a
+    full rebuild.
+
+    Parameters:
+        file_paths (list): Light curve files to stack.
+        cache_dir (str): Directory holding the manifest, fragments and stacked output.
+        reader (callable, optional): Function path -> DataFrame (default read_lightcurve).
+
+    Returns:
+        tuple: (stacked DataFrame or None if nothing could be read,
+            dict with lists of 'added', 'updated', 'unchanged', 'removed' and 'failed' paths)
+    """
+    reader = reader or read_lightcurve
+    os.makedirs(cache_dir, exist_ok=True)
+    manifest = _load_manifest(cache_dir)
+    state = _load_stack_state(cache_dir)
+    report = {'added': [], 'updated': [], 'unchanged': [], 'removed': [], 'failed': []}
+
+    keys = [os.path.abspath(str(p)) for p in file_paths]
+    for key in set(manifest) - set(keys):
+        _drop_fragment(cache_dir, manifest.pop(key))
+        report['removed'].append(key)
+
+    new_frames = {}
+    dropped = False
+    for path, key in zip(file_paths, keys):
+        entry = manifest.get(key)
+        try:
+            st = os.stat(path)
+            if entry and entry['size'] == st.st_size and entry['mtime'] == st.st_mtime:
+                report['unchanged'].append(path)
+                continue
+            fingerprint = file_fingerprint(path)
+            if entry and entry['sha256'] == fingerprint['sha256']:
+                entry.update(fingerprint)
+                report['unchanged'].append(path)
+                continue
+            df = reader(path)
+        except Exception as e:
+            logger.warning("Could not read %s: %s", path, e)
+            report['failed'].append(path)
+            # A full rebuild would skip this file too, so forget any cached version
+            if entry:
+                _drop_fragment(cache_dir, manifest.pop(key))
+                dropped = True
+            continue
+
+        fragment = hashlib.sha1(key.encode()).hexdigest()[:16] + '.parquet'
+        write_lightcurve(df, os.path.join(cache_dir, fragment), compact=False)
+        fingerprint['fragment'] = fragment
+        manifest[key] = fingerprint
+        new_frames[key] = df
+        report['updated' if entry else 'added'].append(path)
+
+    _save_manifest(cache_dir, manifest)
+
+    stacked = [key for key in keys if key in manifest]
+    n_old = len(state['keys'])
+    appendable = (not report['removed'] and not report['updated'] and not dropped
+                  and stacked[:n_old] == state['keys'] and set(stacked[n_old:]) <= set(new_frames)
+                  and len(state['parts']) < MAX_STACK_PARTS)
+    if appendable:
+        tail = [new_frames[key] for key in stacked[n_old:]]
+        if tail:
+            _write_stack(cache_dir, state, pd.concat(tail, ignore_index=True), rebuild=False)
+    else:
+        dfs = [new_frames[key] if key in new_frames
+               else read_lightcurve(os.path.join(cache_dir, manifest[key]['fragment'])) for key in stacked]
+        _write_stack(cache_dir, state, pd.concat(dfs, ignore_index=True) if dfs else None, rebuild=True)
+    state['keys'] = stacked
+    _save_manifest(cache_dir, state, STACK_STATE_NAME)
+
+    if not stacked:
+        return None, report
+    parts = [read_lightcurve(os.path.join(cache_dir, STACK_DIR, part)) for part in state['parts']]
+    combined = parts[0] if len(parts) == 1 else pd.concat(parts, ignore_index=True)
+    return combined, report
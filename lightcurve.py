@@ -0,0 +1,206 @@
+import numpy as np
+import pandas as pd
+
+# Bits of LightCurve.flags
+FLAG_LIMIT = 1
+FLAG_ATEL = 2
+
+# Magnitude-like columns stored as float32 (mjd stays float64: float32 is only ~5 ms at MJD 5e4)
+FLOAT32_COLUMNS = ('mag', 'magerr', 'mjderr', 'app_mag', 'abs_mag', 'mag_dereddened', 'A_lambda')
+
+
+def _codes(values, dtype_hint=None):
+    """
+    Small-int codes and categories of a column (int8 up to 127 categories, else int16/int32).
+    Categorical columns are reused as they are.
+    """
+    if isinstance(getattr(values, 'dtype', None), pd.CategoricalDtype):
+        cat = values.array if isinstance(values, pd.Series) else values
+        return np.asarray(cat.codes), pd.Index(cat.categories)
+    codes, uniques = pd.factorize(values)
+    dtype = np.int8 if len(uniques) < 128 else np.int16 if len(uniques) < 32768 else np.int32
+    return codes.astype(dtype), uniques
+
+
+class LightCurve:
+    """
+    Compact, array-backed light curve in the standard long schema.
+
+    Columns are contiguous NumPy arrays: float64 mjd, float32 mag / magerr, small-int codes
+    into `filters` and `insts`, and a uint8 `flags` bit field (FLAG_LIMIT, FLAG_ATEL).
+    Constant columns are not materialized: mjderr and flags may be None (all zero).
+    Further columns (app_mag, abs_mag, A_lambda, ...) live in `extra`.
+
+    About 19 bytes per point for the standard schema, against 60-70 for a DataFrame
+    with object-dtype inst/filter and float64/int64 columns.
+    """
+    __slots__ = ('mjd', 'mag', 'magerr', 'mjderr', 'filter_codes', 'filters', 'inst_codes', 'insts',
+                 'flags', 'extra')
+
+    def __init__(self, mjd, mag, magerr, filter_codes, filters, inst_codes, insts, flags=None,
+                 mjderr=None, extra=None):
+        self.mjd = mjd
+        self.mag = mag
+        self.magerr = magerr
+        self.mjderr = mjderr
+        self.filter_codes = filter_codes
+        self.filters = pd.Index(filters)
+        self.inst_codes = inst_codes
+        self.insts = pd.Index(insts)
+        self.flags = flags
+        self.extra = dict(extra or {})
+
+    @classmethod
+    def from_dataframe(cls, df):
+        """
+        Builds a LightCurve from a standard long-format DataFrame. Columns already in the
+        target dtype (float64 mjd, float32 magnitudes, categorical inst/filter) are not
+        copied; all-zero mjderr, ATel and limit columns are dropped.
+        """
+        def column(name, dtype):
+            return df[name].to_numpy(dtype=dtype, na_value=np.nan) if name in df else None
+
+        filter_codes, filters = _codes(df['filter'])
+        inst_codes, insts = _codes(df['inst']) if 'inst' in df else (np.zeros(len(df), np.int8), pd.Index([None]))
+
+        flags = np.zeros(len(df), dtype=np.uint8)
+        for name, bit in (('limit', FLAG_LIMIT), ('ATel', FLAG_ATEL)):
+            if name in df:
+                flags |= np.where(df[name].fillna(0).to_numpy() != 0, bit, 0).astype(np.uint8)
+        mjderr = column('mjderr', np.float32)
+        if mjderr is not None and not mjderr.any():
+            mjderr = None
+
+        standard = {'inst', 'filter', 'mjd', 'mjderr', 'mag', 'magerr', 'ATel', 'limit'}
+        extra = {}
+        for name in df.columns:
+            if name in standard:
+                continue
+            extra[name] = column(name, np.float32) if name in FLOAT32_COLUMNS else df[name].to_numpy()
+
+        magerr = column('magerr', np.float32)
+        return cls(mjd=column('mjd', np.float64), mag=column('mag', np.float32),
+                   magerr=magerr if magerr is not None else np.full(len(df), np.nan, dtype=np.float32),
+                   filter_codes=filter_codes, filters=filters, inst_codes=inst_codes, insts=insts,
+                   flags=flags if flags.any() else None, mjderr=mjderr, extra=extra)
+
+    @classmethod
+    def read(cls, path, columns=None):
+        """
+        Reads a light curve file (CSV, Parquet or Feather) into a LightCurve.
+        """
+        from lc_store import read_lightcurve
+        return cls.from_dataframe(read_lightcurve(path, columns=columns))
+
+    def to_dataframe(self):
+        """
+        Standard long-format DataFrame sharing this object's arrays (no copies); inst and
+        filter become categoricals over the codes. Constant columns are materialized as zeros.
+        """
+        n = len(self)
+        flags = self.flags if self.flags is not None else np.zeros(n, dtype=np.uint8)
+        data = {
+            'inst': pd.Categorical.from_codes(self.inst_codes, categories=self.insts, validate=False),
+            'filter': pd.Categorical.from_codes(self.filter_codes, categories=self.filters, validate=False),
+            'mjd': self.mjd,
+            'mjderr': self.mjderr if self.mjderr is not None else np.zeros(n, dtype=np.float32),
+            'mag': self.mag,
+            'magerr': self.magerr,
+            'ATel': (flags & FLAG_ATEL).astype(bool).view(np.int8),
+            'limit': (flags & FLAG_LIMIT).astype(bool).view(np.int8),
+        }
+        data.update(self.extra)
+        return pd.DataFrame(data, copy=False)
+
+    def __len__(self):
+        return len(self.mjd)
+
+    def __repr__(self):
+        return (f"LightCurve({len(self)} points, filters={list(self.filters)}, insts={list(self.insts)}, "
+                f"extra={list(self.extra)}, {self.nbytes / 1024 ** 2:.1f} MB)")
+
+    @property
+    def nbytes(self):
+        arrays = [self.mjd, self.mag, self.magerr, self.mjderr, self.filter_codes, self.inst_codes,
+                  self.flags, *self.extra.values()]
+        return sum(a.nbytes for a in arrays if a is not None)
+
+    @property
+    def limit(self):
+        return np.zeros(len(self), bool) if self.flags is None else (self.flags & FLAG_LIMIT) != 0
+
+    @property
+    def atel(self):
+        return np.zeros(len(self), bool) if self.flags is None else (self.flags & FLAG_ATEL) != 0
+
+    def column(self, name):
+        """
+        One column as a NumPy array (inst / filter as object arrays of names).
+        """
+        if name in ('mjd', 'mag', 'magerr'):
+            return getattr(self, name)
+        if name == 'mjderr':
+            return self.mjderr if self.mjderr is not None else np.zeros(len(self), dtype=np.float32)
+        if name in ('filter', 'inst'):
+            codes, names = (self.filter_codes, self.filters) if name == 'filter' else (self.inst_codes, self.insts)
+            return np.append(names.to_numpy(dtype=object), None)[codes]
+        if name == 'limit':
+            return self.limit.view(np.int8)
+        if name == 'ATel':
+            return self.atel.view(np.int8)
+        return self.extra[name]
+
+    def __contains__(self, name):
+        return name in ('inst', 'filter', 'mjd', 'mjderr', 'mag', 'magerr', 'ATel', 'limit') or name in self.extra
+
+    def with_column(self, name, values):
+        """
+        New LightCurve sharing every array of this one plus (or replacing) an extra column.
+        """
+        if name in FLOAT32_COLUMNS:
+            values = np.asarray(values, dtype=np.float32)
+        extra = {**self.extra, name: values}
+        return LightCurve(self.mjd, self.mag, self.magerr, self.filter_codes, self.filters, self.inst_codes,
+                          self.insts, self.flags, self.mjderr, extra)
+
+    def take(self, index):
+        """
+        Subset by a slice (views, no copy), a boolean mask or integer positions.
+        """
+        def sub(a):
+            return None if a is None else a[index]
+        return LightCurve(self.mjd[index], self.mag[index], self.magerr[index], self.filter_codes[index],
+                          self.filters, self.inst_codes[index], self.insts, sub(self.flags), sub(self.mjderr),
+                          {k: v[index] for k, v in self.extra.items()})
+
+    def sort_by_band(self):
+        """
+        Copy sorted by (filter, mjd), after which band() returns views.
+        """
+        return self.take(np.lexsort((self.mjd, self.filter_codes)))
+
+    def band(self, name):
+        """
+        The points of one filter. If the curve is sorted by filter (see sort_by_band) this
+        is a set of views into the same arrays, otherwise a copy.
+        """
+        code = self.filters.get_loc(name)
+        codes = self.filter_codes
+        if len(codes) and (codes[1:] >= codes[:-1]).all():
+            lo, hi = np.searchsorted(codes, [code, code + 1])
+            return self.take(slice(lo, hi))
+        return self.take(codes == code)
+
+    def bands(self):
+        """
+        (filter name, LightCurve) pairs of every filter with points.
+        """
+        present = np.unique(self.filter_codes)
+        return [(self.filters[c], self.band(self.filters[c])) for c in present if c >= 0]
+
+
+def as_dataframe(lc):
+    """
+    DataFrame view of a LightCurve; DataFrames pass through unchanged.
+    """
+    return lc.to_dataframe() if isinstance(lc, LightCurve) else lc
@@ -1,30 +1,50 @@
-import pandas as pd
-import matplotlib.pyplot as plt
 import plot_lc
+from lc_store import read_lightcurve
+from result_cache import ResultCache
+from instrumentation import logger, configure_cli_logging
+import inspect
 import os
 
 PLOTS_DIR = "/home/skikk2/Documents/ICCUB/Project/lrn_rates/plots"
-os.makedirs(PLOTS_DIR, exist_ok=True)
 
-def v838mon_dereddened():
+
+def render_cached(cache, kind, file_path, output_plot, title, df=None, **options):
+    """
+    Renders a PLOT_SPECS plot of file_path unless an identical plot of the same input
+    is already in `cache`. The key covers the spec, every rendering option (defaults
+    included) and plot_lc.RENDER_VERSION, so changing any of them re-renders.
+    """
+    defaults = {name: p.default for name, p in inspect.signature(plot_lc.render_lightcurve).parameters.items()
+                if p.default is not inspect.Parameter.empty and name not in ('kind', 'title', 'output_file')}
+    options = {**defaults, **options}
+    params = {'kind': kind, 'spec': plot_lc.PLOT_SPECS[kind], 'title': title,
+              'version': plot_lc.RENDER_VERSION, **options}
+    if cache.restore('render_lightcurve', [file_path], params, output_plot):
+        logger.info("Unchanged, restored %s from cache", output_plot)
+        return
+    if df is None:
+        df = read_lightcurve(file_path)
+    plot_lc.render_lightcurve(df, kind, title=title, output_file=output_plot, **options)
+    cache.store('render_lightcurve', [file_path], params, output_plot)
+
+
+def v838mon_dereddened(cache):
     # Load the de-reddened light curve CSV
     file_path = "/home/skikk2/Documents/ICCUB/Project/lrn_rates/v838mon_munari_n_dered.csv"
-    df = pd.read_csv(file_path)
 
     # Generate plot
     output_plot = os.path.join(PLOTS_DIR, "v838mon_munari_dered1.png")
-    plot_lc.plot_photometry_dereddened(df, title="V838 Mon (De-reddened)", output_file=output_plot)
-    print(f"Saved plot to {output_plot}")
+    render_cached(cache, 'dereddened', file_path, output_plot, "V838 Mon (De-reddened)")
+    logger.info("Saved plot to %s", output_plot)
 
-def v838mon_dereddened_abs():
+def v838mon_dereddened_abs(cache):
     # Load the de-reddened light curve CSV
     file_path = "/home/skikk2/Documents/ICCUB/Project/lrn_rates/v838mon_munari_n_dered.csv"
-    df = pd.read_csv(file_path)
 
     # Generate plot
     output_plot = os.path.join(PLOTS_DIR, "v838mon_abs_dered1.png")
-    plot_lc.plot_photometry_dereddened_abs(df, title="V838 Mon (abs-De-reddened)", output_file=output_plot)
-    print(f"Saved plot to {output_plot}")
+    render_cached(cache, 'dereddened_abs', file_path, output_plot, "V838 Mon (abs-De-reddened)")
+    logger.info("Saved plot to %s", output_plot)
 
 
 def v838mon_pivot_synthetic_and_plot():
@@ -35,16 +55,20 @@ def v838mon_pivot_synthetic_and_plot():
     pivot_synthetic_lc(input_csv, output_csv)
 
     # Load and filter for g and r bands only
-    df = pd.read_csv(output_csv)
+    df = read_lightcurve(output_csv)
     df_gr = df[df['filter'].isin(['g', 'r'])]
 
     # Plot
     output_plot = os.path.join(PLOTS_DIR, "v838mon_gr.png")
     plot_lc.plot_photometry_dereddened_gr(df_gr, title="V838 Mon (gr)", output_file=output_plot)
-    print(f"Saved plot to {output_plot}")
+    logger.info("Saved plot to %s", output_plot)
 
 
 if __name__ == "__main__":
-    v838mon_dereddened()
-    v838mon_dereddened_abs()
+    configure_cli_logging()
+    os.makedirs(PLOTS_DIR, exist_ok=True)
+    # Plots whose input file and rendering parameters are unchanged are restored from here
+    plot_cache = ResultCache(os.path.join(PLOTS_DIR, ".cache"))
+    v838mon_dereddened(plot_cache)
+    v838mon_dereddened_abs(plot_cache)
     #v838mon_pivot_synthetic_and_plot()
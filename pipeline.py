@@ -0,0 +1,420 @@
+"""
+Config-driven light-curve pipeline: load -> stack -> deredden (+ abs mag) -> plot,
+plus pivoting of synthetic g/r tables.
+
+The config (TOML, or YAML if PyYAML is installed) lists objects, their raw
+sources and which steps to run. Every (object, step) becomes a task in a
+dependency graph; independent tasks run concurrently in a process pool, and a
+task whose parameters, input files and outputs are unchanged since its last
+successful run is skipped. Changing one object's parameters therefore re-runs
+only that object's downstream tasks.
+
+Example config:
+
+    [pipeline]
+    work_dir = "lrn_out"
+    workers = 4
+    format = "parquet"          # storage format of intermediate tables
+
+    [[objects]]
+    name = "v838mon"
+    E_BV = 0.9
+    R_V = 3.1
+    distance_pc = 6100
+    steps = ["load", "stack", "deredden", "plot"]    # this is the default
+    plots = ["dereddened", "dereddened_abs"]         # keys of plot_lc.PLOT_SPECS; this is the default
+    dedup = {mjd_tol = 0.001, rule = "weighted"}     # optional, see lc_data.deduplicate_lightcurve
+    binning = {width = 1.0}                          # optional, see lc_data.bin_lightcurve
+    # synthetic_gr = "raw/v838mon_synth_gr.csv"      # with "pivot" in steps and "dereddened_gr" in plots;
+    #                                                  "derived" computes g/r from the de-reddened BVR data
+
+    [[objects.sources]]
+    path = "raw/v838mon_munari.csv"
+    format = "v838mon_munari"   # martini, aavso, goranskij, v838mon_goranskij, v838mon_munari, standard,
+                                # or "auto" (detected from the header, see lc_data.detect_source_format)
+
+Usage:
+    python pipeline.py config.toml [--workers N] [--force] [--dry-run]
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from instrumentation import configure_cli_logging, logger, stage
+
+DEFAULT_STEPS = ['load', 'stack', 'deredden', 'plot']
+STATE_FILE = '.pipeline_state.json'
+
+
+def load_config(path):
+    """
+    Reads a pipeline config from a .toml or .yaml/.yml file.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.toml':
+        import tomllib
+        with open(path, 'rb') as f:
+            config = tomllib.load(f)
+    elif ext in ('.yaml', '.yml'):
+        import yaml
+        with open(path) as f:
+            config = yaml.safe_load(f)
+    else:
+        raise ValueError(f"Unsupported config format: {ext}")
+
+    if not config.get('objects'):
+        raise ValueError("Pipeline config has no [[objects]]")
+    # Relative paths in the config are relative to the config file
+    config['_base_dir'] = os.path.dirname(os.path.abspath(path))
+    return config
+
+
+# ---------------------------------------------------------------------------
+# Task functions (top-level so they can run in worker processes)
+
+def task_load(path, source_format, output):
+    import lc_data
+    from lc_store import read_lightcurve, write_lightcurve
+
+    if source_format == 'auto':
+        source_format = lc_data.detect_source_format(path)
+    if source_format == 'standard':
+        df = read_lightcurve(path)
+    elif source_format in ('martini', 'aavso'):
+        df = lc_data.load_lightcurve(path, source=source_format)
+    elif source_format in ('goranskij', 'v838mon_goranskij', 'v838mon_munari'):
+        loader = {'goranskij': lc_data.lc_goranskij,
+                  'v838mon_goranskij': lc_data.lc_v838mon_goranskij,
+                  'v838mon_munari': lc_data.lc_v838mon_munari}[source_format]
+        df = loader(path)
+    else:
+        raise ValueError(f"Unsupported source format: {source_format}")
+    if df is None:
+        raise RuntimeError(f"Could not load {path}")
+    write_lightcurve(df, output)
+    return len(df)
+
+
+def task_stack(inputs, output, dedup=None, binning=None):
+    from lc_data import stack_lightcurves
+    df = stack_lightcurves(inputs, output, dedup=dedup, binning=binning)
+    if df is None:
+        raise RuntimeError("No valid files to stack")
+    return len(df)
+
+
+def task_deredden(input_path, output, E_BV, R_V, distance_pc=None):
+    from extinction_utils import apply_reddening_df, appmag_to_absmag
+    from lc_store import read_lightcurve, write_lightcurve
+
+    df = apply_reddening_df(read_lightcurve(input_path), R_V * E_BV, R_V, mag_col='mag')
+    if distance_pc is not None:
+        df = appmag_to_absmag(df, distance_pc=distance_pc)
+    write_lightcurve(df, output)
+    return len(df)
+
+
+def task_pivot(input_path, output, transform='jester05'):
+    from lc_data import pivot_synthetic_lc
+    return len(pivot_synthetic_lc(input_path, output, transform=transform))
+
+
+def task_plot(input_path, output, kind, title, decimate=None):
+    import plot_lc
+    from lc_store import read_lightcurve
+    return plot_lc.render_lightcurve(read_lightcurve(input_path), kind, title=title,
+                                     output_file=output, decimate=decimate)
+
+
+TASK_FUNCTIONS = {
+    'load': task_load,
+    'stack': task_stack,
+    'deredden': task_deredden,
+    'pivot': task_pivot,
+    'plot': task_plot,
+}
+
+
+# ---------------------------------------------------------------------------
+# Graph construction
+
+class Task:
+    """
+    One node of the pipeline graph.
+    """
+    __slots__ = ('id', 'kind', 'kwargs', 'deps', 'inputs', 'outputs')
+
+    def __init__(self, id, kind, kwargs, deps=(), inputs=(), outputs=()):
+        self.id = id
+        self.kind = kind
+        self.kwargs = kwargs
+        self.deps = list(deps)
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+
+
+def build_graph(config):
+    """
+    Turns a config into {task id: Task}.
+    """
+    base = config['_base_dir']
+    settings = config.get('pipeline', {})
+    work_dir = os.path.join(base, settings.get('work_dir', 'pipeline_out'))
+    ext = '.' + settings.get('format', 'parquet')
+    decimate = settings.get('decimate')
+
+    tasks = {}
+    for obj in config['objects']:
+        name = obj['name']
+        steps = obj.get('steps', DEFAULT_STEPS)
+        obj_dir = os.path.join(work_dir, name)
+
+        loaded = []
+        for i, src in enumerate(obj.get('sources', [])):
+            path = os.path.join(base, src['path'])
+            fmt = src.get('format', 'standard')
+            if 'load' in steps:
+                stem = os.path.splitext(os.path.basename(path))[0]
+                out = os.path.join(obj_dir, f"{i:02d}_{stem}{ext}")
+                tid = f"load:{name}:{i}"
+                tasks[tid] = Task(tid, 'load', {'path': path, 'source_format': fmt, 'output': out},
+                                  inputs=[path], outputs=[out])
+                loaded.append((tid, out))
+            else:
+                loaded.append((None, path))
+
+        stacked = (None, None)
+        if 'stack' in steps and loaded:
+            out = os.path.join(obj_dir, f"{name}_stacked{ext}")
+            tid = f"stack:{name}"
+            paths = [p for _, p in loaded]
+            tasks[tid] = Task(tid, 'stack', {'inputs': paths, 'output': out, 'dedup': obj.get('dedup'),
+                                        'binning': obj.get('binning')},
+                              deps=[t for t, _ in loaded if t], inputs=paths, outputs=[out])
+            stacked = (tid, out)
+        elif len(loaded) == 1:
+            stacked = loaded[0]
+
+        dered = (None, obj.get('dereddened_file'))
+        if 'deredden' in steps and stacked[1]:
+            out = os.path.join(obj_dir, f"{name}_dered{ext}")
+            tid = f"deredden:{name}"
+            tasks[tid] = Task(tid, 'deredden',
+                              {'input_path': stacked[1], 'output': out, 'E_BV': float(obj['E_BV']),
+                               'R_V': float(obj.get('R_V', 3.1)), 'distance_pc': obj.get('distance_pc')},
+                              deps=[stacked[0]] if stacked[0] else [], inputs=[stacked[1]], outputs=[out])
+            dered = (tid, out)
+
+        pivoted = (None, None)
+        if 'pivot' in steps and obj.get('synthetic_gr'):
+            # "derived" computes g/r from this object's own de-reddened BVR photometry
+            if obj['synthetic_gr'] == 'derived':
+                dep, path = dered
+            else:
+                dep, path = None, os.path.join(base, obj['synthetic_gr'])
+            if path:
+                out = os.path.join(obj_dir, f"{name}_synthetic_gr{ext}")
+                tid = f"pivot:{name}"
+                tasks[tid] = Task(tid, 'pivot', {'input_path': path, 'output': out,
+                                                 'transform': obj.get('gr_transform', 'jester05')},
+                                  deps=[dep] if dep else [], inputs=[path], outputs=[out])
+                pivoted = (tid, out)
+            else:
+                logger.warning("%s: synthetic_gr = \"derived\" needs a de-reddened table (a 'deredden' step "
+                               "or 'dereddened_file'); skipping the pivot", name)
+
+        if 'plot' in steps:
+            default_plots = ['dereddened'] + (['dereddened_abs'] if obj.get('distance_pc') else [])
+            for kind in obj.get('plots', default_plots):
+                # The g/r plot shows the pivoted synthetic photometry, the others the dereddened table
+                dep, source = pivoted if kind == 'dereddened_gr' else dered
+                if not source:
+                    continue
+                out = os.path.join(obj_dir, f"{name}_{kind}.png")
+                tid = f"plot:{name}:{kind}"
+                tasks[tid] = Task(tid, 'plot',
+                                  {'input_path': source, 'output': out, 'kind': kind,
+                                   'title': obj.get('title', name), 'decimate': decimate},
+                                  deps=[dep] if dep else [], inputs=[source], outputs=[out])
+    _check_acyclic(tasks)
+    return tasks
+
+
+def _check_acyclic(tasks):
+    for task in tasks.values():
+        for dep in task.deps:
+            if dep not in tasks:
+                raise ValueError(f"Task {task.id} depends on unknown task {dep}")
+    # Kahn's algorithm; leftover nodes would form a cycle
+    indegree = {tid: len(t.deps) for tid, t in tasks.items()}
+    children = {tid: [] for tid in tasks}
+    for tid, t in tasks.items():
+        for dep in t.deps:
+            children[dep].append(tid)
+    ready = [tid for tid, d in indegree.items() if d == 0]
+    seen = 0
+    while ready:
+        tid = ready.pop()
+        seen += 1
+        for child in children[tid]:
+            indegree[child] -= 1
+            if indegree[child] == 0:
+                ready.append(child)
+    if seen != len(tasks):
+        raise ValueError("Pipeline graph has a cycle")
+
+
+# ---------------------------------------------------------------------------
+# Up-to-date checks
+
+def _file_digest(path):
+    from lc_store import file_fingerprint
+    return file_fingerprint(path)['sha256']
+
+
+def task_signature(task):
+    """
+    Hash of a task's kind, parameters and input file contents.
+    """
+    payload = {'kind': task.kind, 'kwargs': task.kwargs,
+               'inputs': [_file_digest(p) if os.path.exists(p) else None for p in task.inputs]}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _load_state(work_dir):
+    path = os.path.join(work_dir, STATE_FILE)
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {}
+
+
+def _save_state(work_dir, state):
+    os.makedirs(work_dir, exist_ok=True)
+    path = os.path.join(work_dir, STATE_FILE)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+def _run_task(kind, kwargs):
+    output = kwargs.get('output')
+    if output:
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    start = time.perf_counter()
+    with stage(f"pipeline.{kind}") as rec:
+        rec.rows_out = TASK_FUNCTIONS[kind](**kwargs)
+    return rec.rows_out, time.perf_counter() - start
+
+
+# ---------------------------------------------------------------------------
+# Scheduler
+
+def run_pipeline(config, workers=None, force=False, dry_run=False):
+    """
+    Runs every task of a config in dependency order.
+
+    A task is submitted as soon as all its dependencies succeeded (or were up to
+    date); tasks downstream of a failure are marked 'blocked' and not run.
+
+    Parameters:
+        config (dict): Parsed config (see load_config).
+        workers (int, optional): Worker processes (default: [pipeline] workers, or 1).
+        force (bool): Re-run tasks even if they are up to date.
+        dry_run (bool): Only report which tasks would run.
+
+    Returns:
+        dict: task id -> {'status': 'ran'|'skipped'|'would run'|'failed'|'blocked', 'rows', 'seconds', 'error'}
+    """
+    settings = config.get('pipeline', {})
+    workers = workers or settings.get('workers', 1)
+    work_dir = os.path.join(config['_base_dir'], settings.get('work_dir', 'pipeline_out'))
+    tasks = build_graph(config)
+    state = _load_state(work_dir)
+
+    results = {}
+    pending = dict(tasks)
+    running = {}
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 and not dry_run else None
+
+    def finish(tid, signature, get_result):
+        try:
+            rows, seconds = get_result()
+        except Exception as e:
+            logger.error("%s failed: %s: %s", tid, type(e).__name__, e)
+            results[tid] = {'status': 'failed', 'rows': None, 'seconds': 0.0,
+                            'error': f"{type(e).__name__}: {e}"}
+            state.pop(tid, None)
+            return
+        logger.info("%s done (%s rows, %.2f s)", tid, rows, seconds)
+        results[tid] = {'status': 'ran', 'rows': rows, 'seconds': seconds, 'error': None}
+        state[tid] = {'signature': signature, 'rows': rows, 'finished': time.time()}
+
+    try:
+        while pending or running:
+            for tid, task in list(pending.items()):
+                dep_status = [results[d]['status'] if d in results else None for d in task.deps]
+                if any(s in ('failed', 'blocked') for s in dep_status):
+                    results[tid] = {'status': 'blocked', 'rows': None, 'seconds': 0.0, 'error': 'upstream failed'}
+                    del pending[tid]
+                    continue
+                if not all(s in ('ran', 'skipped', 'would run') for s in dep_status):
+                    continue
+                del pending[tid]
+
+                # Inputs are final once every dependency is done, so the signature is stable
+                signature = task_signature(task)
+                if (not force and 'would run' not in dep_status
+                        and state.get(tid, {}).get('signature') == signature
+                        and all(os.path.exists(o) for o in task.outputs)):
+                    results[tid] = {'status': 'skipped', 'rows': state[tid].get('rows'), 'seconds': 0.0, 'error': None}
+                    logger.debug("%s is up to date", tid)
+                elif dry_run:
+                    results[tid] = {'status': 'would run', 'rows': None, 'seconds': 0.0, 'error': None}
+                    logger.info("would run %s", tid)
+                elif pool is None:
+                    finish(tid, signature, lambda: _run_task(task.kind, task.kwargs))
+                    _save_state(work_dir, state)
+                else:
+                    running[tid] = (signature, pool.submit(_run_task, task.kind, task.kwargs))
+
+            if running:
+                done, _ = wait([f for _, f in running.values()], return_when=FIRST_COMPLETED)
+                for tid in [t for t, (_, f) in running.items() if f in done]:
+                    signature, future = running.pop(tid)
+                    finish(tid, signature, future.result)
+                _save_state(work_dir, state)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the config-driven light-curve pipeline.")
+    parser.add_argument("config", help="Pipeline config (.toml, or .yaml with PyYAML)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (overrides the config)")
+    parser.add_argument("--force", action="store_true", help="Re-run every task, even if up to date")
+    parser.add_argument("--dry-run", action="store_true", help="Only list the tasks that would run")
+    parser.add_argument("--metrics", default=None, help="Append per-stage metrics to this JSON-lines file")
+    parser.add_argument("--verbose", action="store_true", help="Debug logging")
+    args = parser.parse_args(argv)
+    configure_cli_logging(verbose=args.verbose, metrics=args.metrics)
+
+    start = time.perf_counter()
+    results = run_pipeline(load_config(args.config), workers=args.workers, force=args.force,
+                           dry_run=args.dry_run)
+    counts = {}
+    for res in results.values():
+        counts[res['status']] = counts.get(res['status'], 0) + 1
+    logger.info("%d tasks in %.2f s: %s", len(results), time.perf_counter() - start,
+                ", ".join(f"{n} {s}" for s, n in sorted(counts.items())))
+    return 1 if counts.get('failed') or counts.get('blocked') else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,311 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import extinction_utils
+
+from instrumentation import logger, instrumented
+from lc_store import read_lightcurve
+from lightcurve import as_dataframe
+
+# Marker styles and colors for different instruments
+INST_STYLES = {
+    'martini': {'marker': 'D', 'color': 'red', 'label': 'Martini'},
+    'aavso': {'marker': 's', 'color': 'green', 'label': 'AAVSO'},
+    'goranskij': {'marker': 'o', 'color': 'blue', 'label': 'Goranskij'}
+}
+
+# Declarative description of every light-curve plot.
+#   y_col:     magnitude column on the y axis
+#   ylabel:    y axis label
+#   group_col: one errorbar series per value of this column
+#   groups:    'unique' (order of appearance), 'sorted', or an explicit list
+#   styles:    optional per-group errorbar keyword arguments
+#   keep_empty: draw listed groups even when they have no points (legend entry)
+#   dropna:    drop rows with NaN y before plotting
+#   errorbar:  keyword arguments shared by every series
+PLOT_SPECS = {
+    'photometry': {
+        'y_col': 'mag', 'ylabel': 'Magnitude', 'group_col': 'filter', 'groups': 'unique',
+        'dropna': True, 'errorbar': {'fmt': 'o', 'capsize': 2},
+    },
+    'inst': {
+        'y_col': 'mag', 'ylabel': 'Magnitude', 'group_col': 'inst', 'groups': list(INST_STYLES),
+        'styles': {inst: {'fmt': s['marker'], 'color': s['color'], 'label': s['label']}
+                   for inst, s in INST_STYLES.items()},
+        'keep_empty': True, 'dropna': True, 'errorbar': {'capsize': 2},
+    },
+    'dereddened': {
+        'y_col': 'app_mag', 'ylabel': 'De-reddened App-Mag', 'group_col': 'filter', 'groups': 'sorted',
+        'errorbar': {'fmt': 'o', 'alpha': 0.8},
+    },
+    'dereddened_abs': {
+        'y_col': 'abs_mag', 'ylabel': 'De-reddened App-Mag', 'group_col': 'filter', 'groups': 'sorted',
+        'errorbar': {'fmt': 'o', 'alpha': 0.8},
+    },
+    'dereddened_gr': {
+        'y_col': 'mag_dereddened', 'ylabel': 'De-reddened App-Mag', 'group_col': 'filter', 'groups': ['g', 'r'],
+        'errorbar': {'fmt': 'o', 'alpha': 0.8},
+    },
+}
+
+# Bump when a rendering change alters the images, so cached plots are re-rendered
+RENDER_VERSION = 1
+
+# One reusable Agg figure per process and figure size; never touches pyplot
+_FIGURE_POOL = {}
+
+
+def _get_axes(figsize):
+    if figsize not in _FIGURE_POOL:
+        # matplotlib is only imported once something is actually rendered
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        fig = Figure(figsize=figsize)
+        FigureCanvasAgg(fig)
+        _FIGURE_POOL[figsize] = (fig, fig.add_subplot())
+    fig, ax = _FIGURE_POOL[figsize]
+    ax.cla()
+    return fig, ax
+
+
+def _group_indices(values, groups):
+    """
+    Row positions per group from a single factorization of the group column.
+    Returns a list of (group, positions) in plotting order.
+    """
+    codes, uniques = pd.factorize(values, sort=False)
+    order = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+    positions = {u: order[bounds[i]:bounds[i + 1]] for i, u in enumerate(uniques)}
+
+    if groups == 'unique':
+        names = list(uniques)
+    elif groups == 'sorted':
+        names = sorted(uniques)
+    else:
+        names = list(groups)
+    return [(name, positions.get(name, np.empty(0, dtype=int))) for name in names]
+
+
+def decimate_minmax(x, y, yerr=None, n_bins=1000, keep=None):
+    """
+    Min/max-per-bin decimation: for each of n_bins equal-width x bins keep the
+    points with the lowest y - yerr and the highest y + yerr, so the drawn
+    envelope (including error bars) is unchanged at pixel resolution.
+
+    Parameters:
+        x, y (np.ndarray): Coordinates (e.g. mjd, mag).
+        yerr (np.ndarray, optional): Errors whose envelope must be preserved.
+        n_bins (int): Number of x bins (roughly the plot width in pixels).
+        keep (np.ndarray, optional): Boolean mask of points that are always kept.
+
+    Returns:
+        np.ndarray: Sorted indices of the points to draw.
+    """
+    n = len(x)
+    if n <= 2 * n_bins:
+        return np.arange(n)
+    yerr = np.zeros(n) if yerr is None else np.nan_to_num(yerr)
+    lo = y - yerr
+    hi = y + yerr
+
+    span = x.max() - x.min()
+    bins = np.zeros(n, dtype=int) if span == 0 else ((x - x.min()) / span * n_bins).astype(int)
+    bins = np.minimum(bins, n_bins - 1)
+
+    # First row of each bin after sorting by (bin, lo) and by (bin, -hi)
+    picks = [np.argmin(x), np.argmax(x)]
+    for key in (lo, -hi):
+        order = np.lexsort((key, bins))
+        first = np.r_[True, bins[order][1:] != bins[order][:-1]]
+        picks.append(order[first])
+    if keep is not None:
+        picks.append(np.flatnonzero(keep))
+    return np.unique(np.hstack([np.atleast_1d(p) for p in picks]))
+
+
+def _segment_argmax(values, starts):
+    """
+    Index of the first maximum of each contiguous segment beginning at `starts`.
+    """
+    values = np.where(np.isnan(values), -np.inf, values)
+    counts = np.diff(np.r_[starts, len(values)])
+    best = np.repeat(np.maximum.reduceat(values, starts), counts)
+    positions = np.where(values == best, np.arange(len(values)), len(values))
+    return np.minimum.reduceat(positions, starts)
+
+
+def decimate_lttb(x, y, n_out=2000, keep=None, yerr=None):
+    """
+    Largest-triangle-three-buckets decimation of a curve to about n_out points.
+
+    The points are split into n_out - 2 buckets between the first and last one, and
+    each bucket keeps the point spanning the largest triangle with the means of its
+    neighbouring buckets (the vectorizable LTTB variant: the previous bucket's mean,
+    rather than its selected point, is the first vertex).
+
+    Parameters:
+        x, y (np.ndarray): Coordinates (e.g. mjd, mag).
+        n_out (int): Number of buckets (target number of points without yerr).
+        keep (np.ndarray, optional): Boolean mask of points that are always kept.
+        yerr (np.ndarray, optional): Errors; each bucket then also keeps its points with
+            the lowest y - yerr and the highest y + yerr, so the error envelope is drawn.
+
+    Returns:
+        np.ndarray: Sorted indices of the points to draw.
+    """
+    n = len(x)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+    order = np.argsort(x, kind='stable')
+    xs, ys = x[order], y[order]
+
+    # Buckets of the interior points 1 .. n - 2; each holds at least one point since n > n_out
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    starts = edges[:-1] - 1
+    counts = np.diff(edges)
+    bucket = np.repeat(np.arange(len(counts)), counts)
+    inner_x, inner_y = xs[1:-1], ys[1:-1]
+
+    # Triangle vertices: mean of the previous bucket (first point for bucket 0) and of the
+    # next bucket (last point for the last bucket)
+    mean_x = np.r_[xs[0], np.add.reduceat(inner_x, starts) / counts, xs[-1]]
+    mean_y = np.r_[ys[0], np.add.reduceat(inner_y, starts) / counts, ys[-1]]
+    a_x, a_y = mean_x[:-2][bucket], mean_y[:-2][bucket]
+    c_x, c_y = mean_x[2:][bucket], mean_y[2:][bucket]
+    area = np.abs((a_x - c_x) * (inner_y - a_y) - (a_x - inner_x) * (c_y - a_y))
+
+    picks = [np.array([0, n - 1]), 1 + _segment_argmax(area, starts)]
+    if yerr is not None:
+        err = np.nan_to_num(np.asarray(yerr, dtype=float)[order][1:-1])
+        picks.append(1 + _segment_argmax(-(inner_y - err), starts))
+        picks.append(1 + _segment_argmax(inner_y + err, starts))
+    idx = order[np.hstack(picks)]
+    if keep is not None:
+        idx = np.hstack([idx, np.flatnonzero(keep)])
+    return np.unique(idx)
+
+
+def _decimate(mjd, y, yerr, keep, method, max_points):
+    if method == 'minmax':
+        return decimate_minmax(mjd, y, yerr, n_bins=max(1, max_points // 2), keep=keep)
+    elif method == 'lttb':
+        # Points without a finite y (e.g. bands without a wavelength) are not drawn
+        # anyway and would leave LTTB buckets without any area to compare. Each bucket
+        # keeps up to three points (shape, lower and upper error envelope)
+        finite = np.flatnonzero(np.isfinite(y))
+        idx = finite[decimate_lttb(mjd[finite], y[finite], n_out=max(3, max_points // 3),
+                                   yerr=yerr[finite])]
+        return idx if keep is None else np.union1d(idx, np.flatnonzero(keep))
+    raise ValueError(f"Unsupported decimation method: {method}")
+
+
+@instrumented(rows_out=lambda n_points: n_points)
+def render_lightcurve(df, kind='photometry', title='', output_file=None, figsize=(10, 6),
+                      decimate=None, max_points=2000):
+    """
+    Renders one light-curve plot on a pooled, headless Agg figure.
+
+    Parameters:
+        df (pd.DataFrame or LightCurve): Light curve with 'mjd', 'magerr' and the columns named in the spec.
+        kind (str or dict): Key of PLOT_SPECS or a spec dict.
+        title (str): Title of the plot
+        output_file (str, optional): File name to save the plot
+        decimate (str, optional): 'minmax' or 'lttb' to thin each series to about
+            max_points before drawing. Points with a non-zero 'limit' or 'outlier'
+            flag are always drawn.
+        max_points (int): Target number of points per series when decimating.
+
+    Returns:
+        int: Number of points drawn.
+    """
+    spec = PLOT_SPECS[kind] if isinstance(kind, str) else kind
+    df = as_dataframe(df)
+    y_col = spec['y_col']
+    if spec.get('dropna'):
+        df = df.dropna(subset=[y_col])
+
+    mjd = df['mjd'].to_numpy()
+    y = df[y_col].to_numpy()
+    yerr = df['magerr'].to_numpy()
+    styles = spec.get('styles', {})
+
+    flagged = np.zeros(len(df), dtype=bool)
+    for col in ('limit', 'outlier'):
+        if col in df.columns:
+            flagged |= df[col].fillna(0).to_numpy() != 0
+
+    fig, ax = _get_axes(figsize)
+    n_points = 0
+    for name, idx in _group_indices(df[spec['group_col']].to_numpy(), spec['groups']):
+        if len(idx) == 0 and not spec.get('keep_empty'):
+            continue
+        if decimate and len(idx) > max_points:
+            idx = idx[_decimate(mjd[idx], y[idx], yerr[idx], flagged[idx], decimate, max_points)]
+        kwargs = {**spec['errorbar'], 'label': f'{name}', **styles.get(name, {})}
+        ax.errorbar(mjd[idx], y[idx], yerr=yerr[idx], **kwargs)
+        n_points += len(idx)
+
+    ax.invert_yaxis()
+    ax.set_xlabel('MJD')
+    ax.set_ylabel(spec['ylabel'])
+    ax.set_title(title)
+    ax.legend()
+    fig.tight_layout()
+    if output_file:
+        fig.savefig(output_file)
+    return n_points
+
+
+def _render_task(task):
+    start = time.perf_counter()
+    record = {'output_file': task['output_file'], 'status': 'ok', 'points': 0, 'seconds': 0.0, 'error': None}
+    try:
+        data = task['data']
+        if isinstance(data, (str, os.PathLike)):
+            data = read_lightcurve(data)
+        record['points'] = render_lightcurve(data, task.get('kind', 'photometry'),
+                                             title=task.get('title', ''), output_file=task['output_file'],
+                                             decimate=task.get('decimate'),
+                                             max_points=task.get('max_points', 2000))
+    except Exception as e:
+        record['status'] = 'failed'
+        record['error'] = f"{type(e).__name__}: {e}"
+    record['seconds'] = time.perf_counter() - start
+    return record
+
+
+def render_batch(tasks, workers=1):
+    """
+    Renders many light-curve plots, optionally across a process pool.
+
+    Parameters:
+        tasks (list): Dicts with 'data' (DataFrame or light curve path), 'output_file',
+            and optional 'kind' (key of PLOT_SPECS), 'title', 'decimate' and 'max_points'. Passing paths avoids
+            pickling DataFrames to the workers.
+        workers (int): Number of worker processes; 1 renders in this process.
+
+    Returns:
+        pd.DataFrame: One row per plot with status, points, seconds and error.
+    """
+    start = time.perf_counter()
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            records = list(pool.map(_render_task, tasks, chunksize=max(1, len(tasks) // (4 * workers))))
+    else:
+        records = [_render_task(task) for task in tasks]
+    wall = time.perf_counter() - start
+
+    summary = pd.DataFrame(records)
+    n_ok = int((summary['status'] == 'ok').sum()) if len(summary) else 0
+    logger.info("Rendered %d/%d plots in %.2f s (%.1f plots/s)", n_ok, len(tasks), wall, n_ok / wall if wall else 0)
+    return summary
+
 
 ######function to plot different filters
-def plot_photometry(df, title='Light Curve', output_file='lightcurve.png'):
+def plot_photometry(df, title='Light Curve', output_file='lightcurve.png', **kwargs):
     """
     Plots photometry light curves from a DataFrame.
 
@@ -11,29 +313,14 @@ def plot_photometry(df, title='Light Curve', output_file='lightcurve.png'):
         df (pd.DataFrame): DataFrame with columns: 'mjd', 'mag', 'magerr', 'filter'
         title (str): Title of the plot
         output_file (str): File name to save the plot
+        **kwargs: Passed to render_lightcurve (e.g. decimate='minmax')
     """
-    df = df.dropna(subset=["mag"])
-
-    plt.figure(figsize=(10, 6))
-    plt.gca().invert_yaxis()
-
-    for flt in df['filter'].unique():
-        flt_data = df[df['filter'] == flt]
-        plt.errorbar(flt_data['mjd'], flt_data['mag'], yerr=flt_data['magerr'],
-                     fmt='o', label=flt, capsize=2)
-
-    plt.xlabel('MJD')
-    plt.ylabel('Magnitude')
-    plt.title(title)
-    plt.legend()
-    plt.tight_layout()
-    plt.savefig(output_file)
-    plt.show()
+    render_lightcurve(df, 'photometry', title=title, output_file=output_file, **kwargs)
 
 #####function to differentiate telescopes
 
 
-def plot_photometry_inst(df, title='Light Curve', output_file='lightcurve.png'):
+def plot_photometry_inst(df, title='Light Curve', output_file='lightcurve.png', **kwargs):
     """
     Plots photometry light curves from a DataFrame with different markers for each instrument.
 
@@ -41,91 +328,19 @@ def plot_photometry_inst(df, title='Light Curve', output_file='lightcurve.png'):
         df (pd.DataFrame): DataFrame with columns: 'mjd', 'mag', 'magerr', 'filter', 'inst'
         title (str): Title of the plot
         output_file (str): File name to save the plot
+        **kwargs: Passed to render_lightcurve (e.g. decimate='minmax')
     """
-    df = df.dropna(subset=["mag"])
-
-    # Define marker styles and colors for different instruments
-    inst_styles = {
-        'martini': {'marker': 'D', 'color': 'red', 'label': 'Martini'},
-        'aavso': {'marker': 's', 'color': 'green', 'label': 'AAVSO'},
-        'goranskij': {'marker': 'o', 'color': 'blue', 'label': 'Goranskij'}
-    }
-
-    plt.figure(figsize=(10, 6))
-    plt.gca().invert_yaxis()
-
-    # Loop through instruments and plot each one with a different style
-    for inst, style in inst_styles.items():
-        inst_data = df[df['inst'] == inst]
-        plt.errorbar(inst_data['mjd'], inst_data['mag'], yerr=inst_data['magerr'],
-                     fmt=style['marker'], color=style['color'], label=style['label'], capsize=2)
-
-    plt.xlabel('MJD')
-    plt.ylabel('Magnitude')
-    plt.title(title)
-    plt.legend()
-    plt.tight_layout()
-    plt.savefig(output_file)
-    plt.show()
-
-
-def plot_photometry_dereddened(df, title='', output_file=None):
-    import matplotlib.pyplot as plt
-
-    plt.figure(figsize=(10, 6))
-    for band in sorted(df['filter'].unique()):
-        band_df = df[df['filter'] == band]
-        plt.errorbar(band_df['mjd'], band_df['app_mag'], yerr=band_df['magerr'],
-                     fmt='o', label=f'{band}', alpha=0.8)
-
-    plt.gca().invert_yaxis()
-    plt.xlabel("MJD")
-    plt.ylabel("De-reddened App-Mag")
-    plt.title(title)
-    plt.legend()
-    plt.tight_layout()
-    if output_file:
-        plt.savefig(output_file)
-    plt.close()
-    
-def plot_photometry_dereddened_abs(df, title='', output_file=None):
-    import matplotlib.pyplot as plt
-
-    plt.figure(figsize=(10, 6))
-    for band in sorted(df['filter'].unique()):
-        band_df = df[df['filter'] == band]
-        plt.errorbar(band_df['mjd'], band_df['abs_mag'], yerr=band_df['magerr'],
-                     fmt='o', label=f'{band}', alpha=0.8)
-
-    plt.gca().invert_yaxis()
-    plt.xlabel("MJD")
-    plt.ylabel("De-reddened App-Mag")
-    plt.title(title)
-    plt.legend()
-    plt.tight_layout()
-    if output_file:
-        plt.savefig(output_file)
-    plt.close()
-
-
-def plot_photometry_dereddened_gr(df, title='', output_file=None):
-    plt.figure(figsize=(10, 6))
-
-    # Separate g and r bands for individual plotting
-    for band in ['g', 'r']:  # Specify only the g and r filters
-        if band in df['filter'].unique():  # Check if the band exists in the dataframe
-            band_df = df[df['filter'] == band]
-            plt.errorbar(band_df['mjd'], band_df['mag_dereddened'], yerr=band_df['magerr'],
-                         fmt='o', label=f'{band}', alpha=0.8)
-
-    plt.gca().invert_yaxis()
-    plt.xlabel("MJD")
-    plt.ylabel("De-reddened App-Mag")
-    plt.title(title)
-    plt.legend()
-    plt.tight_layout()
-    
-    if output_file:
-        plt.savefig(output_file)
-    
-    plt.close()
+    render_lightcurve(df, 'inst', title=title, output_file=output_file, **kwargs)
+
+
+def plot_photometry_dereddened(df, title='', output_file=None, **kwargs):
+    render_lightcurve(df, 'dereddened', title=title, output_file=output_file, **kwargs)
+
+
+def plot_photometry_dereddened_abs(df, title='', output_file=None, **kwargs):
+    render_lightcurve(df, 'dereddened_abs', title=title, output_file=output_file, **kwargs)
+
+
+def plot_photometry_dereddened_gr(df, title='', output_file=None, **kwargs):
+    # Only the g and r bands, in that order
+    render_lightcurve(df, 'dereddened_gr', title=title, output_file=output_file, **kwargs)
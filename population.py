@@ -0,0 +1,266 @@
+"""
+Population forward modeling: a template absolute-magnitude light curve is placed
+at many mock events, each with its own A_V, R_V, distance and explosion epoch,
+and reduced to per-event summaries (peak apparent magnitude, time brighter than
+a limiting magnitude, first detection epoch per band).
+
+Events are processed in chunks of broadcast (events x bands x phases) arrays
+whose size is capped by --chunk-mb, and chunks run across a process pool.
+
+Usage:
+    python population.py template_dered.parquet --n-events 1e7 --limiting-mag 20.5 \
+        --window 0 365 --workers 8 --output population.parquet
+"""
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from extinction_utils import extinction_ratio_matrix, distmod_from_distance
+from instrumentation import configure_cli_logging, instrumented, logger
+from lc_store import read_lightcurve, write_lightcurve
+
+# Parameter distributions: name -> (kind, *args)
+#   fixed (value), uniform (low, high), normal (mean, sigma), exponential (scale),
+#   volume (d_min, d_max): distances uniform in Euclidean volume
+DEFAULT_PRIORS = {
+    'A_V': ('exponential', 0.5),
+    'R_V': ('normal', 3.1, 0.3),
+    'distance_pc': ('volume', 1e3, 5e4),
+    't0': ('uniform', 0.0, 365.0),
+}
+
+# R_V grid on which A_lambda / A_V is tabulated; sampled R_V are clipped to it
+R_V_GRID = np.linspace(1.5, 6.5, 201)
+
+DEFAULT_CHUNK_MB = 64
+
+
+def template_grid(template, step=1.0, mag_col='abs_mag', band_col='filter', phase_col=None):
+    """
+    Resamples a template light curve onto a regular phase grid per band.
+
+    Parameters:
+        template (pd.DataFrame): Long-format template (e.g. a '_dered' file with abs_mag).
+        step (float): Phase step in days.
+        mag_col (str): Absolute magnitude column.
+        band_col (str): Band column.
+        phase_col (str, optional): Phase column; default mjd minus the first epoch.
+
+    Returns:
+        tuple: (phases, bands, mags) with mags of shape (len(bands), len(phases)) float32,
+            NaN outside each band's observed phase range.
+    """
+    data = template[np.isfinite(template[mag_col].to_numpy(dtype=float))]
+    if 'limit' in data:
+        data = data[data['limit'].fillna(0).to_numpy() == 0]
+    phase = data[phase_col].to_numpy(dtype=float) if phase_col else data['mjd'].to_numpy(dtype=float)
+    if not phase_col:
+        phase = phase - phase.min()
+    phases = np.arange(0.0, phase.max() + step, step)
+
+    bands = sorted(data[band_col].unique())
+    mags = np.full((len(bands), len(phases)), np.nan, dtype=np.float32)
+    band_values = data[band_col].to_numpy()
+    mag = data[mag_col].to_numpy(dtype=float)
+    for i, band in enumerate(bands):
+        sel = band_values == band
+        order = np.argsort(phase[sel])
+        p, m = phase[sel][order], mag[sel][order]
+        inside = (phases >= p[0]) & (phases <= p[-1])
+        mags[i, inside] = np.interp(phases[inside], p, m)
+    return phases, bands, mags
+
+
+def sample_parameters(n, rng, priors=None):
+    """
+    Draws n events from the priors (DEFAULT_PRIORS updated with `priors`).
+
+    Returns:
+        dict: name -> float64 array of length n.
+    """
+    priors = {**DEFAULT_PRIORS, **(priors or {})}
+    params = {}
+    for name, (kind, *args) in priors.items():
+        if kind == 'fixed':
+            params[name] = np.full(n, float(args[0]))
+        elif kind == 'uniform':
+            params[name] = rng.uniform(args[0], args[1], n)
+        elif kind == 'normal':
+            params[name] = rng.normal(args[0], args[1], n)
+        elif kind == 'exponential':
+            params[name] = rng.exponential(args[0], n)
+        elif kind == 'volume':
+            d_min, d_max = args
+            params[name] = np.cbrt(rng.uniform(d_min ** 3, d_max ** 3, n))
+        else:
+            raise ValueError(f"Unknown prior '{kind}' for {name}")
+    return params
+
+
+def _range_min_table(mags):
+    """
+    Sparse table for range-minimum queries along the phase axis: level k holds the
+    NaN-ignoring minimum of mags[:, p:p + 2**k].
+    """
+    levels = [mags]
+    while 2 ** len(levels) <= mags.shape[1]:
+        prev, half = levels[-1], 2 ** (len(levels) - 1)
+        levels.append(np.fmin(prev[:, :-half], prev[:, half:]))
+    return levels
+
+
+def _range_min(levels, band, lo, hi):
+    """
+    min(mags[band, lo:hi]) for arrays of ranges (hi > lo), from two table lookups.
+    """
+    k = np.floor(np.log2(hi - lo)).astype(np.int64)
+    out = np.empty(len(lo), dtype=np.float32)
+    for level in np.unique(k):
+        sel = k == level
+        table = levels[level][band]
+        out[sel] = np.fmin(table[lo[sel]], table[hi[sel] - 2 ** level])
+    return out
+
+
+def _chunk_summary(grid, ratio_table, limiting_mag, window, params):
+    """
+    Summaries of one chunk of events.
+
+    An event is visible at a phase when template mag <= limit - (DM + A_lambda), so
+    visibility is one broadcast boolean (events, bands, phases) comparison. The observing
+    window maps to a contiguous phase-index range per event, and peaks inside it come from
+    a range-minimum table instead of the full magnitude cube.
+    """
+    phases, bands, mags, levels = grid
+    n, n_phases = len(params['A_V']), len(phases)
+    step = phases[1] - phases[0] if n_phases > 1 else 1.0
+    # A_lambda / A_V per event and band, interpolated on the tabulated R_V grid
+    ratios = np.column_stack([np.interp(params['R_V'], R_V_GRID, ratio_table[:, j]) for j in range(len(bands))])
+    offset = distmod_from_distance(params['distance_pc'])[:, None] + params['A_V'][:, None] * ratios
+
+    t0 = params['t0']
+    if window is None:
+        lo, hi = np.zeros(n, dtype=np.int64), np.full(n, n_phases, dtype=np.int64)
+    else:
+        lo = np.clip(np.ceil((window[0] - t0) / step), 0, n_phases).astype(np.int64)
+        hi = np.clip(np.floor((window[1] - t0) / step) + 1, 0, n_phases).astype(np.int64)
+    observed = hi > lo
+
+    threshold = (limiting_mag[None, :] - offset).astype(np.float32)
+    visible = mags[None, :, :] <= threshold[:, :, None]
+    if window is not None:
+        index = np.arange(n_phases)
+        visible &= ((index >= lo[:, None]) & (index < hi[:, None]))[:, None, :]
+    n_visible = visible.sum(axis=2)
+    first = np.argmax(visible, axis=2)
+
+    out = {name: values.astype(np.float32) for name, values in params.items()}
+    for j, band in enumerate(bands):
+        peak = np.full(n, np.nan, dtype=np.float32)
+        peak[observed] = _range_min(levels, j, lo[observed], hi[observed]) + offset[observed, j]
+        out[f'peak_{band}'] = peak
+        # Bands without an extinction ratio (no wavelength) have NaN offsets and summaries
+        t_visible = n_visible[:, j] * step if np.isfinite(ratio_table[0, j]) else np.nan
+        out[f't_visible_{band}'] = np.broadcast_to(t_visible, n).astype(np.float32)
+        out[f'first_detection_{band}'] = np.where(n_visible[:, j] > 0, t0 + phases[first[:, j]],
+                                                  np.nan).astype(np.float32)
+    out['detected'] = (n_visible > 0).any(axis=1)
+    return pd.DataFrame(out, index=pd.RangeIndex(n))
+
+
+def _run_chunk(args):
+    grid, ratio_table, limiting_mag, window, priors, n, seed = args
+    params = sample_parameters(n, np.random.default_rng(seed), priors)
+    return _chunk_summary(grid, ratio_table, limiting_mag, window, params)
+
+
+@instrumented(count_input=False)
+def simulate_population(template, n_events, limiting_mag=20.0, priors=None, window=None, step=1.0,
+                        mag_col='abs_mag', law='fitzpatrick99', seed=None, workers=1,
+                        chunk_mb=DEFAULT_CHUNK_MB):
+    """
+    Forward-models a population of reddened, distant copies of a template light curve.
+
+    Parameters:
+        template (pd.DataFrame or tuple): Template light curve or a template_grid result.
+        n_events (int): Number of mock events.
+        limiting_mag (float or dict): Limiting apparent magnitude, per band if a dict.
+        priors (dict, optional): Overrides of DEFAULT_PRIORS (A_V, R_V, distance_pc, t0).
+        window (tuple, optional): (start, end) of the observing window on the t0 time axis;
+            only epochs inside it count. None counts every epoch.
+        step (float): Phase step of the template grid in days.
+        mag_col (str): Template absolute magnitude column.
+        law (str): Extinction law (key of extinction_utils.EXTINCTION_LAWS).
+        seed (int, optional): Seed; for a given chunk_mb results do not depend on `workers`.
+        workers (int): Worker processes; 1 runs serially in this process.
+        chunk_mb (float): Cap on the broadcast array size per chunk in MB.
+
+    Returns:
+        pd.DataFrame: One float32 row per event with its parameters, and per band
+            peak_<band> (NaN if no epoch in the window), t_visible_<band> (days brighter than
+            the limit) and first_detection_<band>; plus a 'detected' flag for any band.
+            Bands without a wavelength in BAND_WAVELENGTHS (e.g. AAVSO 'VIS') are kept with
+            NaN summaries and never count as detected.
+    """
+    phases, bands, mags = template if isinstance(template, tuple) else template_grid(template, step, mag_col)
+    grid = (phases, bands, mags, _range_min_table(mags))
+    ratio_table = extinction_ratio_matrix(R_V_GRID, bands, law)
+    unknown = [b for b, r in zip(bands, ratio_table[0]) if np.isnan(r)]
+    if unknown:
+        logger.warning("No extinction for band(s) %s: their summaries will be NaN", ', '.join(map(str, unknown)))
+    if isinstance(limiting_mag, dict):
+        limits = np.array([limiting_mag.get(b, np.nan) for b in bands], dtype=np.float32)
+    else:
+        limits = np.full(len(bands), limiting_mag, dtype=np.float32)
+
+    # Two boolean (events, bands, phases) arrays and a few small ones are alive at once
+    per_event = 3 * len(bands) * len(phases)
+    chunk = max(1, int(chunk_mb * 1024 ** 2 // per_event))
+    sizes = [min(chunk, n_events - start) for start in range(0, n_events, chunk)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    jobs = [(grid, ratio_table, limits, window, priors, size, s) for size, s in zip(sizes, seeds)]
+
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            frames = list(pool.map(_run_chunk, jobs))
+    else:
+        frames = [_run_chunk(job) for job in jobs]
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Forward-model a population of reddened template light curves.")
+    parser.add_argument("template", help="Template light curve with absolute magnitudes")
+    parser.add_argument("--mag-col", default='abs_mag', help="Template absolute magnitude column")
+    parser.add_argument("--n-events", type=float, default=1e5, help="Number of mock events")
+    parser.add_argument("--limiting-mag", type=float, default=20.0, help="Limiting apparent magnitude")
+    parser.add_argument("--window", type=float, nargs=2, default=None, help="Observing window (start end)")
+    parser.add_argument("--step", type=float, default=1.0, help="Template phase step in days")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes")
+    parser.add_argument("--chunk-mb", type=float, default=DEFAULT_CHUNK_MB, help="Memory cap per chunk")
+    parser.add_argument("--output", default=None, help="Output table (.csv, .parquet or .feather)")
+    parser.add_argument("--verbose", action="store_true", help="Debug logging")
+    args = parser.parse_args(argv)
+    configure_cli_logging(verbose=args.verbose)
+
+    start = time.perf_counter()
+    summary = simulate_population(read_lightcurve(args.template), int(args.n_events),
+                                  limiting_mag=args.limiting_mag, window=args.window, step=args.step,
+                                  mag_col=args.mag_col, seed=args.seed, workers=args.workers,
+                                  chunk_mb=args.chunk_mb)
+    logger.info("%d events in %.2f s, %.1f%% detected", len(summary), time.perf_counter() - start,
+                100 * summary['detected'].mean() if len(summary) else 0.0)
+    if args.output:
+        write_lightcurve(summary, args.output, compact=False)
+        logger.info("Saved population summary to %s", args.output)
+    return summary
+
+
+if __name__ == "__main__":
+    main()
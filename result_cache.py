@@ -0,0 +1,205 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+
+from lc_store import file_fingerprint
+
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+
+class ResultCache:
+    """
+    Content-addressed cache of pipeline artifacts (dereddened tables, plot PNGs).
+
+    An entry is keyed by the SHA-256 of the input files' contents, the producing
+    function's name and its parameters, and stores a copy of the produced file.
+    Entries live in their own directories with a small meta.json, so concurrent
+    worker processes never share a mutable index. Least recently used entries and
+    file-hash memos are evicted once the cache grows beyond `max_bytes`; the size is
+    tracked as a running total, so the directory is only rescanned when it overflows.
+
+    Usage:
+        cache = ResultCache('~/.cache/lrn')
+        if not cache.restore('deredden', [input_path], params, output_path):
+            ...produce output_path...
+            cache.store('deredden', [input_path], params, output_path)
+    """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = os.path.expanduser(cache_dir)
+        self.max_bytes = max_bytes
+        self._objects = os.path.join(self.cache_dir, 'objects')
+        self._hashes = os.path.join(self.cache_dir, 'hashes')
+        os.makedirs(self._objects, exist_ok=True)
+        os.makedirs(self._hashes, exist_ok=True)
+        # Running size estimate, from one scan on first write; other processes' writes
+        # are only seen at the next eviction scan
+        self._total = None
+
+    def file_hash(self, path):
+        """
+        SHA-256 of a file, memoized on (path, size, mtime) so unchanged files are not re-read.
+        """
+        st = os.stat(path)
+        memo_key = f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}"
+        memo = os.path.join(self._hashes, hashlib.sha1(memo_key.encode()).hexdigest())
+        try:
+            with open(memo) as f:
+                digest = f.read().strip()
+            os.utime(memo)
+            return digest
+        except FileNotFoundError:
+            pass
+        digest = file_fingerprint(path)['sha256']
+        _atomic_write(memo, digest)
+        self._grow(len(digest))
+        return digest
+
+    def key(self, func_name, input_paths, params=None):
+        """
+        Cache key for running `func_name` with `params` on the given input files.
+        """
+        payload = {
+            'func': func_name,
+            'inputs': [self.file_hash(p) for p in input_paths],
+            'params': params or {},
+        }
+        blob = json.dumps(payload, sort_keys=True, default=str)
+        return hashlib.sha256(blob.encode()).hexdigest()
+
+    def _entry_dir(self, key):
+        return os.path.join(self._objects, key)
+
+    def lookup(self, key):
+        """
+        Returns the entry's metadata (with 'artifact' path) or None on a miss.
+        """
+        meta_path = os.path.join(self._entry_dir(key), 'meta.json')
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        artifact = os.path.join(self._entry_dir(key), meta['filename'])
+        if not os.path.exists(artifact):
+            return None
+        # mtime of meta.json records the last access for LRU eviction
+        os.utime(meta_path)
+        meta['artifact'] = artifact
+        return meta
+
+    def restore(self, func_name, input_paths, params, output_path):
+        """
+        Copies a cached artifact to output_path. Returns its metadata, or None on a miss.
+        An output that is already identical to the cached artifact is left untouched.
+        """
+        meta = self.lookup(self.key(func_name, input_paths, params))
+        if meta is None:
+            return None
+        if not (os.path.exists(output_path)
+                and os.path.getsize(output_path) == meta['size']
+                and self.file_hash(output_path) == meta['sha256']):
+            shutil.copyfile(meta['artifact'], output_path)
+        return meta
+
+    def store(self, func_name, input_paths, params, output_path, **extra):
+        """
+        Stores a copy of output_path under the key of (func_name, inputs, params).
+        Extra keyword arguments are saved in the entry's metadata (e.g. rows=...).
+        """
+        key = self.key(func_name, input_paths, params)
+        entry = self._entry_dir(key)
+        tmp = f"{entry}.tmp{os.getpid()}"
+        os.makedirs(tmp, exist_ok=True)
+        filename = os.path.basename(output_path)
+        shutil.copyfile(output_path, os.path.join(tmp, filename))
+        meta = {'func': func_name, 'params': params, 'filename': filename,
+                'size': os.path.getsize(output_path), 'sha256': self.file_hash(output_path),
+                'created': time.time(), **extra}
+        with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+            json.dump(meta, f, default=str)
+
+        shutil.rmtree(entry, ignore_errors=True)
+        try:
+            os.replace(tmp, entry)
+        except OSError:
+            # Another process stored the same key first
+            shutil.rmtree(tmp, ignore_errors=True)
+        self._grow(meta['size'] + os.path.getsize(os.path.join(entry, 'meta.json')))
+        return key
+
+    def _grow(self, nbytes):
+        if self._total is None:
+            self._total = self.size()
+        else:
+            self._total += nbytes
+        if self._total > self.max_bytes:
+            self.evict()
+
+    def _entries(self):
+        for key in os.listdir(self._objects):
+            entry = self._entry_dir(key)
+            meta_path = os.path.join(entry, 'meta.json')
+            if not os.path.exists(meta_path):
+                continue
+            size = sum(e.stat().st_size for e in os.scandir(entry) if e.is_file())
+            yield key, os.stat(meta_path).st_mtime, size
+
+    def _memos(self):
+        for e in os.scandir(self._hashes):
+            if e.is_file():
+                st = e.stat()
+                yield e.path, st.st_mtime, st.st_size
+
+    def size(self):
+        return (sum(size for _, _, size in self._entries())
+                + sum(size for _, _, size in self._memos()))
+
+    def evict(self):
+        """
+        Removes least recently used entries and file-hash memos until the cache fits
+        in max_bytes.
+        """
+        items = ([(self._entry_dir(key), mtime, size) for key, mtime, size in self._entries()]
+                 + list(self._memos()))
+        items.sort(key=lambda e: e[1])
+        total = sum(size for _, _, size in items)
+        for path, _, size in items:
+            if total <= self.max_bytes:
+                break
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            total -= size
+        self._total = total
+
+    def invalidate(self, key=None, func_name=None):
+        """
+        Drops one entry by key, every entry of one function, or (no arguments) everything.
+        Returns the number of entries removed.
+        """
+        removed = 0
+        for entry_key, _, _ in list(self._entries()):
+            if key is not None and entry_key != key:
+                continue
+            if func_name is not None:
+                with open(os.path.join(self._entry_dir(entry_key), 'meta.json')) as f:
+                    if json.load(f).get('func') != func_name:
+                        continue
+            shutil.rmtree(self._entry_dir(entry_key), ignore_errors=True)
+            removed += 1
+        self._total = None
+        return removed
+
+
+def _atomic_write(path, text):
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, 'w') as f:
+        f.write(text)
+    os.replace(tmp, path)
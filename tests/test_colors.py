@@ -0,0 +1,126 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from colors import color_curves, match_epochs, synthetic_gr
+
+
+def _brute_force(ref_keys, ref_mjd, ref_mag, ref_err, keys, mjd, method, tol):
+    out = np.full((3, len(mjd)), np.nan)
+    for i, (k, t) in enumerate(zip(keys, mjd)):
+        same = ref_keys == k
+        rt, rm, re = ref_mjd[same], ref_mag[same], ref_err[same]
+        if method == 'nearest':
+            if same.any() and np.abs(rt - t).min() <= tol:
+                j = np.argmin(np.abs(rt - t))
+                out[:, i] = rm[j], re[j], abs(rt[j] - t)
+            continue
+        before, after = rt <= t, rt > t
+        if not before.any():
+            continue
+        j = np.flatnonzero(before)[np.argmax(rt[before])]
+        if rt[j] == t:
+            out[:, i] = rm[j], re[j], 0.0
+        elif after.any():
+            hi = np.flatnonzero(after)[np.argmin(rt[after])]
+            if t - rt[j] <= tol and rt[hi] - t <= tol:
+                f = (t - rt[j]) / (rt[hi] - rt[j])
+                out[:, i] = ((1 - f) * rm[j] + f * rm[hi], np.hypot((1 - f) * re[j], f * re[hi]),
+                             min(t - rt[j], rt[hi] - t))
+    return out
+
+
+@pytest.mark.parametrize('method', ['nearest', 'linear'])
+@pytest.mark.parametrize('tol', [0.3, 2.0])
+def test_match_epochs_matches_brute_force(method, tol):
+    rng = np.random.default_rng(5)
+    n_ref, n = 600, 800
+    ref_keys = rng.integers(0, 4, n_ref)
+    ref_mjd = rng.uniform(0, 100, n_ref)
+    ref_mag, ref_err = rng.uniform(10, 15, n_ref), rng.uniform(0.01, 0.1, n_ref)
+    keys = rng.integers(0, 5, n)         # object 4 has no reference points
+    mjd = rng.uniform(-5, 105, n)
+    # Some queries fall exactly on a reference epoch
+    mjd[:50], keys[:50] = ref_mjd[:50], ref_keys[:50]
+
+    got = match_epochs(ref_keys, ref_mjd, ref_mag, ref_err, keys, mjd, method=method, tol=tol)
+    expected = _brute_force(ref_keys, ref_mjd, ref_mag, ref_err, keys, mjd, method, tol)
+    np.testing.assert_allclose(np.vstack(got), expected, rtol=1e-9, atol=1e-9)
+    assert np.isfinite(got[0]).sum() > n // 10
+    assert np.isnan(got[0][keys == 4]).all()
+
+
+def test_match_epochs_rejects_unknown_method():
+    with pytest.raises(ValueError):
+        match_epochs(np.zeros(1, int), np.zeros(1), np.zeros(1), np.zeros(1), np.zeros(1, int), np.zeros(1),
+                     method='cubic')
+
+
+def test_color_curves_per_object():
+    df = pd.DataFrame({
+        'object': ['x'] * 4 + ['y'] * 4,
+        'filter': ['B', 'V'] * 4,
+        'mjd': [1.0, 1.1, 2.0, 2.2, 1.0, 1.05, 3.0, 3.9],
+        'mag': [12.0, 11.5, 12.2, 11.6, 14.0, 13.0, 14.5, 13.1],
+        'magerr': 0.03,
+        'limit': [0, 0, 0, 0, 0, 0, 0, 1],
+    })
+    out = color_curves(df, colors=['B-V'], tol=0.5, by='object')
+    assert out['object'].tolist() == ['x', 'x', 'y']
+    np.testing.assert_allclose(out['color_mag'], [0.5, 0.6, 1.0])
+    np.testing.assert_allclose(out['color_err'], np.hypot(0.03, 0.03))
+    np.testing.assert_allclose(out['dt_max'], [0.1, 0.2, 0.05])
+
+
+def _johnson(bands, n=50, seed=2, inst='x'):
+    rng = np.random.default_rng(seed)
+    t = np.arange(n, dtype=float)
+    rows = []
+    for i, band in enumerate(bands):
+        # Each band observed a little later than the anchor
+        rows.append(pd.DataFrame({'inst': inst, 'filter': band, 'mjd': t + 0.05 * i,
+                                  'mag': rng.uniform(10, 14, n), 'magerr': rng.uniform(0.01, 0.05, n),
+                                  'limit': 0}))
+    return pd.concat(rows, ignore_index=True)
+
+
+def test_synthetic_gr_jester05_equations():
+    df = _johnson(['B', 'V'])
+    out = synthetic_gr(df, transform='jester05', strict_tol=0.01)
+    B = df.loc[df['filter'] == 'B', ['mag', 'magerr']].to_numpy()
+    V = df.loc[df['filter'] == 'V', ['mag', 'magerr']].to_numpy()
+    g, r = out[out['filter'] == 'g'], out[out['filter'] == 'r']
+    # Jester et al. (2005): g = V + 0.60(B-V) - 0.12, r = V - 0.42(B-V) + 0.11
+    np.testing.assert_allclose(g['mag'], V[:, 0] + 0.60 * (B[:, 0] - V[:, 0]) - 0.12)
+    np.testing.assert_allclose(r['mag'], V[:, 0] - 0.42 * (B[:, 0] - V[:, 0]) + 0.11)
+    np.testing.assert_allclose(g['magerr'], np.sqrt((0.6 * B[:, 1]) ** 2 + (0.4 * V[:, 1]) ** 2 + 0.02 ** 2))
+    np.testing.assert_allclose(g['mjd'], df.loc[df['filter'] == 'V', 'mjd'])
+    np.testing.assert_allclose(g['mjderr'], 0.05)
+    assert not out['strict'].any()
+    assert synthetic_gr(df, transform='jester05', strict_tol=0.1)['strict'].all()
+
+
+def test_synthetic_gr_lupton05_inverts_the_published_equations():
+    df = _johnson(['V', 'R'])
+    out = synthetic_gr(df, transform='lupton05')
+    g = out.loc[out['filter'] == 'g', 'mag'].to_numpy()
+    r = out.loc[out['filter'] == 'r', 'mag'].to_numpy()
+    V = df.loc[df['filter'] == 'V', 'mag'].to_numpy()
+    R = df.loc[df['filter'] == 'R', 'mag'].to_numpy()
+    # Lupton (2005): V = g - 0.5784(g-r) - 0.0038, R = r - 0.1837(g-r) - 0.0971
+    np.testing.assert_allclose(g - 0.5784 * (g - r) - 0.0038, V, atol=2e-3)
+    np.testing.assert_allclose(r - 0.1837 * (g - r) - 0.0971, R, atol=2e-3)
+
+
+def test_synthetic_gr_pairs_within_instrument_and_skips_limits():
+    df = pd.concat([_johnson(['V'], n=5, inst='x'), _johnson(['B'], n=5, inst='y')], ignore_index=True)
+    assert synthetic_gr(df).empty
+    assert len(synthetic_gr(df, per_inst=False)) == 10
+
+    df = _johnson(['B', 'V'], n=5)
+    df.loc[(df['filter'] == 'B') & (df['mjd'] < 2), 'limit'] = 1
+    # The limits are skipped: V at 1.05 pairs with B at 2.0, V at 0.05 has no B within a day
+    out = synthetic_gr(df, tol=1.0)
+    assert len(out) == 2 * 4
+    np.testing.assert_allclose(out.loc[out['filter'] == 'g', 'mjderr'], [0.95, 0.05, 0.05, 0.05])
+    assert len(synthetic_gr(df, tol=0.5)) == 2 * 3
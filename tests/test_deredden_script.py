@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from deredden_script import deredden_object, main
+from lc_store import read_lightcurve
+from result_cache import ResultCache
+
+
+def _object(tmp_path):
+    path = tmp_path / 'obj.csv'
+    pd.DataFrame({'inst': 'x', 'filter': ['B', 'V'], 'mjd': [1.0, 2.0], 'mjderr': 0.0, 'mag': [12.0, 11.0],
+                  'magerr': 0.05, 'ATel': 0, 'limit': 0}).to_csv(path, index=False)
+    return {'Name': 'obj', 'input_file': str(path), 'E_BV': 0.5, 'R_V': 3.1, 'distance_pc': 1000.0,
+            'E_BV_err': 0.1, 'R_V_err': 0.2, 'distance_pc_err': 100.0}
+
+
+def test_unseeded_monte_carlo_bypasses_cache(tmp_path):
+    cache = ResultCache(tmp_path / 'cache')
+    obj = _object(tmp_path)
+    assert not deredden_object(obj, mc_samples=50, cache=cache)[2]
+    assert not deredden_object(obj, mc_samples=50, cache=cache)[2]
+    assert cache.size() == 0
+
+    assert not deredden_object(obj, mc_samples=50, seed=1, cache=cache)[2]
+    assert deredden_object(obj, mc_samples=50, seed=1, cache=cache)[2]
+
+
+def _aavso(tmp_path):
+    path = tmp_path / 'aavso.csv'
+    pd.DataFrame({'JD': [2450001.5, 2450002.5, 2450003.5], 'Band': [' v', 'B', 'V'],
+                  'Magnitude': [12.0, 12.5, 11.5], 'Uncertainty': [0.05, None, 0.02]}).to_csv(path, index=False)
+    return str(path)
+
+
+def test_source_reads_raw_files_streamed_or_not(tmp_path):
+    path = _aavso(tmp_path)
+    params = tmp_path / 'params.csv'
+    pd.DataFrame({'Name': ['a'], 'input_file': [path], 'E_BV': [0.3], 'R_V': [3.1],
+                  'distance_pc': [500.0]}).to_csv(params, index=False)
+
+    summary = main(['--params', str(params), '--source', 'auto'])
+    assert summary['status'].tolist() == ['ok']
+    whole = read_lightcurve(summary['output_file'][0])
+    assert whole['filter'].tolist() == ['V', 'B', 'V']
+    np.testing.assert_allclose(whole['mjd'], [50001.0, 50002.0, 50003.0])
+
+    obj = {'Name': 'a', 'input_file': path, 'E_BV': 0.3, 'R_V': 3.1, 'distance_pc': 500.0, 'source': 'aavso'}
+    out, rows, _ = deredden_object(obj, chunksize=2)
+    assert rows == 3
+    pd.testing.assert_frame_equal(read_lightcurve(out), whole, check_dtype=False)
+
+
+def test_standard_input_without_source_fails_on_raw_file(tmp_path):
+    obj = {'Name': 'a', 'input_file': _aavso(tmp_path), 'E_BV': 0.3, 'R_V': 3.1, 'distance_pc': 500.0}
+    with pytest.raises(KeyError):
+        deredden_object(obj)
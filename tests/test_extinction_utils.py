@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from extinction_utils import (DISTMOD_MAX_ERROR, DISTMOD_Z_MIN, apply_reddening_df, distmod_from_distance,
+                              distmod_from_z, monte_carlo_deredden, sweep_extinction, sweep_extinction_frame)
+
+
+def _lightcurve():
+    return pd.DataFrame({
+        'inst': 'x',
+        'filter': ['B', 'V', 'R', 'VIS', 'I'],
+        'mjd': np.arange(5.0),
+        'mag': [12.0, 11.5, 11.0, 11.2, 10.5],
+        'magerr': 0.05,
+    })
+
+
+def test_sweep_matches_single_scenarios():
+    df = _lightcurve()
+    A_V, R_V = [0.0, 1.0, 2.5], [2.5, 3.1]
+    cube = sweep_extinction(df, A_V, R_V, distance_pc=6100)
+    assert cube['app_mag'].shape == (len(df), 3, 2)
+    for i, a_v in enumerate(A_V):
+        for j, r_v in enumerate(R_V):
+            ref = apply_reddening_df(df, a_v, r_v, mag_col='mag')['app_mag'].to_numpy()
+            np.testing.assert_allclose(cube['app_mag'][:, i, j], ref)
+            np.testing.assert_allclose((cube['app_mag'] - cube['DM'])[:, i, j], ref - distmod_from_distance(6100))
+
+
+def test_sweep_inplace_absolute_magnitudes():
+    df = _lightcurve()
+    ref = sweep_extinction(df, [0.5, 1.0], [3.1], distance_pc=np.full(len(df), 6100.0))
+    assert ref['DM'].shape == (len(df), 1, 1)
+    cube = sweep_extinction(df, [0.5, 1.0], [3.1], distance_pc=6100, inplace=True)
+    assert set(cube) == {'abs_mag', 'DM'}
+    np.testing.assert_allclose(cube['abs_mag'], ref['app_mag'] - ref['DM'])
+
+    frame = sweep_extinction_frame(df, [0.5, 1.0], [3.1], distance_pc=6100, inplace=True)
+    known = frame['filter'] != 'VIS'
+    np.testing.assert_allclose((frame['app_mag'] - frame['abs_mag'])[known], distmod_from_distance(6100))
+    np.testing.assert_allclose(frame['abs_mag'], cube['abs_mag'].ravel())
+
+
+def _mc(df, **kwargs):
+    return monte_carlo_deredden(df, 1.0, E_BV_err=0.1, R_V_err=0.3, distance_pc=6100, distance_err=500,
+                                n_samples=4000, seed=3, **kwargs)
+
+
+def test_monte_carlo_errors_follow_requested_percentiles():
+    df = _lightcurve().assign(magerr=0.0)
+    wide = _mc(df, percentiles=(5, 95))
+    default = _mc(df)
+    known = df['filter'] != 'VIS'
+    # Both estimate the same Gaussian sigma, and the point estimate is the median
+    np.testing.assert_allclose(wide['app_magerr'][known], default['app_magerr'][known], rtol=0.05)
+    np.testing.assert_allclose(wide['app_mag'], default['app_mag_p50'], equal_nan=True)
+    assert wide.loc[~known, ['app_mag', 'app_magerr']].isna().all().all()
+
+
+def test_monte_carlo_chunking_does_not_change_results():
+    df = pd.concat([_lightcurve()] * 7, ignore_index=True)
+    pd.testing.assert_frame_equal(_mc(df, chunksize=3), _mc(df))
+
+
+def test_monte_carlo_rejects_open_percentiles():
+    with pytest.raises(ValueError):
+        _mc(_lightcurve(), percentiles=(0, 50, 100))
+
+
+def test_distmod_from_z_matches_astropy():
+    from astropy.cosmology import Planck18
+    rng = np.random.default_rng(0)
+    # Log-uniform over the tabulated range and below DISTMOD_Z_MIN, for tables of several sizes
+    for z_max in (0.01, 0.7, 3.0):
+        z = np.r_[10 ** rng.uniform(-7, np.log10(z_max), 2000), DISTMOD_Z_MIN, z_max]
+        np.testing.assert_allclose(distmod_from_z(z), Planck18.distmod(z).value, rtol=0, atol=DISTMOD_MAX_ERROR)
+
+    out = distmod_from_z([0.1, 0.0, -1.0, np.nan])
+    np.testing.assert_allclose(out[0], Planck18.distmod(0.1).value, atol=DISTMOD_MAX_ERROR)
+    assert np.isnan(out[1:]).all()
+    assert np.isnan(distmod_from_z([0.0, -0.5])).all()
+    assert np.ndim(distmod_from_z(0.05)) == 0
@@ -0,0 +1,229 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import pytest
+
+from lc_data import deduplicate_lightcurve, ingest_lightcurves, stack_lightcurves, ut_to_mjd, ut_to_mjd_batch
+
+
+def test_binning_keeps_missing_derived_mags_nan(tmp_path):
+    # VIS has no entry in BAND_WAVELENGTHS, so its de-reddened magnitudes are NaN
+    df = pd.DataFrame({
+        'inst': ['aavso'] * 4,
+        'filter': ['VIS', 'VIS', 'V', 'V'],
+        'mjd': [100.1, 100.2, 100.1, 100.2],
+        'mjderr': 0.0,
+        'mag': [12.0, 12.2, 11.0, 11.2],
+        'magerr': 0.1,
+        'ATel': 0,
+        'limit': 0,
+        'app_mag': [np.nan, np.nan, 10.0, np.nan],
+        'abs_mag': [np.nan, np.nan, -5.0, np.nan],
+    })
+    path = tmp_path / 'lc.csv'
+    df.to_csv(path, index=False)
+
+    binned = stack_lightcurves([str(path)], binning=True).set_index('filter')
+    assert np.isnan(binned.loc['VIS', 'app_mag'])
+    assert np.isnan(binned.loc['VIS', 'abs_mag'])
+    assert binned.loc['VIS', 'mag'] == 12.1
+    # A partly missing bin averages only its finite values
+    assert binned.loc['V', 'app_mag'] == 10.0
+    assert binned.loc['V', 'abs_mag'] == -5.0
+
+
+VALID_DATES = ['2020 January 1.5', ' 2020  february 29.25 ', '+2021 MARCH 3', '2020 January 1e1',
+               '1858 November 17', '2020 December 31.999999', '1600 February 29.5', '1 January 1.0']
+MALFORMED_DATES = ['2019 February 29.1', '1900 February 29', '2020 Jan 1.5', '2020 January',
+                   '2020 January 1.5 x', '2020.0 January 1.5', '2020 January .5', '2020 January 0.5',
+                   '2020 January 32', '10000 January 1', '0 January 1', '2020 January inf',
+                   '2020 January nan', 'garbage', '']
+
+
+@pytest.mark.filterwarnings('ignore::Warning')
+def test_ut_to_mjd_batch_matches_scalar_parser():
+    mjd, bad = ut_to_mjd_batch(VALID_DATES + VALID_DATES[::-1])
+    assert not bad.any()
+    expected = [ut_to_mjd(d) for d in VALID_DATES + VALID_DATES[::-1]]
+    np.testing.assert_allclose(mjd, expected, rtol=0, atol=1e-9)
+
+
+def test_ut_to_mjd_batch_flags_malformed_entries():
+    for date in MALFORMED_DATES:
+        with pytest.raises(Exception):
+            ut_to_mjd(date)
+    dates = MALFORMED_DATES + [np.nan, None, 5, 2020.5] + ['2020 January 1.5']
+    mjd, bad = ut_to_mjd_batch(dates)
+    assert bad.tolist() == [True] * (len(dates) - 1) + [False]
+    assert np.isnan(mjd[:-1]).all() and mjd[-1] == 58849.5
+
+    for dates in (['garbage'], [np.nan], [], pd.Series(['2020 January 1.5', None], dtype='string')):
+        mjd, bad = ut_to_mjd_batch(dates)
+        assert np.array_equal(np.isnan(mjd), bad) and len(bad) == len(dates)
+
+
+def _dedup_groups_brute_force(df, mjd_tol, mag_tol):
+    """Groups as sets of row labels, built one row at a time from the documented rules."""
+    groups = []
+    for (_, _), sub in df.groupby(['filter', 'limit']):
+        sub = sub.sort_values('mjd', kind='stable')
+        epochs, current = [], [sub.index[0]]
+        for prev, row in zip(sub.index[:-1], sub.index[1:]):
+            if df.at[row, 'mjd'] - df.at[prev, 'mjd'] <= mjd_tol:
+                current.append(row)
+            else:
+                epochs.append(current)
+                current = [row]
+        epochs.append(current)
+        for epoch in epochs:
+            rows = sorted(epoch, key=lambda r: df.at[r, 'mag'])
+            current = [rows[0]]
+            for prev, row in zip(rows[:-1], rows[1:]):
+                if abs(df.at[row, 'mag'] - df.at[prev, 'mag']) <= mag_tol:
+                    current.append(row)
+                else:
+                    groups.append(frozenset(current))
+                    current = [row]
+            groups.append(frozenset(current))
+    return groups
+
+
+def _duplicated_lightcurve(n=400, seed=0):
+    rng = np.random.default_rng(seed)
+    base = pd.DataFrame({
+        'inst': rng.choice(['a', 'b', 'c'], n),
+        'filter': rng.choice(['B', 'V'], n),
+        'mjd': np.round(rng.uniform(0, 20, n), 1),
+        'mjderr': 0.0,
+        'mag': np.round(rng.uniform(10, 11, n), 2),
+        'magerr': rng.uniform(0.01, 0.1, n),
+        'ATel': 0,
+        'limit': (rng.random(n) < 0.1).astype(int),
+    })
+    # Copies of some rows, re-published with small shifts in time and magnitude
+    dup = base.sample(n // 2, random_state=seed).assign(inst=lambda d: d['inst'].map({'a': 'b', 'b': 'c', 'c': 'a'}))
+    dup['mjd'] += rng.uniform(-5e-4, 5e-4, len(dup))
+    dup['mag'] += rng.uniform(-0.02, 0.02, len(dup))
+    return pd.concat([base, dup], ignore_index=True)
+
+
+@pytest.mark.parametrize('mjd_tol,mag_tol', [(1e-3, 0.05), (0.15, 0.05), (1e-3, 0.0)])
+def test_dedup_groups_match_brute_force(mjd_tol, mag_tol):
+    df = _duplicated_lightcurve()
+    df['row'] = np.arange(len(df))
+    expected = _dedup_groups_brute_force(df, mjd_tol, mag_tol)
+    out = deduplicate_lightcurve(df, mjd_tol=mjd_tol, mag_tol=mag_tol)
+
+    assert len(out) == len(expected)
+    assert out['n_merged'].sum() == len(df)
+    # Every kept row represents exactly one brute-force group of the same size
+    group_of = {row: g for g in expected for row in g}
+    kept = [group_of[row] for row in out['row']]
+    assert len(set(kept)) == len(expected)
+    assert [len(g) for g in kept] == out['n_merged'].tolist()
+    for g, sources in zip(kept, out['sources']):
+        assert sources == '+'.join(sorted(set(df.loc[list(g), 'inst'])))
+
+
+def _pair(**overrides):
+    df = pd.DataFrame({'inst': ['a', 'b', 'c'], 'filter': 'V', 'mjd': [10.0, 10.0005, 10.0009],
+                       'mjderr': 0.0, 'mag': [12.00, 12.03, 12.01], 'magerr': [0.10, 0.05, 0.02],
+                       'ATel': 0, 'limit': 0})
+    return df.assign(**overrides)
+
+
+def test_dedup_priority_rule():
+    # Without a priority list instruments rank in order of appearance
+    assert deduplicate_lightcurve(_pair())['inst'].tolist() == ['a']
+    # A listed instrument outranks the others; unlisted ones keep their order after it
+    out = deduplicate_lightcurve(_pair(), inst_priority=['c'])
+    assert out[['inst', 'mag', 'magerr']].values.tolist() == [['c', 12.01, 0.02]]
+    assert deduplicate_lightcurve(_pair(), inst_priority=['x', 'b'])['inst'].tolist() == ['b']
+    # Between rows of the same instrument the smallest magerr wins
+    out = deduplicate_lightcurve(_pair(inst='a', magerr=[0.1, np.nan, 0.05]))
+    assert out['magerr'].tolist() == [0.05]
+    assert out['n_merged'].tolist() == [3] and out['sources'].tolist() == ['a']
+    assert deduplicate_lightcurve(_pair())['sources'].tolist() == ['a+b+c']
+
+
+def test_dedup_weighted_rule():
+    df = _pair()
+    out = deduplicate_lightcurve(df, rule='weighted')
+    w = 1 / df['magerr'] ** 2
+    np.testing.assert_allclose(out['mag'], [(w * df['mag']).sum() / w.sum()])
+    np.testing.assert_allclose(out['mjd'], [(w * df['mjd']).sum() / w.sum()])
+    np.testing.assert_allclose(out['magerr'], [w.sum() ** -0.5])
+
+    # Rows without a valid error only count when no row of the group has one
+    out = deduplicate_lightcurve(_pair(magerr=[np.nan, 0.05, 0.0]), rule='weighted')
+    np.testing.assert_allclose(out[['mag', 'magerr']].values, [[12.03, 0.05]])
+    out = deduplicate_lightcurve(_pair(magerr=np.nan), rule='weighted')
+    np.testing.assert_allclose(out['mag'], [np.mean([12.0, 12.03, 12.01])])
+    assert np.isnan(out['magerr']).all()
+
+
+def test_dedup_tolerances_and_limits():
+    df = _pair()
+    assert len(deduplicate_lightcurve(df, mjd_tol=3e-4)) == 3
+    assert len(deduplicate_lightcurve(df, mag_tol=0.015)) == 2      # 12.00+12.01 | 12.03
+    assert len(deduplicate_lightcurve(df.assign(limit=[0, 1, 0]))) == 2
+    assert len(deduplicate_lightcurve(df.assign(filter=['V', 'B', 'V']))) == 2
+    with pytest.raises(ValueError):
+        deduplicate_lightcurve(df, rule='mean')
+
+
+def _raw_files(root):
+    root.mkdir()
+    pd.DataFrame({'JD': [2452300.5, 2452301.5], 'Band': ['V', 'B'], 'Magnitude': [11.0, 12.0],
+                  'Uncertainty': [0.01, 0.02]}).to_csv(root / 'aavso_export.csv', index=False)
+    pd.DataFrame({'dateobs': ['2002 January 10.5', '2002 February 1.25'], 'U': [np.nan, 13.0], 'B': [12.0, 12.5],
+                  'V': [11.0, np.nan]}).to_csv(root / 'martini.csv', index=False)
+    wide = pd.DataFrame({'mjd': [52300.0, 52301.0], 'V': [10.0, 0.0], 'R': [9.0, 9.5]})
+    wide.to_csv(root / 'goranskij.csv', index=False)
+    wide.to_csv(root / 'V838Mon_Munari.csv', index=False)
+    pd.DataFrame({'inst': 'x', 'filter': ['V'], 'mjd': [52302.0], 'mjderr': 0.0, 'mag': [10.5], 'magerr': 0.1,
+                  'ATel': 0, 'limit': 0}).to_parquet(root / 'standard.parquet')
+    pd.DataFrame({'time': [1.0], 'flux': [2.0]}).to_csv(root / 'unknown.csv', index=False)
+    pd.DataFrame({'dateobs': ['2002 Smarch 1.0'], 'V': [11.0]}).to_csv(root / 'bad_date.csv', index=False)
+    (root / 'notes.txt').write_text('not a light curve')
+
+
+def test_ingest_detects_formats_and_reports_bad_files(tmp_path):
+    _raw_files(tmp_path / 'raw')
+    stacked, report = ingest_lightcurves(str(tmp_path / 'raw'))
+    report = report.set_index(report['path'].map(os.path.basename))
+
+    expected = {'aavso_export.csv': 'aavso', 'martini.csv': 'martini', 'goranskij.csv': 'goranskij',
+                'V838Mon_Munari.csv': 'v838mon_munari', 'standard.parquet': 'standard'}
+    ok = report[report['status'] == 'ok']
+    assert ok['source'].to_dict() == expected
+    assert ok['detected'].all()
+    assert ok['rows'].to_dict() == {'aavso_export.csv': 2, 'martini.csv': 4, 'goranskij.csv': 3,
+                                    'V838Mon_Munari.csv': 3, 'standard.parquet': 1}
+    # Undetectable and unparsable files are reported with their error, not raised
+    failed = report[report['status'] == 'failed']
+    assert sorted(failed.index) == ['bad_date.csv', 'unknown.csv']
+    assert failed['error'].str.startswith('ValueError').all()
+    assert 'notes.txt' not in report.index
+
+    assert len(stacked) == ok['rows'].sum()
+    assert set(stacked['inst']) == {'aavso', 'martini', 'goranskij', 'munari', 'x'}
+    np.testing.assert_allclose(stacked.loc[stacked['inst'] == 'martini', 'mjd'].iloc[0], 52284.5)
+
+
+def test_ingest_explicit_formats_and_workers(tmp_path):
+    _raw_files(tmp_path / 'raw')
+    paths = str(tmp_path / 'raw' / '*.csv')
+    # An explicit format overrides detection, even where it is wrong
+    _, report = ingest_lightcurves(paths, formats={'goranskij.csv': 'martini'})
+    row = report[report['path'].str.endswith('goranskij.csv')].iloc[0]
+    assert (row['source'], row['detected'], row['status']) == ('martini', False, 'failed')
+
+    serial, serial_report = ingest_lightcurves(paths)
+    threaded, threaded_report = ingest_lightcurves(paths, workers=3, executor='thread')
+    pd.testing.assert_frame_equal(serial, threaded)
+    pd.testing.assert_series_equal(serial_report['status'], threaded_report['status'])
+    with pytest.raises(ValueError):
+        ingest_lightcurves(paths, executor='gpu')
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+from lc_features import light_curve_features
+
+
+def _triangle(t, peak_mjd, peak_mag, rise, decline):
+    """Linear rise at `rise` mag/day up to the peak, then a linear decline at `decline` mag/day."""
+    return np.where(t <= peak_mjd, peak_mag + rise * (peak_mjd - t), peak_mag + decline * (t - peak_mjd))
+
+
+def _catalog(seed=0, regular=False):
+    rng = np.random.default_rng(seed)
+    curves = {('a', 'V'): (20.0, -10.0, 0.25, 0.05), ('a', 'B'): (25.0, -9.5, 0.2, 0.08),
+              ('b', 'V'): (40.0, -12.0, 0.1, 0.02)}
+    frames = []
+    for (obj, band), params in curves.items():
+        t = np.arange(0, 100.25, 0.25) if regular else np.sort(np.r_[0.0, params[0], rng.uniform(0, 100, 400)])
+        frames.append(pd.DataFrame({'object': obj, 'filter': band, 'mjd': 60000 + t,
+                                    'abs_mag': _triangle(t, *params), 'magerr': 0.05, 'limit': 0}))
+    df = pd.concat(frames, ignore_index=True)
+    # A bright upper limit must not become the peak
+    limit = df.iloc[[0]].assign(abs_mag=-20.0, limit=1)
+    return pd.concat([df, limit], ignore_index=True), curves
+
+
+def test_features_of_an_analytic_curve():
+    df, curves = _catalog()
+    out = light_curve_features(df, by='object', smooth_days=0).set_index(['object', 'filter'])
+    assert len(out) == len(curves)
+    for key, (peak_mjd, peak_mag, rise, decline) in curves.items():
+        row = out.loc[key]
+        assert row['peak_mjd'] == 60000 + peak_mjd
+        np.testing.assert_allclose(row['peak_mag'], peak_mag, rtol=1e-6)
+        np.testing.assert_allclose(row['rise_time'], peak_mjd)
+        np.testing.assert_allclose(row['rise_rate'], rise, rtol=1e-5)
+        for n in (15, 50):
+            np.testing.assert_allclose(row[f'dm{n}'], decline * n, rtol=1e-4)
+            np.testing.assert_allclose(row[f'decline_rate{n}'], decline, rtol=1e-4)
+        # 100 days after peak lies past the last point
+        assert np.isnan(row['dm100'])
+    assert out['n_points'].tolist() == [402, 402, 402]
+
+
+def test_smoothing_keeps_linear_declines():
+    # On a regular grid a window average of a linear segment is exact
+    df, curves = _catalog(regular=True)
+    out = light_curve_features(df, by='object', smooth_days=5.0).set_index(['object', 'filter'])
+    for key, (peak_mjd, peak_mag, rise, decline) in curves.items():
+        row = out.loc[key]
+        # Smoothing only rounds off the peak (by at most the mean slope over half a window);
+        # far from it the decline is unchanged
+        assert abs(row['peak_mjd'] - 60000 - peak_mjd) <= 2.5
+        assert peak_mag <= row['peak_mag'] <= peak_mag + (rise + decline) / 2 * 2.5
+        at_50 = row['peak_mjd'] - 60000 + 50
+        np.testing.assert_allclose(row['peak_mag'] + row['dm50'], _triangle(at_50, peak_mjd, peak_mag, rise, decline),
+                                   atol=1e-4)
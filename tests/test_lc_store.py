@@ -0,0 +1,83 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from lc_store import MAX_STACK_PARTS, STACK_DIR, read_lightcurve, stack_incremental, write_lightcurve
+
+
+def _lightcurve(seed, n=50):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'inst': f'inst{seed % 3}',
+        'filter': rng.choice(['B', 'V', 'R'], n),
+        'mjd': np.sort(rng.uniform(5e4, 5.1e4, n)),
+        'mjderr': 0.0,
+        'mag': rng.uniform(10, 15, n),
+        'magerr': rng.uniform(0.01, 0.1, n),
+        'ATel': 0,
+        'limit': 0,
+    })
+
+
+def _write_inputs(tmp_path, seeds):
+    paths = []
+    for seed in seeds:
+        path = str(tmp_path / f'lc{seed}.csv')
+        if not os.path.exists(path):
+            write_lightcurve(_lightcurve(seed), path)
+        paths.append(path)
+    return paths
+
+
+def _full_rebuild(paths):
+    return pd.concat([read_lightcurve(p) for p in paths], ignore_index=True)
+
+
+def test_incremental_updates_equal_full_rebuild(tmp_path):
+    cache = str(tmp_path / 'cache')
+    paths = _write_inputs(tmp_path, range(4))
+    stacked, report = stack_incremental(paths, cache)
+    pd.testing.assert_frame_equal(stacked, _full_rebuild(paths))
+    assert len(report['added']) == 4
+
+    # New files at the end are appended as a new part, not a rebuild
+    paths = _write_inputs(tmp_path, range(6))
+    stacked, report = stack_incremental(paths, cache)
+    pd.testing.assert_frame_equal(stacked, _full_rebuild(paths))
+    assert report['added'] == paths[4:] and len(report['unchanged']) == 4
+    assert len(os.listdir(os.path.join(cache, STACK_DIR))) == 2
+
+    # Modifying or removing a file rebuilds the stack from the cached fragments
+    write_lightcurve(_lightcurve(99), paths[1])
+    stacked, report = stack_incremental(paths, cache)
+    pd.testing.assert_frame_equal(stacked, _full_rebuild(paths))
+    assert report['updated'] == [paths[1]]
+    assert len(os.listdir(os.path.join(cache, STACK_DIR))) == 1
+
+    paths = paths[:2] + paths[3:]
+    stacked, report = stack_incremental(paths, cache)
+    pd.testing.assert_frame_equal(stacked, _full_rebuild(paths))
+    assert len(report['removed']) == 1
+
+    # Reordering is not an append either
+    paths = paths[::-1]
+    stacked, _ = stack_incremental(paths, cache)
+    pd.testing.assert_frame_equal(stacked, _full_rebuild(paths))
+
+
+def test_appended_parts_are_compacted(tmp_path):
+    cache = str(tmp_path / 'cache')
+    for n in range(1, MAX_STACK_PARTS + 3):
+        paths = _write_inputs(tmp_path, range(n))
+        stacked, _ = stack_incremental(paths, cache)
+        assert len(os.listdir(os.path.join(cache, STACK_DIR))) <= MAX_STACK_PARTS
+    pd.testing.assert_frame_equal(stacked, _full_rebuild(paths))
+
+
+def test_unreadable_inputs_are_skipped(tmp_path):
+    cache = str(tmp_path / 'cache')
+    paths = _write_inputs(tmp_path, range(2)) + [str(tmp_path / 'missing.csv')]
+    stacked, report = stack_incremental(paths, cache)
+    assert report['failed'] == paths[2:]
+    pd.testing.assert_frame_equal(stacked, _full_rebuild(paths[:2]))
@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+
+from lc_store import write_lightcurve
+from lightcurve import FLAG_ATEL, FLAG_LIMIT, LightCurve
+
+
+def _frame(n=1000, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'inst': rng.choice(['aavso', 'martini', None], n),
+        'filter': rng.choice(['B', 'V', 'R'], n),
+        'mjd': 52000 + np.sort(rng.uniform(0, 300, n)),
+        'mjderr': 0.0,
+        'mag': rng.uniform(8, 16, n).astype(np.float32),
+        'magerr': np.where(rng.random(n) < 0.1, np.nan, rng.uniform(0.01, 0.1, n)).astype(np.float32),
+        'ATel': (rng.random(n) < 0.2).astype(int),
+        'limit': (rng.random(n) < 0.05).astype(int),
+        'app_mag': rng.uniform(6, 14, n),
+    })
+
+
+def test_round_trip_preserves_values():
+    df = _frame()
+    lc = LightCurve.from_dataframe(df)
+    # All-zero mjderr is not materialized; limit and ATel live in one bit field
+    assert lc.mjderr is None and lc.flags.dtype == np.uint8
+    np.testing.assert_array_equal((lc.flags & FLAG_LIMIT) != 0, df['limit'] == 1)
+    np.testing.assert_array_equal((lc.flags & FLAG_ATEL) != 0, df['ATel'] == 1)
+    assert lc.extra['app_mag'].dtype == np.float32
+
+    back = lc.to_dataframe()
+    assert list(back.columns) == list(df.columns)
+    for col in ('inst', 'filter'):
+        pd.testing.assert_series_equal(back[col].astype(object), df[col].astype(object), check_names=False)
+    for col in ('mjd', 'mjderr', 'mag', 'magerr', 'ATel', 'limit'):
+        np.testing.assert_array_equal(back[col].to_numpy(dtype=float), df[col].to_numpy(dtype=float))
+    np.testing.assert_allclose(back['app_mag'], df['app_mag'], rtol=1e-6)
+    assert lc.nbytes < 25 * len(df)
+
+
+def test_read_file_round_trip(tmp_path):
+    df = _frame(200)
+    path = str(tmp_path / 'lc.parquet')
+    write_lightcurve(df, path)
+    lc = LightCurve.read(path)
+    assert len(lc) == len(df)
+    np.testing.assert_array_equal(lc.column('mjd'), df['mjd'])
+    np.testing.assert_array_equal(lc.column('filter'), df['filter'].to_numpy(dtype=object))
+    np.testing.assert_array_equal(lc.column('limit'), df['limit'])
+
+
+def test_views_share_memory():
+    df = _frame()
+    df['inst'] = df['inst'].astype('category')
+    lc = LightCurve.from_dataframe(df)
+    # Columns already in the target dtype are not copied, in either direction
+    assert np.shares_memory(lc.mjd, df['mjd'].to_numpy())
+    assert np.shares_memory(lc.mag, df['mag'].to_numpy())
+    back = lc.to_dataframe()
+    for name in ('mjd', 'mag', 'magerr'):
+        assert np.shares_memory(back[name].to_numpy(), getattr(lc, name))
+    assert np.shares_memory(back['inst'].array.codes, lc.inst_codes)
+
+    sub = lc.take(slice(100, 200))
+    assert np.shares_memory(sub.mjd, lc.mjd) and np.shares_memory(sub.extra['app_mag'], lc.extra['app_mag'])
+    assert not np.shares_memory(lc.take(lc.limit).mjd, lc.mjd)
+
+    added = lc.with_column('abs_mag', lc.extra['app_mag'] - 10)
+    assert added.mjd is lc.mjd and 'abs_mag' not in lc.extra
+
+
+def test_band_views_after_sorting():
+    lc = LightCurve.from_dataframe(_frame())
+    by_band = lc.sort_by_band()
+    seen = 0
+    for name, band in by_band.bands():
+        assert np.shares_memory(band.mjd, by_band.mjd)
+        assert (band.column('filter') == name).all()
+        assert (np.diff(band.mjd) >= 0).all()
+        np.testing.assert_array_equal(band.mag, lc.band(name).mag)
+        seen += len(band)
+    assert seen == len(lc)
+    # Unsorted curves still give the right points, as copies
+    assert not np.shares_memory(lc.band('V').mjd, lc.mjd)
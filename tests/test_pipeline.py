@@ -0,0 +1,20 @@
+from pipeline import build_graph, run_pipeline
+
+
+def _config(tmp_path, **obj):
+    return {'_base_dir': str(tmp_path), 'pipeline': {'work_dir': 'out'},
+            'objects': [{'name': 'obj', 'E_BV': 0.5, 'sources': [{'path': 'raw.csv'}], **obj}]}
+
+
+def test_derived_gr_without_dereddened_table_skips_pivot(tmp_path):
+    config = _config(tmp_path, steps=['load', 'stack', 'pivot', 'plot'], synthetic_gr='derived',
+                     plots=['dereddened_gr'])
+    tasks = build_graph(config)
+    assert not any(tid.startswith(('pivot:', 'plot:')) for tid in tasks)
+    results = run_pipeline(config, dry_run=True)
+    assert set(results) == set(tasks)
+
+
+def test_derived_gr_chains_after_deredden(tmp_path):
+    tasks = build_graph(_config(tmp_path, steps=['load', 'stack', 'deredden', 'pivot'], synthetic_gr='derived'))
+    assert tasks['pivot:obj'].deps == ['deredden:obj']
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+
+from plot_lc import decimate_lttb, decimate_minmax, render_lightcurve
+
+
+def _curve(n=20000, seed=0):
+    rng = np.random.default_rng(seed)
+    x = np.sort(rng.uniform(0, 500, n))
+    y = 12 + np.sin(x / 30) + rng.normal(0, 0.05, n)
+    err = rng.uniform(0.01, 0.05, n)
+    return x, y, err
+
+
+def _lttb_loop(x, y, n_out):
+    # Reference: the same LTTB variant (bucket means as outer vertices), one bucket at a time
+    n = len(x)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    means = [(x[0], y[0])] + [(x[a:b].mean(), y[a:b].mean()) for a, b in zip(edges[:-1], edges[1:])]
+    means.append((x[-1], y[-1]))
+    picks = [0, n - 1]
+    for i, (a, b) in enumerate(zip(edges[:-1], edges[1:])):
+        (ax, ay), (cx, cy) = means[i], means[i + 2]
+        area = np.abs((ax - cx) * (y[a:b] - ay) - (ax - x[a:b]) * (cy - ay))
+        picks.append(a + int(np.argmax(area)))
+    return np.unique(picks)
+
+
+def test_lttb_matches_reference_loop():
+    x, y, _ = _curve(5000)
+    np.testing.assert_array_equal(decimate_lttb(x, y, n_out=300), _lttb_loop(x, y, 300))
+
+
+def test_outliers_limits_and_error_envelope_survive():
+    x, y, err = _curve()
+    y[1234] = 5.0                   # a single bright outlier
+    err[4321] = 3.0                 # a point with a huge error bar
+    limit = np.zeros(len(x), dtype=bool)
+    limit[::997] = True
+    for idx in (decimate_lttb(x, y, n_out=200, keep=limit, yerr=err),
+                decimate_minmax(x, y, err, n_bins=200, keep=limit)):
+        assert len(idx) < len(x) // 10
+        assert {1234, 4321} <= set(idx)
+        assert set(np.flatnonzero(limit)) <= set(idx)
+        # The drawn error envelope reaches as far as the full one
+        assert (y - err)[idx].min() == (y - err).min()
+        assert (y + err)[idx].max() == (y + err).max()
+
+
+def test_lttb_plot_with_unknown_band(tmp_path):
+    x, y, err = _curve(6000)
+    df = pd.DataFrame({'mjd': x, 'app_mag': y, 'magerr': err, 'filter': 'V'})
+    df.loc[:2999, 'filter'] = 'VIS'
+    df.loc[:2999, 'app_mag'] = np.nan
+    df['limit'] = (np.arange(len(df)) % 500 == 0).astype(int)
+    n = render_lightcurve(df, 'dereddened', output_file=str(tmp_path / 'p.png'), decimate='lttb',
+                          max_points=300)
+    assert 0 < n < 1000
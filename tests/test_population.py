@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+
+from extinction_utils import distmod_from_distance, extinction_ratio_matrix
+from population import R_V_GRID, _chunk_summary, _range_min_table, simulate_population
+
+
+def _template(bands=('B', 'V')):
+    phases = np.arange(100.0)
+    mags = np.array([-10 + 0.05 * (1 + i) * np.abs(phases - 20) for i in range(len(bands))],
+                    dtype=np.float32)
+    mags[:, 90:] = np.nan
+    return phases, list(bands), mags
+
+
+def test_chunk_summary_matches_brute_force():
+    phases, bands, mags = _template()
+    rng = np.random.default_rng(1)
+    n = 60
+    params = {
+        'A_V': rng.uniform(0, 2, n),
+        # On the tabulated grid, so the interpolated ratios are exact
+        'R_V': rng.choice(R_V_GRID[40:120], n),
+        'distance_pc': rng.uniform(1e3, 5e4, n),
+        't0': rng.uniform(0, 100, n),
+    }
+    limits = np.array([17.0, 17.5], dtype=np.float32)
+    window = (30.0, 120.0)
+    ratio_table = extinction_ratio_matrix(R_V_GRID, bands)
+    grid = (phases, bands, mags, _range_min_table(mags))
+    out = _chunk_summary(grid, ratio_table, limits, window, params)
+
+    for i in range(n):
+        ratios = extinction_ratio_matrix([params['R_V'][i]], bands)[0]
+        dm = distmod_from_distance(params['distance_pc'][i])
+        epoch = params['t0'][i] + phases
+        inside = (epoch >= window[0]) & (epoch <= window[1])
+        for j, band in enumerate(bands):
+            app = mags[j].astype(float) + dm + params['A_V'][i] * ratios[j]
+            visible = inside & (app <= limits[j])
+            in_window = app[inside]
+            peak = np.nanmin(in_window) if np.isfinite(in_window).any() else np.nan
+            np.testing.assert_allclose(out[f'peak_{band}'][i], peak, atol=1e-4)
+            assert out[f't_visible_{band}'][i] == visible.sum()
+            first = epoch[visible][0] if visible.any() else np.nan
+            np.testing.assert_allclose(out[f'first_detection_{band}'][i], first, atol=1e-3)
+    assert out['detected'].dtype == bool
+
+
+def test_results_do_not_depend_on_workers():
+    template = _template()
+    serial = simulate_population(template, 5000, window=(0, 365), seed=4, chunk_mb=0.1)
+    parallel = simulate_population(template, 5000, window=(0, 365), seed=4, chunk_mb=0.1, workers=2)
+    pd.testing.assert_frame_equal(serial, parallel)
+
+
+def test_band_without_wavelength_has_nan_summaries():
+    known = simulate_population(_template(('B', 'V')), 2000, seed=2)
+    mixed = simulate_population(_template(('B', 'V', 'VIS')), 2000, seed=2)
+
+    for col in ('peak_VIS', 't_visible_VIS', 'first_detection_VIS'):
+        assert mixed[col].isna().all()
+    for col in known.columns:
+        pd.testing.assert_series_equal(known[col], mixed[col])
+
+
+def test_ratio_matrix_unknown_band_is_nan():
+    ratios = extinction_ratio_matrix([2.5, 3.1], ['V', 'VIS', 'B'])
+    assert np.isnan(ratios[:, 1]).all()
+    np.testing.assert_allclose(ratios[:, [0, 2]], extinction_ratio_matrix([2.5, 3.1], ['V', 'B']))
@@ -0,0 +1,68 @@
+import os
+
+from result_cache import ResultCache
+
+
+def _write(path, nbytes):
+    with open(path, 'wb') as f:
+        f.write(b'x' * nbytes)
+    return str(path)
+
+
+def test_store_and_restore(tmp_path):
+    cache = ResultCache(tmp_path / 'cache')
+    src = _write(tmp_path / 'in.csv', 10)
+    out = _write(tmp_path / 'out.png', 100)
+    cache.store('plot', [src], {'title': 'a'}, out)
+    os.remove(out)
+    assert cache.restore('plot', [src], {'title': 'a'}, out)
+    assert os.path.getsize(out) == 100
+    assert not cache.restore('plot', [src], {'title': 'b'}, out)
+
+
+def test_size_stays_within_budget_including_hash_memos(tmp_path):
+    cache = ResultCache(tmp_path / 'cache', max_bytes=5000)
+    for i in range(40):
+        src = _write(tmp_path / f'in{i}.csv', 10)
+        out = _write(tmp_path / f'out{i}.png', 1000)
+        cache.store('plot', [src], {'i': i}, out)
+    assert cache.size() <= 5000
+    assert len(os.listdir(tmp_path / 'cache' / 'hashes')) < 80
+    # The most recent entry survives eviction
+    assert cache.restore('plot', [str(tmp_path / 'in39.csv')], {'i': 39}, str(tmp_path / 'r.png'))
+
+
+def test_store_only_rescans_on_overflow(tmp_path, monkeypatch):
+    cache = ResultCache(tmp_path / 'cache', max_bytes=10 ** 9)
+    scans = []
+    original = cache.evict
+    monkeypatch.setattr(cache, 'evict', lambda: scans.append(1) or original())
+    for i in range(20):
+        src = _write(tmp_path / f'in{i}.csv', 10)
+        cache.store('plot', [src], {'i': i}, _write(tmp_path / f'out{i}.png', 100))
+    assert not scans
+
+
+def test_plot_cache_key_covers_rendering_options(tmp_path, monkeypatch):
+    import main_deredden_plot
+    import plot_lc
+
+    calls = []
+    monkeypatch.setattr(plot_lc, 'render_lightcurve',
+                        lambda df, kind, output_file=None, **options: (calls.append(options),
+                                                                     _write(output_file, 10)))
+    cache = ResultCache(tmp_path / 'cache')
+    src = _write(tmp_path / 'in.csv', 10)
+    out = str(tmp_path / 'out.png')
+
+    def render(**options):
+        main_deredden_plot.render_cached(cache, 'dereddened', src, out, 'T', df=object(), **options)
+
+    render()
+    render()
+    assert len(calls) == 1
+    render(decimate='lttb')
+    render(figsize=(4, 3))
+    monkeypatch.setattr(plot_lc, 'RENDER_VERSION', plot_lc.RENDER_VERSION + 1)
+    render()
+    assert len(calls) == 4